@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+compare_log.py
+--------------
+Compare one or more logs against a baseline log and fail if the resource usage regressed.
+
+Usage:
+    python compare_log.py --baseline jetson_stats/examples/msckf_mono.csv new.csv [other.csv ...]
+                          [--columns "CPU %" "Mem %"] [--mean-tol 0.05] [--p95-tol 0.10] [--ks-tol 0.2]
+
+The logs are aligned on the columns they have in common (logs from `cpu_mem_logger.py`
+and `resource_logger.py` can be mixed), and each column is compared with:
+ * mean - relative increase of the mean
+ * p95  - relative increase of the 95th percentile
+ * ks   - Kolmogorov-Smirnov statistic, max distance between the two distributions
+
+A column regresses when the mean or the p95 grow more than the tolerance, or when the
+distribution changes more than the KS tolerance while the mean grows.
+The exit status is 1 if any log regressed, 0 otherwise.
+
+The logs are read in chunks and every column is reduced to a streaming histogram,
+so the memory does not depend on the length of the logs.
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columns that are not a measure
+SKIP_COLUMNS = ('Timestamp', 'Phase', 'Avg CPU %', 'Avg Mem %', 'Seconds')
+# Number of bins of every streaming histogram
+HISTOGRAM_BINS = 4096
+CHUNK_SIZE = 100000
+
+
+class StreamingHistogram:
+    """
+    Histogram of non negative values with a fixed number of bins.
+
+    The bin width is a power of two and it is doubled, merging adjacent bins,
+    every time a new value does not fit in the range.
+    """
+
+    def __init__(self, bins: int = HISTOGRAM_BINS):
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.width: Optional[float] = None
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _grow(self, factor: int):
+        """Merge `factor` adjacent bins in one, `factor` is a power of two."""
+        if factor <= 1:
+            return
+        bins = len(self.counts)
+        merged = np.add.reduceat(self.counts, np.arange(0, bins, factor))
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.counts[:len(merged)] = merged
+        self.width *= factor
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        values = np.clip(values[np.isfinite(values)], 0.0, None)
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.total += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+        bins = len(self.counts)
+        if self.width is None:
+            self.width = 2.0 ** np.ceil(np.log2(max(self.max, 1e-9) / bins))
+        while self.max >= self.width * bins:
+            self._grow(2)
+        index = np.minimum((values / self.width).astype(np.int64), bins - 1)
+        self.counts += np.bincount(index, minlength=bins)
+
+    def rebin(self, width: float) -> np.ndarray:
+        """Counts with a bin width larger or equal to the current one."""
+        factor = int(round(width / self.width))
+        if factor <= 1:
+            return self.counts
+        merged = np.add.reduceat(self.counts, np.arange(0, len(self.counts), factor))
+        counts = np.zeros(len(self.counts), dtype=np.int64)
+        counts[:len(merged)] = merged
+        return counts
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float('nan')
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return float('nan')
+        cumulative = np.cumsum(self.counts)
+        idx = int(np.searchsorted(cumulative, q * self.count, side='left'))
+        # Linear interpolation inside the bin
+        before = cumulative[idx - 1] if idx > 0 else 0
+        inside = (q * self.count - before) / max(self.counts[idx], 1)
+        return min((idx + inside) * self.width, self.max)
+
+
+def ks_statistic(a: StreamingHistogram, b: StreamingHistogram) -> float:
+    """Kolmogorov-Smirnov statistic evaluated on the common bins of two histograms."""
+    if not a.count or not b.count:
+        return float('nan')
+    width = max(a.width, b.width)
+    cdf_a = np.cumsum(a.rebin(width)) / a.count
+    cdf_b = np.cumsum(b.rebin(width)) / b.count
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+
+def read_histograms(csv_path: str, columns: Optional[List[str]] = None, skip: int = 0) -> Dict[str, StreamingHistogram]:
+    """Read a log in chunks and build a histogram for each numeric column."""
+    histograms: Dict[str, StreamingHistogram] = {}
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE):
+        # Drop FINAL and phase marker rows
+        if 'Timestamp' in chunk.columns:
+            chunk = chunk[chunk['Timestamp'] != 'FINAL']
+        if 'Phase' in chunk.columns:
+            chunk = chunk[chunk['Phase'].isna()]
+        # Skip the first samples to align the logs
+        if rows < skip:
+            drop = min(skip - rows, len(chunk))
+            rows += len(chunk)
+            chunk = chunk.iloc[drop:]
+        else:
+            rows += len(chunk)
+        names = columns if columns is not None else [c for c in chunk.columns if c not in SKIP_COLUMNS]
+        for name in names:
+            if name not in chunk.columns:
+                continue
+            values = pd.to_numeric(chunk[name], errors='coerce').to_numpy()
+            histograms.setdefault(name, StreamingHistogram()).update(values)
+    return histograms
+
+
+def compare(baseline: StreamingHistogram, candidate: StreamingHistogram, mean_tol: float, p95_tol: float, ks_tol: float) -> dict:
+    """Distribution differences of a candidate column against the baseline."""
+    base_mean, new_mean = baseline.mean, candidate.mean
+    base_p95, new_p95 = baseline.quantile(0.95), candidate.quantile(0.95)
+    mean_delta = (new_mean - base_mean) / base_mean if base_mean else float('inf') if new_mean > 0 else 0.0
+    p95_delta = (new_p95 - base_p95) / base_p95 if base_p95 else float('inf') if new_p95 > 0 else 0.0
+    ks = ks_statistic(baseline, candidate)
+    failures = []
+    if mean_delta > mean_tol:
+        failures.append('mean')
+    if p95_delta > p95_tol:
+        failures.append('p95')
+    if ks > ks_tol and mean_delta > 0:
+        failures.append('ks')
+    return {'mean': (base_mean, new_mean, mean_delta),
+            'p95': (base_p95, new_p95, p95_delta),
+            'ks': ks,
+            'count': (baseline.count, candidate.count),
+            'failures': failures}
+
+
+def print_report(name: str, results: Dict[str, dict]):
+    print(f"== {name}")
+    for column, res in results.items():
+        base_mean, new_mean, mean_delta = res['mean']
+        base_p95, new_p95, p95_delta = res['p95']
+        status = "REGRESSION(" + ",".join(res['failures']) + ")" if res['failures'] else "ok"
+        print(f"  {column:<8} mean {base_mean:9.3f} -> {new_mean:9.3f} ({mean_delta:+7.1%})  "
+              f"p95 {base_p95:9.3f} -> {new_p95:9.3f} ({p95_delta:+7.1%})  ks {res['ks']:.3f}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare resource logs against a baseline log")
+    parser.add_argument('--baseline', required=True, help='Baseline CSV file')
+    parser.add_argument('logs', nargs='+', help='CSV files to compare with the baseline')
+    parser.add_argument('--columns', nargs='+', help='Columns to compare (default: all columns in common)')
+    parser.add_argument('--mean-tol', type=float, default=0.05, help='Max relative increase of the mean (default: 0.05)')
+    parser.add_argument('--p95-tol', type=float, default=0.10, help='Max relative increase of the 95th percentile (default: 0.10)')
+    parser.add_argument('--ks-tol', type=float, default=0.2, help='Max KS statistic when the mean grows (default: 0.2)')
+    parser.add_argument('--skip', type=int, default=0, help='Skip the first samples of every log (warm up)')
+    args = parser.parse_args()
+
+    baseline = read_histograms(args.baseline, args.columns, args.skip)
+    regression = False
+    for path in args.logs:
+        candidate = read_histograms(path, args.columns, args.skip)
+        common = [name for name in baseline if name in candidate]
+        if not common:
+            print(f"== {path}\n  no columns in common with {args.baseline}")
+            regression = True
+            continue
+        results = {name: compare(baseline[name], candidate[name], args.mean_tol, args.p95_tol, args.ks_tol) for name in common}
+        print_report(path, results)
+        regression |= any(res['failures'] for res in results.values())
+    print("RESULT: " + ("REGRESSION" if regression else "OK"))
+    sys.exit(1 if regression else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,8 @@ import psutil, subprocess, re, getpass
 import csv, argparse
 from time import sleep, time
 from datetime import datetime
+from log_phases import PhaseMarkers, TIMESTAMP_FORMAT
+from log_store import LogStoreWriter
 
 # Function to get the list of running processes
 def get_user_processes():
@@ -126,11 +128,19 @@ interval = 0.1           # time interval for each logging
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--save', action="store", dest="file", default="log.csv")
+    # Phase markers, look log_phases.py
+    parser.add_argument('--phase-file', help='Write a phase row for each line appended to this file')
+    parser.add_argument('--phase-socket', help='Write a phase row for each message sent to this UNIX socket')
+    parser.add_argument('--phase-signal', action="store_true", help='Write a phase row on SIGUSR1')
+    # Columnar store, look log_store.py
+    parser.add_argument('--store', help='Write also a columnar log store (e.g. log.rls)')
     args = parser.parse_args()
     
+    markers = PhaseMarkers(args.phase_file, args.phase_socket, args.phase_signal)
     f = open(args.file, 'w')
     wr = csv.writer(f)
-    wr.writerow(['Timestamp', 'CPU %', 'Mem %', 'Avg CPU %', 'Avg Mem %'])
+    wr.writerow(['Timestamp', 'CPU %', 'Mem %', 'Avg CPU %', 'Avg Mem %', 'Phase'])
+    store = LogStoreWriter(args.store, ['CPU %', 'Mem %', 'Avg CPU %', 'Avg Mem %']) if args.store else None
     start_time = time()
     last_time = start_time
     total_cpu_integral = 0.0  # percentage * seconds
@@ -163,9 +173,19 @@ def main():
             avg_mem = total_mem_integral / elapsed if elapsed > 0 else 0.0
             last_time = now_time
 
+            # phase markers received during this interval
+            for marker_time, label in markers.poll():
+                wr.writerow([marker_time.strftime(TIMESTAMP_FORMAT)[:-3], "", "", "", "", label])
+                print(f"[{marker_time.strftime(TIMESTAMP_FORMAT)[:-3]}] Phase: {label}")
+                if store is not None:
+                    store.mark(marker_time.timestamp(), label)
+
             # log with timestamp and averages (with milliseconds)
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            now = datetime.now()
+            timestamp = now.strftime(TIMESTAMP_FORMAT)[:-3]
             wr.writerow([timestamp, total_cpu, total_mem, avg_cpu, avg_mem])
+            if store is not None:
+                store.append(now.timestamp(), [total_cpu, total_mem, avg_cpu, avg_mem])
             print(f"[{timestamp}] CPU: {total_cpu:.2f}%, Mem: {total_mem:.2f}%, Avg CPU: {avg_cpu:.2f}%, Avg Mem: {avg_mem:.2f}%")
 
     except KeyboardInterrupt:
@@ -184,6 +204,9 @@ def main():
         else:
             print("No data collected to calculate averages.")
 
+        markers.close()
+        if store is not None:
+            store.close()
         f.close()
 
 if __name__ == '__main__':
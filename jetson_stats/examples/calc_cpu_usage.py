@@ -3,7 +3,15 @@
 
 
 import csv, argparse
+import os, sys
 import numpy as np
+# log_phases.py is in the root of this repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from log_phases import read_log, phase_aggregates, print_phase_table
+from log_store import LogStore, TIME_COLUMN, ingest_columns, is_store
+# jtop from this repository, to read the tegrastats logs decoded with jtop.core.ingest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from jtop.core.ingest import is_columns, load_columns
 
 
 
@@ -27,19 +35,66 @@ if __name__ == "__main__":
     # parse output file name
     parser = argparse.ArgumentParser()
     parser.add_argument('--input_csv', type=str, default="")
+    # time window, only for log stores and ingested tegrastats logs (seconds from the beginning of the log)
+    parser.add_argument('--start', type=float, default=None)
+    parser.add_argument('--end', type=float, default=None)
 
     args = parser.parse_args()
     
-    # read csv file as numpy (skip header)
-    data = np.genfromtxt(args.input_csv, delimiter=',', skip_header=1)
-    
-    # cpu
-    data_cpu = data[:, 0]
-    
-    # memory 
-    data_mem = data[:, 1]
+    header = []
+    ingested = is_columns(args.input_csv)
+    if not ingested and not is_store(args.input_csv):
+        with open(args.input_csv, 'r') as fp:
+            header = next(csv.reader(fp))
+
+    if ingested:
+        # tegrastats log decoded in columns, the cpu is the sum of the load of all cores
+        columns = ingest_columns(load_columns(args.input_csv))
+        times = columns[TIME_COLUMN]
+        times = times - times[0] if len(times) else times
+        window = np.ones(len(times), dtype=bool)
+        if args.start is not None:
+            window &= times >= args.start
+        if args.end is not None:
+            window &= times < args.end
+        data_cpu = columns['CPU %'][window]
+        data_mem = columns['Mem %'][window]
+        labels = []
+    elif is_store(args.input_csv):
+        # columnar log store, only the blocks in the time window are read
+        store = LogStore(args.input_csv)
+        t0 = store.start_time
+        start = t0 + args.start if args.start is not None else None
+        end = t0 + args.end if args.end is not None else None
+        columns = store.query(start, end, columns=['CPU %', 'Mem %'])
+        times = columns[TIME_COLUMN] - t0
+        data_cpu = columns['CPU %']
+        data_mem = columns['Mem %']
+        phases = store.phases(start, end)
+        marker_times = [t - t0 for t, _ in phases]
+        labels = [label for _, label in phases]
+    elif 'Timestamp' in header:
+        # log from cpu_mem_logger.py, with timestamps and phase markers
+        times, columns, marker_times, labels = read_log(args.input_csv)
+        data_cpu = columns['CPU %']
+        data_mem = columns['Mem %']
+    else:
+        # read csv file as numpy (skip header)
+        data = np.genfromtxt(args.input_csv, delimiter=',', skip_header=1)
+        
+        # cpu
+        data_cpu = data[:, 0]
+        
+        # memory 
+        data_mem = data[:, 1]
+        labels = []
 
     # print statistics    
     data_stat(data_cpu, 'cpu')
     data_stat(data_mem, 'mem')
+
+    # print statistics for each phase
+    if labels:
+        print_phase_table('cpu', phase_aggregates(times, data_cpu, marker_times, labels))
+        print_phase_table('mem', phase_aggregates(times, data_mem, marker_times, labels))
     
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from jtop import jtop, JtopException, EnergyMeter
+
+
+if __name__ == "__main__":
+
+    print("Energy used for each NV Power Mode")
+
+    meter = EnergyMeter()
+    try:
+        with jtop() as jetson:
+            jetson.attach(meter)
+            # jetson.ok() will provide the proper update frequency
+            while jetson.ok():
+                # Count here the frames or the inferences of your application
+                meter.add_work(1)
+    except JtopException as e:
+        print(e)
+    except KeyboardInterrupt:
+        print("Closed with CTRL-C")
+    finally:
+        for phase in meter.report()['phases']:
+            print("{name}: {energy:.3f}J in {duration:.1f}s".format(
+                name=phase['name'], energy=phase['energy'].get('total', 0.0), duration=phase['duration']))
+            for rail, value in phase.get('energy_per_work', {}).items():
+                print("  {rail}: {value:.6f}J for each frame".format(rail=rail, value=value))
+# EOF
@@ -17,7 +17,7 @@
 
 # flake8: noqa
 
-from .core import JtopException
+from .core import JtopException, EnergyMeter
 from .jtop import jtop
 
 __author__ = "Raffaello Bonghi"
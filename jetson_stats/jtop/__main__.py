@@ -19,17 +19,20 @@ import re
 import signal
 import os
 import sys
+import time
 import argparse
+from datetime import datetime
 # control command line
 import curses
 # Logging
 import logging
 # jtop service
-from .service import JtopServer
+from .service import JtopServer, COLLECTORS, COLLECTOR_AUTO, JTOP_RECORDER
 # jtop client
 from .jtop import jtop
 # jtop exception
 from .core import JtopException, get_var
+from .core.recorder import dump_csv
 # GUI jtop interface
 from .gui import JTOPGUI, ALL, GPU, CPU, MEM, CTRL, INFO
 # Load colors
@@ -41,6 +44,7 @@ VERSION_RE = re.compile(r""".*__version__ = ["'](.*?)['"]""", re.S)
 # Reference repository
 REPOSITORY = "https://github.com/rbonghi/jetson_stats/issues"
 LOOP_SECONDS = 5
+RECORDER_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 class bcolors:
@@ -86,6 +90,13 @@ def warning_messages(jetson, no_warnings=False):
         print("[{status}] {link}".format(status=bcolors.warning(), link=jetpack_missing(REPOSITORY, jetson, version)))
 
 
+def recorder_time(value):
+    try:
+        return time.mktime(datetime.strptime(value, RECORDER_TIME_FORMAT).timetuple())
+    except ValueError:
+        raise argparse.ArgumentTypeError("Time not in format \"{format}\"".format(format=RECORDER_TIME_FORMAT.replace('%', '%%')))
+
+
 def exit_signal(signum, frame):
     logger.info("Close service by signal {signum}".format(signum=signum))
     sys.exit(0)
@@ -97,6 +108,11 @@ def main():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('service', nargs='?', help=argparse.SUPPRESS, default=False)
     parser.add_argument('--force', dest='force', help=argparse.SUPPRESS, action="store_true", default=False)
+    parser.add_argument('--collector', dest='collector', help=argparse.SUPPRESS, choices=COLLECTORS, default=COLLECTOR_AUTO)
+    parser.add_argument('--recorder', dest='recorder', help=argparse.SUPPRESS, nargs='?', const=JTOP_RECORDER, default=None)
+    parser.add_argument('--from', dest='start', help='jtop dump: first sample of the recorder "YYYY-MM-DD HH:MM:SS"', type=recorder_time, default=0)
+    parser.add_argument('--to', dest='end', help='jtop dump: last sample of the recorder "YYYY-MM-DD HH:MM:SS"', type=recorder_time, default=None)
+    parser.add_argument('-o', '--output', dest='output', help='jtop dump: CSV file, default standard output', default=None)
     parser.add_argument('--no-warnings', dest="no_warnings", help='Do not show warnings', action="store_true", default=False)
     parser.add_argument('--restore', dest="restore", help='Reset Jetson configuration', action="store_true", default=False)
     parser.add_argument('--loop', dest="loop", help='Automatically switch page every {sec}s'.format(sec=LOOP_SECONDS), action="store_true", default=False)
@@ -115,7 +131,7 @@ def main():
         # Run service
         try:
             # Initialize stats server
-            server = JtopServer(force=args.force)
+            server = JtopServer(force=args.force, collector=args.collector, recorder=args.recorder)
             logger.info("jetson_stats server loaded")
             server.loop_for_ever()
         except JtopException as e:
@@ -124,6 +140,18 @@ def main():
         exit(0)
     # Initialize logging level
     logging.basicConfig()
+    # Dump the samples of the flight recorder
+    if args.service == 'dump':
+        path = args.recorder if args.recorder is not None else JTOP_RECORDER
+        output = open(args.output, 'w') if args.output is not None else sys.stdout
+        try:
+            count = dump_csv(path, output, start=args.start, end=args.end)
+        finally:
+            if args.output is not None:
+                output.close()
+        sys.stderr.write("{count} samples from {path}\n".format(count=count, path=path))
+        # Close service
+        exit(0)
     # Convert refresh to second
     interval = float(args.refresh / 1000.0)
     # Restore option
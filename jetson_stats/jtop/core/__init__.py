@@ -19,14 +19,23 @@
 
 from .nvpmodel import NVPModel, NVPModelService
 from .tegrastats import Tegrastats
+from .collector import SysfsCollector
 from .fan import Fan, FanService
-from .jetson_clocks import JetsonClocks, JetsonClocksService
+from .jetson_clocks import JetsonClocks, JetsonClocksService, ShowSnapshot
 from .swap import Swap, SwapService
 from .cpu import cpu_models
 from .engine import Engine, nvjpg
+from .energy import EnergyMeter
+from .sample import Rail, to_dicts
+from .ring import SampleRing
+from .history import History
+from .recorder import Recorder
+from .probe import ProbeCache
+from .stream import Publisher, Subscriber, STATIC_ANY
+from .control import Controller
 from .config import Config
 from .memory import MemoryService
-from .command import Command
+from .command import Command, CommandPool, command_pool
 from .common import (
     Board,
     locate_commands,
@@ -0,0 +1,349 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Logging
+import logging
+import os
+import sys
+import time
+from glob import glob
+# Threading
+from threading import Thread, Event
+from .sample import ValFreq, Rail, Memory, TegraSample
+from .sysfs import SysFile
+# Create logger
+logger = logging.getLogger(__name__)
+# Monotonic clock, time.time on python 2
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+# All paths are relative to the root of the collector
+PROC_STAT = 'proc/stat'
+PROC_MEMINFO = 'proc/meminfo'
+PROC_BUDDYINFO = 'proc/buddyinfo'
+CPU_PRESENT = 'sys/devices/system/cpu/present'
+CPU_FREQ = 'sys/devices/system/cpu/cpu{idx}/cpufreq/scaling_cur_freq'
+GPU_LOAD = ['sys/devices/gpu.0/load', 'sys/devices/platform/gpu.0/load']
+THERMAL_ZONES = 'sys/devices/virtual/thermal/thermal_zone*'
+EMC_RATE = ['sys/kernel/debug/bpmp/debug/clk/emc/rate', 'sys/kernel/debug/clk/emc/clk_rate']
+EMC_ACTIVITY = 'sys/kernel/actmon_avg_activity/mc_all'
+ENGINE_CLOCKS = {'APE': 'ape', 'NVENC': 'nvenc', 'NVDEC': 'nvdec', 'MSENC': 'msenc'}
+ENGINE_RATE = 'sys/kernel/debug/clk/{clk}/clk_rate'
+ENGINE_ENABLE = 'sys/kernel/debug/clk/{clk}/clk_enable_count'
+INA3221_IIO = 'sys/bus/i2c/drivers/ina3221x/*/iio:device*'
+HWMON = 'sys/class/hwmon/hwmon*'
+# Largest free block on the buddy allocator, order 10 with 4kB pages
+LFB_SIZE = 4
+
+
+def _open(root, paths):
+    """ Open the first file available, None if no file exists """
+    for path in paths if isinstance(paths, list) else [paths]:
+        try:
+            return SysFile(os.path.join(root, path))
+        except (OSError, IOError):
+            continue
+    return None
+
+
+def _range(text):
+    """ Decode a list of cpus like 0-3,5 """
+    cpus = []
+    for item in text.strip().split(','):
+        if '-' in item:
+            start, end = item.split('-')
+            cpus += range(int(start), int(end) + 1)
+        elif item:
+            cpus.append(int(item))
+    return cpus
+
+
+def _read_name(path):
+    """ Content of a small file, empty if not available """
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (OSError, IOError):
+        return ''
+
+
+def _value(sysfile, default=None):
+    """ Integer in the file, default if the file is missing or cannot be read """
+    if sysfile is None:
+        return default
+    try:
+        return sysfile.read_int()
+    except (OSError, IOError, ValueError):
+        return default
+
+
+def _thermal_name(name):
+    """ Same name of tegrastats: CPU-therm -> CPU, Tboard_tegra -> Tboard """
+    return name.split('-')[0].split('_')[0]
+
+
+class SysfsCollector(object):
+    """
+    Collector that reads the tegrastats quantities directly from the kernel, without any subprocess:
+
+    * **CPU** - Load from /proc/stat and frequency from cpufreq
+    * **GR3D** - GPU load and devfreq frequency
+    * **EMC** - EMC clock rate and activity monitor, only as root
+    * **APE**, **NVENC**, **NVDEC**, **MSENC** - Clock rate when enabled, only as root
+    * **RAM**, **SWAP** - From /proc/meminfo and /proc/buddyinfo
+    * **TEMP** - All thermal zones
+    * **WATT** - INA3221 rails from iio or hwmon, the average is from the collector start
+
+    All files stay open and are read again with pread at every sample.
+    The callback receives a :class:`~jtop.core.sample.TegraSample`, like :class:`~jtop.core.tegrastats.Tegrastats`.
+
+    :param callback: Function called with every new sample
+    :param root: Root of the sysfs and procfs paths, used for tests
+    """
+
+    def __init__(self, callback, root='/'):
+        self.callback = callback
+        self.root = root
+        self._files = []
+        self._thread = None
+        self._stop = Event()
+        self._error = None
+        self._samples = 0
+        self._late = 0
+        self._cpu_prev = {}
+        self._watt_sum = {}
+
+    def _sysfile(self, paths):
+        sysfile = _open(self.root, paths)
+        if sysfile is not None:
+            self._files.append(sysfile)
+        return sysfile
+
+    def setup(self):
+        """ Open all files available on this board """
+        self.close_files()
+        self._samples = 0
+        self._cpu_prev = {}
+        self._watt_sum = {}
+        self._stat = self._sysfile(PROC_STAT)
+        self._meminfo = self._sysfile(PROC_MEMINFO)
+        self._buddyinfo = self._sysfile(PROC_BUDDYINFO)
+        # CPU
+        present = _open(self.root, CPU_PRESENT)
+        cpus = _range(present.read()) if present is not None else []
+        if present is not None:
+            present.close()
+        self._cpus = [(idx, self._sysfile(CPU_FREQ.format(idx=idx))) for idx in cpus]
+        # GPU
+        self._gpu_load = self._sysfile(GPU_LOAD)
+        self._gpu_freq = None
+        if self._gpu_load is not None:
+            devfreq = sorted(glob(os.path.join(os.path.dirname(self._gpu_load.path), 'devfreq', '*', 'cur_freq')))
+            self._gpu_freq = self._sysfile(devfreq[0]) if devfreq else None
+        # EMC
+        self._emc_rate = self._sysfile(EMC_RATE)
+        self._emc_activity = self._sysfile(EMC_ACTIVITY)
+        # Engines
+        self._engines = []
+        for name, clk in sorted(ENGINE_CLOCKS.items()):
+            rate = self._sysfile(ENGINE_RATE.format(clk=clk))
+            if rate is not None:
+                self._engines.append((name, rate, self._sysfile(ENGINE_ENABLE.format(clk=clk))))
+        # Thermal zones
+        self._thermals = []
+        for zone in sorted(glob(os.path.join(self.root, THERMAL_ZONES))):
+            name = _read_name(os.path.join(zone, 'type'))
+            temp = self._sysfile(os.path.join(zone, 'temp'))
+            if name and temp is not None:
+                self._thermals.append((_thermal_name(name), temp))
+        # Power rails
+        self._rails = []
+        for device in sorted(glob(os.path.join(self.root, INA3221_IIO))):
+            for rail_name in sorted(glob(os.path.join(device, 'rail_name_*'))):
+                channel = rail_name.rsplit('_', 1)[1]
+                power = self._sysfile(os.path.join(device, 'in_power{ch}_input'.format(ch=channel)))
+                if power is not None:
+                    self._rails.append((_read_name(rail_name), power, None))
+        for device in sorted(glob(os.path.join(self.root, HWMON))):
+            if _read_name(os.path.join(device, 'name')) != 'ina3221':
+                continue
+            for label in sorted(glob(os.path.join(device, 'in*_label'))):
+                channel = os.path.basename(label)[2:-len('_label')]
+                current = self._sysfile(os.path.join(device, 'curr{ch}_input'.format(ch=channel)))
+                voltage = self._sysfile(os.path.join(device, 'in{ch}_input'.format(ch=channel)))
+                if current is not None and voltage is not None:
+                    self._rails.append((_read_name(label), current, voltage))
+        logger.info("sysfs collector {files} files open".format(files=len(self._files)))
+
+    def _read_cpus(self):
+        cores = {}
+        if self._stat is None:
+            return ()
+        for line in self._stat.read().splitlines():
+            if not line.startswith('cpu') or line.startswith('cpu '):
+                continue
+            fields = line.split()
+            times = [int(value) for value in fields[1:]]
+            # idle and iowait
+            idle = times[3] + (times[4] if len(times) > 4 else 0)
+            cores[int(fields[0][3:])] = (sum(times), idle)
+        cpus = []
+        for idx, freq in self._cpus:
+            if idx not in cores:
+                # Core off
+                cpus.append(None)
+                continue
+            total, idle = cores[idx]
+            prev_total, prev_idle = self._cpu_prev.get(idx, (0, 0))
+            self._cpu_prev[idx] = (total, idle)
+            delta = total - prev_total
+            load = int(round(100.0 * (delta - (idle - prev_idle)) / delta)) if delta > 0 else 0
+            cpus.append(ValFreq(load, _value(freq)))
+        return tuple(cpus)
+
+    def _read_memory(self):
+        if self._meminfo is None:
+            return None, None
+        meminfo = {}
+        for line in self._meminfo.read().splitlines():
+            name, _, value = line.partition(':')
+            meminfo[name] = int(value.split()[0]) if value.strip() else 0
+        # Number of free blocks with the largest order
+        nblock = 0
+        if self._buddyinfo is not None:
+            for line in self._buddyinfo.read().splitlines():
+                fields = line.split()
+                if fields:
+                    nblock += int(fields[-1])
+        use = meminfo.get('MemTotal', 0) - meminfo.get('MemFree', 0) - meminfo.get('Buffers', 0) - meminfo.get('Cached', 0)
+        ram = Memory(use // 1024, meminfo.get('MemTotal', 0) // 1024, 'M', 'lfb', LFB_SIZE, 'M', nblock)
+        swap = None
+        if meminfo.get('SwapTotal', 0) > 0:
+            swap = Memory((meminfo['SwapTotal'] - meminfo.get('SwapFree', 0)) // 1024, meminfo['SwapTotal'] // 1024, 'M',
+                          'cached', meminfo.get('SwapCached', 0) // 1024, 'M', None)
+        return ram, swap
+
+    def _read_vals(self):
+        vals = {}
+        load = _value(self._gpu_load)
+        if load is not None:
+            frq = _value(self._gpu_freq)
+            # Load in per mille and frequency in Hz
+            vals['GR3D'] = ValFreq(load // 10, frq // 1000 if frq is not None else None)
+        rate = _value(self._emc_rate)
+        if rate is not None:
+            rate = rate // 1000
+            activity = _value(self._emc_activity, 0)
+            vals['EMC'] = ValFreq(min(100, activity * 100 // rate) if rate else 0, rate)
+        for name, rate, enable in self._engines:
+            rate = _value(rate)
+            if rate is None or _value(enable, 1) == 0:
+                continue
+            # Engines are reported in MHz
+            vals[name] = ValFreq(rate // 1000000, None)
+        return vals
+
+    def _read_watts(self):
+        watts = {}
+        for name, power, voltage in self._rails:
+            # iio reports mW, hwmon mA and mV
+            cur = _value(power)
+            if cur is not None and voltage is not None:
+                mv = _value(voltage)
+                cur = cur * mv // 1000 if mv is not None else None
+            if cur is None:
+                continue
+            total = self._watt_sum.get(name, 0) + cur
+            self._watt_sum[name] = total
+            watts[name] = Rail(cur, total // self._samples)
+        return watts
+
+    def read(self):
+        """ Read a new sample
+
+        :return: New sample
+        :rtype: TegraSample
+        """
+        self._samples += 1
+        ram, swap = self._read_memory()
+        temps = {}
+        for name, temp in self._thermals:
+            value = _value(temp)
+            if value is not None:
+                temps[name] = value / 1000.0
+        return TegraSample(ram, swap, None, None, self._read_cpus(), self._read_vals(), temps, self._read_watts())
+
+    def status(self):
+        """
+        Status of the collector:
+
+        * **collector** - Name of the collector
+        * **samples** - Number of samples read
+        * **late** - Number of samples read later than the interval
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        return {'collector': 'sysfs', 'samples': self._samples, 'late': self._late}
+
+    def _run(self, interval, stop):
+        try:
+            deadline = clock()
+            while not stop.is_set():
+                self.callback(self.read())
+                deadline += interval
+                delay = deadline - clock()
+                if delay < 0:
+                    self._late += 1
+                    deadline = clock()
+                    delay = 0
+                if stop.wait(delay):
+                    break
+        except Exception:
+            # Write error message
+            self._error = sys.exc_info()
+
+    def open(self, interval=0.5):
+        if self._thread is not None:
+            return False
+        self.setup()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, args=(interval, self._stop, ))
+        self._thread.start()
+        return True
+
+    def close_files(self):
+        for sysfile in self._files:
+            sysfile.close()
+        self._files = []
+
+    def close(self, timeout=None):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+            self.close_files()
+        # Catch exception if exist
+        if self._error:
+            # Extract exception and raise
+            ex_type, ex_value, tb_str = self._error
+            self._error = None
+            ex_value.__traceback__ = tb_str
+            raise ex_value
+        return True
+# EOF
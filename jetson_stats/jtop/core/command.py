@@ -17,6 +17,8 @@
 
 import os
 import sys
+import time
+import signal
 import logging
 import threading
 # Launch command
@@ -26,9 +28,38 @@ try:
     import queue
 except ImportError:
     import Queue as queue
+try:
+    from shutil import which
+except ImportError:
+    # Python 2
+    from distutils.spawn import find_executable as which
 # Create logger
 logger = logging.getLogger(__name__)
 EXTRA_TIMEOUT = 1.0
+# Processes running at the same time
+COMMAND_WORKERS = 4
+# Monotonic clock
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+# Python 2 communicate does not have a timeout, the output is read by another thread
+COMMUNICATE_TIMEOUT = hasattr(sp, 'TimeoutExpired')
+try:
+    DEVNULL = sp.DEVNULL
+except AttributeError:
+    # Python 2
+    DEVNULL = open(os.devnull, 'rb')
+# Every command in a new session, on timeout all the process group is stopped
+if sys.version_info >= (3, 2):
+    SESSION = {'start_new_session': True}
+else:
+    SESSION = {'preexec_fn': os.setsid}
+# From Python 3.4 the file descriptors are not inherited (PEP 446), and from 3.8 Popen
+# is faster without closing them. On older versions all service descriptors would leak in the command
+CLOSE_FDS = sys.version_info < (3, 8)
+# Time between two checks of a process terminated
+STOP_POLL = 0.05
 # Reference:
 # https://eli.thegreenplace.net/2017/interacting-with-a-long-running-child-process-in-python/
 # https://stackoverflow.com/questions/37942022/returncode-of-popen-object-is-none-after-the-process-is-terminated/42376107
@@ -65,53 +96,280 @@ class Command(object):
         raise Command.CommandException("Error to start {command}".format(command=command), -2)
 
     def __init__(self, command):
-        self.process = None
         self.command = command
 
     def __call__(self, timeout=None):
-        def target(out_queue, err_queue):
-            # Run process
-            try:
-                # https://stackoverflow.com/questions/33277452/prevent-unexpected-stdin-reads-and-lock-in-subprocess
-                self.process = sp.Popen(self.command, stdout=sp.PIPE, stderr=sp.PIPE, stdin=open(os.devnull), preexec_fn=os.setsid)
-                # Read lines output
-                for line in iter(self.process.stdout.readline, b''):
-                    line = line.decode('utf-8')
-                    line = str(line.strip())
-                    out_queue.put(line)
-                # Close and terminate
-                self.process.stdout.close()
-                self.process.wait()
-            except Exception:
-                # Store error message
-                err_queue.put(sys.exc_info())
-        # Initialize lists
-        is_timeout = False
-        out_queue = queue.Queue()
-        err_queue = queue.Queue()
-        thread = threading.Thread(target=target, args=(out_queue, err_queue, ))
-        thread.start()
-        # Wait timeout process
-        thread.join(timeout)
-        if thread.is_alive():
-            logger.error('Terminating process: {command}'.format(command=self.command))
-            if self.process is not None:
-                self.process.terminate()
-            thread.join(timeout=EXTRA_TIMEOUT)
-            logger.warning('Process terminated: {command}'.format(command=self.command))
-            is_timeout = True
-        # Read the output
-        # Extract exception and raise
-        if not err_queue.empty():
-            ex_type, ex_value, tb_str = err_queue.get()
-            ex_value.__traceback__ = tb_str
-            raise ex_value
-        if is_timeout:
-            raise Command.TimeoutException()
-        if self.process.returncode != 0:
-            raise Command.CommandException('Error process:', self.process.returncode)
-        return list(out_queue.queue)
+        """ Run the command in the shared :class:`CommandPool`
+
+            :return: Lines of the output
+            :rtype: list
+            :raises Command.TimeoutException: if the command does not end in timeout seconds
+            :raises Command.CommandException: if the command exits with an error
+        """
+        return command_pool().run(self.command, timeout=timeout)
 
     def communicate(self, timeout=None):
         self.__call__(timeout=timeout)
+
+
+class CommandJob(object):
+    """ Command waiting or running in a :class:`CommandPool`, the timeout starts when the job is queued """
+
+    def __init__(self, command, timeout):
+        self.command = command
+        self.timeout = timeout
+        self.lines = None
+        self.error = None
+        self.submitted = clock()
+        self.deadline = self.submitted + timeout if timeout is not None else None
+        self._lock = threading.Lock()
+        self._started = False
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def remaining(self):
+        """ Seconds until the deadline, None without timeout """
+        if self.deadline is None:
+            return None
+        return self.deadline - clock()
+
+    def start(self):
+        """ Mark the job as running
+
+            :return: False if the job was cancelled
+            :rtype: bool
+        """
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._started = True
+            return True
+
+    def cancel(self):
+        """ Remove the job from the queue, a job already running is not stopped
+
+            :return: True if the job will not run
+            :rtype: bool
+        """
+        with self._lock:
+            if self._started:
+                return False
+            if not self._done.is_set():
+                self.error = Command.TimeoutException()
+                self._done.set()
+            return True
+
+    def wait(self, timeout=None):
+        """ Wait the end of the command, until the deadline of the job or timeout seconds
+
+            :return: Lines of the output
+            :rtype: list
+            :raises Command.TimeoutException: if the command does not end in time, a queued job is cancelled
+        """
+        remaining = self.remaining()
+        # The worker stops the command at the deadline of the job
+        stopped = remaining is not None and (timeout is None or remaining <= timeout)
+        if timeout is not None and not stopped:
+            remaining = timeout
+        if not self._done.wait(max(remaining, 0) if remaining is not None else None):
+            if self.cancel() or not stopped:
+                raise Command.TimeoutException()
+            self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.lines
+
+
+def _signal(process, sig):
+    """ Send a signal to the process and to all its children """
+    try:
+        os.killpg(process.pid, sig)
+    except OSError:
+        # Process group already ended
+        pass
+
+
+def _stop(process):
+    """ Terminate the process group, kill after EXTRA_TIMEOUT seconds """
+    _signal(process, signal.SIGTERM)
+    deadline = clock() + EXTRA_TIMEOUT
+    while process.poll() is None and clock() < deadline:
+        time.sleep(STOP_POLL)
+    if process.poll() is None:
+        _signal(process, signal.SIGKILL)
+
+
+def _communicate(process, timeout):
+    """ Output of the process, the process group is stopped after timeout seconds
+
+        :return: standard output and True if the process was stopped
+        :rtype: tuple
+    """
+    if timeout is None:
+        return process.communicate()[0], False
+    if COMMUNICATE_TIMEOUT:
+        try:
+            return process.communicate(timeout=timeout)[0], False
+        except sp.TimeoutExpired:
+            _stop(process)
+            return process.communicate()[0], True
+    # Python 2, only this thread reads the pipes
+    output = []
+    reader = threading.Thread(target=lambda: output.append(process.communicate()[0]))
+    reader.daemon = True
+    reader.start()
+    reader.join(timeout)
+    if not reader.is_alive():
+        return output[0], False
+    _stop(process)
+    reader.join()
+    return output[0], True
+
+
+class CommandPool(object):
+    """
+    Few threads always alive that run all commands of the service.
+
+    At most **workers** processes run at the same time, the other commands wait in a queue:
+    the timeout of a command counts also the time in the queue.
+    The executable is resolved once, every process runs in a new session: after the timeout
+    all the process group is terminated, and killed after **EXTRA_TIMEOUT** seconds.
+
+    :param workers: Number of threads
+    """
+
+    def __init__(self, workers=COMMAND_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._threads = []
+        self._queue = queue.Queue()
+        self._pid = None
+        self._paths = {}
+        self._stats = {}
+
+    def _start(self):
+        # Threads are not copied in a forked process, start new threads
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._threads = []
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(self._queue, ))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, command, timeout=None):
+        """ Queue a command
+
+            :return: Job of the command
+            :rtype: CommandJob
+        """
+        job = CommandJob(command, timeout)
+        with self._lock:
+            self._start()
+            self._queue.put(job)
+        return job
+
+    def run(self, command, timeout=None):
+        """ Run a command and wait the output, look :func:`Command.__call__`
+
+            The timeout starts when the command is queued, also the time waiting a free thread is counted
+        """
+        return self.submit(command, timeout=timeout).wait()
+
+    def _worker(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            if not job.start():
+                # Cancelled while waiting in the queue
+                self._measure(job, clock() - job.submitted)
+                continue
+            try:
+                remaining = job.remaining()
+                if remaining is not None and remaining <= 0:
+                    raise Command.TimeoutException()
+                job.lines = self._execute(job.command, remaining)
+            except Exception as e:
+                job.error = e
+            self._measure(job, clock() - job.submitted)
+            job._done.set()
+
+    def _executable(self, name):
+        if os.path.dirname(name):
+            return name
+        path = self._paths.get(name)
+        if path is None:
+            path = which(name) or name
+            self._paths[name] = path
+        return path
+
+    def _execute(self, command, timeout):
+        command = [self._executable(command[0])] + list(command[1:])
+        # https://stackoverflow.com/questions/33277452/prevent-unexpected-stdin-reads-and-lock-in-subprocess
+        process = sp.Popen(command, stdout=sp.PIPE, stderr=sp.PIPE, stdin=DEVNULL, close_fds=CLOSE_FDS, **SESSION)
+        out, stopped = _communicate(process, timeout)
+        if stopped:
+            logger.warning('Process terminated after {timeout:.2f}s: {command}'.format(timeout=timeout, command=command))
+            raise Command.TimeoutException()
+        if process.returncode != 0:
+            raise Command.CommandException('Error process:', process.returncode)
+        return [str(line.strip()) for line in out.decode('utf-8').splitlines()]
+
+    def _measure(self, job, latency):
+        name = os.path.basename(job.command[0])
+        with self._lock:
+            stats = self._stats.setdefault(name, {'calls': 0, 'errors': 0, 'timeouts': 0, 'time': 0.0, 'max': 0.0})
+            stats['calls'] += 1
+            stats['time'] += latency
+            stats['max'] = max(stats['max'], latency)
+            if isinstance(job.error, Command.TimeoutException):
+                stats['timeouts'] += 1
+            elif job.error is not None:
+                stats['errors'] += 1
+
+    def status(self):
+        """
+        Latency of the commands, for each executable:
+
+        * **calls** - Number of runs
+        * **errors** - Runs ended with an error
+        * **timeouts** - Runs terminated after the timeout
+        * **mean** - Mean time of a run, in seconds, with the time waiting a free thread
+        * **max** - Longest run, in seconds
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((name, {'calls': stats['calls'], 'errors': stats['errors'], 'timeouts': stats['timeouts'],
+                                'mean': stats['time'] / stats['calls'], 'max': stats['max']})
+                        for name, stats in self._stats.items())
+
+    def close(self):
+        """ Stop all threads after the commands in queue """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            for _ in self._threads:
+                self._queue.put(None)
+            threads = self._threads
+            self._threads = []
+            self._pid = None
+        for thread in threads:
+            thread.join()
+
+
+# Pool shared by all commands
+_POOL = CommandPool()
+
+
+def command_pool():
+    """ Shared :class:`CommandPool` """
+    return _POOL
 # EOF
@@ -30,6 +30,7 @@ import fcntl
 import struct
 import array
 from .exceptions import JtopException
+from . import sysfs
 # Load Author
 AUTH_RE = re.compile(r""".*__author__ = ["'](.*?)['"]""", re.S)
 # Create logger
@@ -121,8 +122,7 @@ def get_uptime():
     """ Read uptime system
         http://planzero.org/blog/2012/01/26/system_uptime_in_python,_a_better_way
     """
-    with open('/proc/uptime', 'r') as f:
-        uptime_seconds = float(f.readline().split()[0])
+    uptime_seconds = float(sysfs.read('/proc/uptime').split()[0])
     return uptime_seconds
 
 
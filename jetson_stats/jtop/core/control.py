@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Control messages from a client to the service.
+# With the stream every message is a request with its own sequence number, and only this
+# client receives the reply. Without the stream the messages go on the queue of the service
+# and the configuration for a new client comes back on the queue of the replies.
+import logging
+import time
+import uuid
+from .exceptions import JtopException
+from .stream import REQUEST_TIMEOUT, REQUEST_POLL, clock
+# Load queue library for python 2 and python 3
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class Controller(object):
+    """
+    Sender of the control messages of a client.
+
+    :func:`put` does not wait the service, with the stream the reply is passed to a callback,
+    look :func:`~jtop.service.JtopServer.control` for all replies.
+
+    :param controller: Queue of the service, shared by all clients
+    :param stream: Subscriber of the stream, None if not available
+    :param replies: Queue of the configurations sent by the service to the clients without the stream
+    """
+
+    def __init__(self, controller, stream=None, replies=None, timeout=REQUEST_TIMEOUT):
+        self._queue = controller
+        self._stream = stream
+        self._replies = replies
+        self._timeout = timeout
+
+    def put(self, control, callback=None):
+        """ Send a control message without wait the service
+
+            With the stream the reply of the service is passed to callback,
+            a failed control is logged. Without the stream there is no reply.
+
+            :param callback: Function called with the reply of the service
+        """
+        if self._stream is None:
+            self._queue.put(control)
+            return
+
+        def reply(data):
+            if 'error' in data:
+                logger.error("Control {control} failed: {error}".format(control=list(control), error=data['error']))
+            elif callback is not None:
+                callback(data['reply'])
+        self._stream.send({'control': control}, reply)
+
+    def alive(self):
+        """ Keep alive message, the service stops sampling when the clients do not send messages """
+        if self._queue.empty():
+            self._queue.put({})
+
+    def init(self, interval, transport, timeout):
+        """ Start the service at the interval and read the configuration of the service
+
+            :raises JtopException: if the service does not reply in time
+        """
+        if self._stream is not None:
+            control = {'init': {'interval': interval, 'transport': transport}}
+            return self._stream.request({'control': control}, timeout=max(timeout, self._timeout))['init']
+        # Clients without the stream: the reply is on the queue of the replies shared by all clients,
+        # with the token of the client and the time until the client waits the reply
+        token = uuid.uuid4().hex
+        deadline = clock() + max(timeout, self._timeout)
+        expire = time.time() + max(timeout, self._timeout)
+        self._queue.put({'interval': interval, 'transport': transport, 'client': token, 'expire': expire})
+        while True:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                raise JtopException("The jetson_stats.service does not reply")
+            try:
+                data = self._replies.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if data.get('client') == token:
+                return data['init']
+            # Reply of another client still waiting, otherwise dropped
+            if data.get('expire', 0) > time.time():
+                self._replies.put(data)
+                time.sleep(REQUEST_POLL)
+# EOF
@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+# Logging
+import logging
+# Create logger
+logger = logging.getLogger(__name__)
+# Name of the total power in all reports
+TOTAL = 'total'
+# Monotonic clock, time.time on python 2
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+
+
+class EnergyPhase(object):
+    """
+    Energy measured in a phase, in Joule for each rail and for the total
+    """
+
+    def __init__(self, name, nvpmodel=None):
+        self.name = name
+        self.nvpmodel = nvpmodel
+        self.energy = {}
+        self.duration = 0.0
+        self.samples = 0
+        self.work = 0
+
+    def _add(self, power_prev, power, dt):
+        # Trapezoidal integration, power in milliwatt
+        for name, value in power.items():
+            if name in power_prev:
+                self.energy[name] = self.energy.get(name, 0.0) + (power_prev[name] + value) * dt / 2000.0
+        self.duration += dt
+        self.samples += 1
+
+    def report(self):
+        """
+        Report of the phase:
+
+        * **name** - Phase name
+        * **nvpmodel** - NV Power Mode, if available
+        * **duration** - Time in seconds
+        * **energy** - Joule for each rail and **total**
+        * **power** - Average power in milliwatt for each rail and **total**
+        * **work** - Work count
+        * **energy_per_work** - Joule for each unit of work (only if work count is not zero)
+        """
+        report = {'name': self.name,
+                  'nvpmodel': self.nvpmodel,
+                  'duration': self.duration,
+                  'energy': dict(self.energy),
+                  'power': {k: v * 1000.0 / self.duration for k, v in self.energy.items()} if self.duration > 0 else {},
+                  'work': self.work}
+        if self.work:
+            report['energy_per_work'] = {k: v / self.work for k, v in self.energy.items()}
+        return report
+
+
+class EnergyMeter(object):
+    """
+    Energy accumulator for the jtop observer stream.
+
+    Every sample of :func:`~jtop.jtop.jtop.power` is integrated with the trapezoidal rule
+    on the time between two samples read by the service (:func:`~jtop.jtop.jtop.timestamp`),
+    for each rail and for the total. Samples replayed with :func:`~jtop.jtop.jtop.backfill` are integrated as well.
+    The energy is split in phases, by default a new phase starts when the NV Power Mode changes.
+
+    .. code-block:: python
+
+        meter = EnergyMeter()
+        with jtop() as jetson:
+            jetson.attach(meter)
+            while jetson.ok():
+                # Run your inference
+                meter.add_work(1)
+        print(meter.report())
+
+    :param split_nvpmodel: Start a new phase when the NV Power Mode changes
+    :type split_nvpmodel: bool
+    """
+
+    def __init__(self, split_nvpmodel=True):
+        self.split_nvpmodel = split_nvpmodel
+        self._phases = []
+        self._last = None
+        self._nvpmodel = None
+        self._run = EnergyPhase('run')
+
+    def __call__(self, jetson):
+        total, power = jetson.power
+        nvpmodel = str(jetson.nvpmodel) if jetson.nvpmodel is not None else None
+        changed = nvpmodel != self._nvpmodel
+        self._nvpmodel = nvpmodel
+        if self.split_nvpmodel and changed and self._phases:
+            self.phase(nvpmodel)
+        self.update(total, power, jetson.timestamp)
+
+    def update(self, total, power, timestamp=None):
+        """
+        Add a new sample
+
+        :param total: Total power, dictionary with **cur** in milliwatt
+        :param power: Dictionary of rails, each with **cur** in milliwatt
+        :param timestamp: Sample time in seconds, if None is used the time of the call
+        """
+        timestamp = clock() if timestamp is None else timestamp
+        sample = {name: value['cur'] for name, value in power.items()}
+        sample[TOTAL] = total['cur']
+        if not self._phases:
+            self.phase(self._nvpmodel)
+        if self._last is not None:
+            last_time, last_sample = self._last
+            dt = timestamp - last_time
+            if dt > 0:
+                self._phases[-1]._add(last_sample, sample, dt)
+                self._run._add(last_sample, sample, dt)
+        self._last = (timestamp, sample)
+
+    def phase(self, name):
+        """
+        Start a new phase, the energy from now is stored in this phase
+
+        :param name: Phase name
+        :type name: str
+        """
+        name = str(name) if name is not None else 'phase {idx}'.format(idx=len(self._phases))
+        logger.debug("Energy phase {name}".format(name=name))
+        self._phases.append(EnergyPhase(name, self._nvpmodel))
+
+    def add_work(self, count=1):
+        """
+        Increase the work count (frames, inferences, ...) of the current phase
+
+        :param count: Units of work done
+        :type count: int
+        """
+        if not self._phases:
+            self.phase(self._nvpmodel)
+        self._phases[-1].work += count
+        self._run.work += count
+
+    @property
+    def energy(self):
+        """
+        :return: Joule for each rail and **total** from the first sample
+        :rtype: dict
+        """
+        return dict(self._run.energy)
+
+    def report(self):
+        """
+        Report for the whole run and each phase, look :func:`~jtop.core.energy.EnergyPhase.report`
+
+        :return: Dictionary with **run** and the list of **phases**
+        :rtype: dict
+        """
+        return {'run': self._run.report(), 'phases': [phase.report() for phase in self._phases]}
+
+    def __repr__(self):
+        return str(self.report())
+# EOF
@@ -15,7 +15,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import os
+from . import sysfs
 
 
 class Engine(object):
@@ -67,15 +67,16 @@ class Engine(object):
 def nvjpg(path="/sys/kernel/debug/clk/nvjpg"):
     # Read status enable
     nvjpg = {}
-    # Check if access to this file
-    if os.access(path + "/clk_enable_count", os.R_OK):
-        with open(path + "/clk_enable_count", 'r') as f:
-            # Write status engine
-            nvjpg['status'] = int(f.read()) == 1
-    # Check if access to this file
-    if os.access(path + "/clk_rate", os.R_OK):
-        with open(path + "/clk_rate", 'r') as f:
-            # Write status engine
-            nvjpg['rate'] = int(f.read())
+    # Skip the files without access
+    try:
+        # Write status engine
+        nvjpg['status'] = sysfs.read_int(path + "/clk_enable_count") == 1
+    except (OSError, IOError):
+        pass
+    try:
+        # Write status engine
+        nvjpg['rate'] = sysfs.read_int(path + "/clk_rate")
+    except (OSError, IOError):
+        pass
     return nvjpg
 # EOF
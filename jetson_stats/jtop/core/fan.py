@@ -19,6 +19,7 @@ import re
 import os
 from math import ceil
 from .common import locate_commands
+from . import sysfs
 from .exceptions import JtopException
 # Logging
 import logging
@@ -76,7 +77,7 @@ class Fan(object):
         if self.mode == value:
             return
         # Set new jetson_clocks configuration
-        self._controller.put({'fan': {'mode': value}})
+        self._controller.put({'fan': {'mode': value}}, self._reply)
 
     @property
     def speed(self):
@@ -95,12 +96,16 @@ class Fan(object):
         if self.speed == value:
             return
         # Set new jetson_clocks configuration
-        self._controller.put({'fan': {'speed': value}})
+        self._controller.put({'fan': {'speed': value}}, self._reply)
 
     @property
     def configs(self):
         return self._CONFIGS
 
+    def _reply(self, reply):
+        # Mode and speed set by the service, before the next sample
+        self._status.update((key, value) for key, value in reply['fan'].items() if value is not None)
+
     def _update(self, status):
         self._status = status
 
@@ -308,7 +313,6 @@ class FanService(object):
         return self._status
 
     def _read_status(self, file_read):
-        with open(self.path + file_read, 'r') as f:
-            return f.read()
-        return None
+        # File kept open between updates
+        return sysfs.read(self.path + file_read)
 # EOF
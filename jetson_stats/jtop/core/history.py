@@ -0,0 +1,248 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# History of the samples kept by the service.
+# The last minutes are stored at full rate, older samples as rollups: the mean of all
+# samples in a fixed interval.
+# The samples at full rate are the keyframes and deltas encoded for the stream, stored as they are
+# and decoded only for a request. A rollup stores only its numbers, the other values are in a
+# skeleton shared by all rollups with the same layout.
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+from threading import Lock
+from .sample import RECORDS
+from .stream import unpack, patch, merge, FRAME_KEYFRAME
+# Time of the samples at full rate, in seconds
+HISTORY_TIME = 15 * 60
+# Interval of a rollup and time of all rollups, in seconds
+ROLLUP_INTERVAL = 10.0
+ROLLUP_TIME = 24 * 3600
+
+
+def rollup(samples):
+    """ Mean of all numbers in the samples, all other values from the last sample """
+    last = samples[-1]
+    if isinstance(last, dict):
+        values = {}
+        for key in last:
+            values[key] = rollup([sample[key] for sample in samples if isinstance(sample, dict) and key in sample])
+        return values
+    if isinstance(last, RECORDS):
+        # Each field of the records
+        samples = [sample for sample in samples if type(sample) is type(last)]
+        return type(last)(*[rollup([sample[idx] for sample in samples]) for idx in range(len(last))])
+    # Booleans are integers
+    if isinstance(last, bool) or not isinstance(last, (int, float)):
+        return last
+    numbers = [sample for sample in samples if isinstance(sample, (int, float)) and not isinstance(sample, bool)]
+    mean = float(sum(numbers)) / len(numbers)
+    return mean if isinstance(last, float) else int(round(mean))
+
+
+def skeleton(value, numbers):
+    """ Value with all numbers replaced by their type, the numbers are appended in numbers """
+    if isinstance(value, dict):
+        return dict((key, skeleton(item, numbers)) for key, item in value.items())
+    if isinstance(value, RECORDS):
+        return type(value)(*[skeleton(item, numbers) for item in value])
+    if isinstance(value, list):
+        return [skeleton(item, numbers) for item in value]
+    # Booleans are integers
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    numbers.append(value)
+    return type(value)
+
+
+def fill(value, numbers):
+    """ Value from a skeleton and an iterator of its numbers, the opposite of :func:`skeleton` """
+    if isinstance(value, dict):
+        return dict((key, fill(item, numbers)) for key, item in value.items())
+    if isinstance(value, RECORDS):
+        return type(value)(*[fill(item, numbers) for item in value])
+    if isinstance(value, list):
+        return [fill(item, numbers) for item in value]
+    if value is int or value is float:
+        return value(next(numbers))
+    return value
+
+
+class _Series(object):
+    """ Samples sorted by time, the oldest are removed after a time """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.times = deque()
+        self.samples = deque()
+
+    def append(self, time, sample):
+        self.times.append(time)
+        self.samples.append(sample)
+        while self.times and self.times[0] < time - self.duration:
+            self.times.popleft()
+            self.samples.popleft()
+
+    def range(self, start, end):
+        first, last = bisect_left(self.times, start), bisect_right(self.times, end)
+        return list(zip(islice(self.times, first, last), islice(self.samples, first, last)))
+
+
+class _Frames(object):
+    """ Samples encoded as keyframes and deltas, the oldest are removed a keyframe at a time """
+
+    def __init__(self):
+        self.times = deque()
+        # Static data, kind and payload of each sample
+        self.frames = deque()
+        self._keyframes = deque()
+        self._static = None
+
+    def append(self, time, encoded):
+        if encoded.kind != FRAME_KEYFRAME and not self.frames:
+            # Delta without the previous samples
+            return False
+        if encoded.changed or self._static is None:
+            self._static = encoded.static
+        self.times.append(time)
+        self.frames.append((self._static, encoded.kind, encoded.payload))
+        if encoded.kind == FRAME_KEYFRAME:
+            self._keyframes.append(time)
+        return True
+
+    def remove(self, time):
+        """ Remove the samples before the last keyframe older than time, the deltas need their keyframe """
+        while len(self._keyframes) > 1 and self._keyframes[1] <= time:
+            self._keyframes.popleft()
+            self.times.popleft()
+            self.frames.popleft()
+            while self.frames[0][1] != FRAME_KEYFRAME:
+                self.times.popleft()
+                self.frames.popleft()
+
+    def first(self, time):
+        """ Time of the first sample not older than time, None if not available """
+        idx = bisect_left(self.times, time)
+        return self.times[idx] if idx < len(self.times) else None
+
+    def frames_from(self, start, end):
+        """ Times and frames between start and end, from the last keyframe before start """
+        first, last = bisect_left(self.times, start), bisect_right(self.times, end)
+        while first > 0 and first < len(self.frames) and self.frames[first][1] != FRAME_KEYFRAME:
+            first -= 1
+        return list(zip(islice(self.times, first, last), islice(self.frames, first, last)))
+
+
+def _decode(frames, start):
+    """ Samples of the frames from :func:`_Frames.frames_from` not older than start """
+    samples = []
+    statics = {}
+    last = None
+    for time, (static, kind, payload) in frames:
+        last = unpack(payload) if kind == FRAME_KEYFRAME else patch(last, unpack(payload))
+        if time < start:
+            continue
+        if static not in statics:
+            statics[static] = unpack(static)
+        samples.append((time, merge(last, statics[static])))
+    return samples
+
+
+class History(object):
+    """
+    Bounded history of the samples.
+
+    * **HISTORY_TIME** seconds of samples at full rate
+    * **ROLLUP_TIME** seconds of rollups, one every **ROLLUP_INTERVAL** seconds, look :func:`rollup`
+
+    The samples are the same encoded for the stream, look :class:`~jtop.core.stream.SampleEncoder`
+
+    :param duration: Time of the samples at full rate
+    :param interval: Interval of a rollup
+    :param rollups: Time of the rollups
+    """
+
+    def __init__(self, duration=HISTORY_TIME, interval=ROLLUP_INTERVAL, rollups=ROLLUP_TIME):
+        self.duration = duration
+        self.interval = interval
+        self._full = _Frames()
+        self._rollups = _Series(rollups)
+        self._bucket_start = None
+        self._skeleton = None
+        self._last = None
+        self._lock = Lock()
+
+    def append(self, time, encoded):
+        """ Store a new sample
+
+            :param time: Time of the sample in seconds from epoch
+            :param encoded: Sample encoded by :class:`~jtop.core.stream.SampleEncoder`, stored without copies
+        """
+        with self._lock:
+            if not self._full.append(time, encoded):
+                return
+            self._last = time
+            if self._bucket_start is None:
+                self._bucket_start = time
+            elif time - self._bucket_start >= self.interval:
+                self._close_bucket(time)
+                self._bucket_start = time
+            # The samples of the next rollup are kept also if older
+            self._full.remove(min(time - self.duration, self._bucket_start))
+
+    def _close_bucket(self, end):
+        samples = [sample for time, sample in _decode(self._full.frames_from(self._bucket_start, end), self._bucket_start) if time < end]
+        if not samples:
+            return
+        numbers = []
+        layout = skeleton(rollup(samples), numbers)
+        # The same skeleton for all rollups with the same layout
+        if layout != self._skeleton:
+            self._skeleton = layout
+        self._rollups.append(self._bucket_start, (self._skeleton, array('d', numbers)))
+
+    def range(self, start, end=None):
+        """ Samples between start and end
+
+            The samples at full rate are used when available, rollups for older times.
+
+            :return: List of time and sample
+            :rtype: list
+        """
+        end = float('inf') if end is None else end
+        with self._lock:
+            if self._last is None:
+                return []
+            # First sample at full rate
+            first = self._full.first(self._last - self.duration)
+            frames = self._full.frames_from(max(start, first), end)
+            rollups = self._rollups.range(start, min(end, first)) if start < first else []
+        rollups = [(time, fill(layout, iter(numbers))) for time, (layout, numbers) in rollups if time < first]
+        # Decoded without the lock, the service is not delayed
+        return rollups + _decode(frames, max(start, first))
+
+    def reply(self, start, end=None):
+        """ Samples between start and end for a request of the stream, look :func:`range` """
+        return [[time, sample] for time, sample in self.range(start, end)]
+
+    def __len__(self):
+        with self._lock:
+            first = self._full.first(self._last - self.duration) if self._last is not None else None
+            full = len(self._full.times) - bisect_left(self._full.times, first) if first is not None else 0
+            return full + len(self._rollups.times)
+# EOF
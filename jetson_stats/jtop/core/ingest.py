@@ -0,0 +1,279 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Offline ingestion of tegrastats logs (tegrastats --logfile) in columnar files.
+
+The log is split in chunks of lines, every chunk is decoded in a process pool
+with :class:`~jtop.core.tegra_parse.TegraParser` and the values are stored in a folder
+with one file for each column, an array of float64 in the byte order of the machine:
+
+* **time** - Time of the line in seconds from epoch, NaN if the log has no timestamps
+* **RAM/use**, **RAM/tot**, **SWAP/use**, ... - Memory in kB
+* **CPU1/val**, **CPU1/frq**, ... - Load in % and frequency in kHz, NaN when the core is off
+* **GR3D/val**, **EMC/frq**, ... - All single values
+* **TEMP/CPU**, ... - Temperatures in Celsius
+* **WATT/VDD_IN/cur**, **WATT/VDD_IN/avg**, ... - Power in milliwatt
+
+A value missing in a line is NaN. The list of columns is in **columns.json**,
+every column can be memory-mapped with :func:`load_columns` or numpy.memmap.
+The plot and statistics tools (plot_log.py, examples/calc_cpu_usage.py) read a columnar folder
+with :func:`load_columns`, the memory-mapped columns are used as numpy arrays without copy.
+
+Usage:
+    python -m jtop.core.ingest tegrastats.log output_folder
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from multiprocessing import Pool
+try:
+    import mmap
+except ImportError:
+    mmap = None
+from .tegra_parse import TegraParser
+# Header of the columnar folder
+COLUMNS_FILE = 'columns.json'
+COLUMNS_VERSION = 1
+# Size of each chunk in bytes
+CHUNK_SIZE = 4 * 1024 * 1024
+# Memory units in kB
+MEMORY_UNITS = {'k': 1, 'M': 1024, 'G': 1024 * 1024}
+NAN = float('nan')
+
+
+def _timestamp(line, dates):
+    """ Split the timestamp MM-DD-YYYY HH:MM:SS at the beginning of the line
+
+        :return: seconds from epoch, or NaN if the line has not a timestamp, and the rest of the line
+    """
+    if len(line) < 20 or line[2] != '-' or line[13] != ':':
+        return NAN, line
+    date = line[:10]
+    midnight = dates.get(date)
+    if midnight is None:
+        try:
+            midnight = time.mktime(time.strptime(date, '%m-%d-%Y'))
+        except ValueError:
+            return NAN, line
+        dates[date] = midnight
+    try:
+        seconds = int(line[11:13]) * 3600 + int(line[14:16]) * 60 + int(line[17:19])
+    except ValueError:
+        return NAN, line
+    return midnight + seconds, line[20:]
+
+
+def flatten(sample):
+    """ List of (column, value) of a :class:`~jtop.core.sample.TegraSample` """
+    row = []
+    for name, memory in (('RAM', sample.ram), ('SWAP', sample.swap), ('IRAM', sample.iram)):
+        if memory is not None:
+            unit = MEMORY_UNITS.get(memory.unit, 1)
+            row += [(name + '/use', memory.use * unit), (name + '/tot', memory.tot * unit)]
+    if sample.mts is not None:
+        row += [('MTS/fg', sample.mts.fg), ('MTS/bg', sample.mts.bg)]
+    for idx, cpu in enumerate(sample.cpu):
+        name = 'CPU' + str(idx + 1)
+        if cpu is not None:
+            row += [(name + '/val', cpu.val), (name + '/frq', cpu.frq if cpu.frq is not None else NAN)]
+        else:
+            row += [(name + '/val', NAN), (name + '/frq', NAN)]
+    for name, val in sample.vals.items():
+        row.append((name + '/val', val.val))
+        if val.frq is not None:
+            row.append((name + '/frq', val.frq))
+    row += [('TEMP/' + name, temp) for name, temp in sample.temp.items()]
+    for name, rail in sample.watt.items():
+        row += [('WATT/' + name + '/cur', rail.cur), ('WATT/' + name + '/avg', rail.avg)]
+    return row
+
+
+def _lines(path, start, end):
+    """ Lines that start between start and end of the file """
+    with open(path, 'rb') as f:
+        if start > 0:
+            # Skip the line that starts in the previous chunk
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())
+        else:
+            pos = 0
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+
+def parse_chunk(chunk):
+    """ Decode all lines of a chunk
+
+        :param chunk: path, start and end of the chunk in bytes
+        :return: number of rows, number of lines skipped and columns
+    """
+    path, start, end = chunk
+    parser = TegraParser()
+    dates = {}
+    columns = OrderedDict()
+    rows = 0
+    skipped = 0
+    for line in _lines(path, start, end):
+        line = line.decode('utf-8', 'replace').strip()
+        if not line:
+            continue
+        timestamp, text = _timestamp(line, dates)
+        try:
+            row = flatten(parser(text))
+        except Exception:
+            skipped += 1
+            continue
+        if not row:
+            skipped += 1
+            continue
+        row.insert(0, ('time', timestamp))
+        for name, value in row:
+            column = columns.get(name)
+            if column is None:
+                # New column, missing in the previous rows
+                column = columns[name] = array('d', [NAN]) * rows
+            column.append(value)
+        rows += 1
+        # Pad the columns missing in this line
+        for column in columns.values():
+            if len(column) < rows:
+                column.append(NAN)
+    return rows, skipped, columns
+
+
+def chunks(path, size=CHUNK_SIZE):
+    """ Split a file in chunks of size bytes """
+    length = os.path.getsize(path)
+    return [(path, start, min(start + size, length)) for start in range(0, length, size)]
+
+
+class ColumnWriter(object):
+    """ Folder with one float64 file for each column """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.skipped = 0
+        self._files = OrderedDict()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, name):
+        column = self._files.get(name)
+        if column is None:
+            column = open(os.path.join(self.path, "{idx:04d}.f8".format(idx=len(self._files))), 'wb')
+            # Values missing in all previous rows
+            (array('d', [NAN]) * self.rows).tofile(column)
+            self._files[name] = column
+        return column
+
+    def append(self, rows, skipped, columns):
+        for name, values in columns.items():
+            values.tofile(self._file(name))
+        for name, column in self._files.items():
+            if name not in columns:
+                (array('d', [NAN]) * rows).tofile(column)
+        self.rows += rows
+        self.skipped += skipped
+
+    def close(self):
+        header = {'version': COLUMNS_VERSION,
+                  'rows': self.rows,
+                  'skipped': self.skipped,
+                  'dtype': 'float64',
+                  'byteorder': sys.byteorder,
+                  'columns': OrderedDict((name, os.path.basename(column.name)) for name, column in self._files.items())}
+        for column in self._files.values():
+            column.close()
+        with open(os.path.join(self.path, COLUMNS_FILE), 'w') as f:
+            json.dump(header, f, indent=2)
+        return header
+
+
+def ingest(path, output, workers=None, chunk_size=CHUNK_SIZE):
+    """ Decode a tegrastats log in a folder of columns
+
+        :param path: tegrastats log
+        :param output: Output folder
+        :param workers: Number of processes, default the number of CPUs
+        :param chunk_size: Size of each chunk in bytes
+        :return: Header of the columnar folder
+        :rtype: dict
+    """
+    writer = ColumnWriter(output)
+    pool = Pool(workers)
+    try:
+        # Chunks are written in the same order of the log
+        for rows, skipped, columns in pool.imap(parse_chunk, chunks(path, chunk_size)):
+            writer.append(rows, skipped, columns)
+    finally:
+        pool.close()
+        pool.join()
+    return writer.close()
+
+
+def load_columns(path):
+    """ Load a columnar folder, every column is memory-mapped when possible
+
+        :return: Dictionary column -> array of float64
+        :rtype: OrderedDict
+    """
+    with open(os.path.join(path, COLUMNS_FILE), 'r') as f:
+        header = json.load(f, object_pairs_hook=OrderedDict)
+    columns = OrderedDict()
+    for name, filename in header['columns'].items():
+        with open(os.path.join(path, filename), 'rb') as f:
+            if mmap is not None and header['rows'] > 0 and hasattr(memoryview, 'cast'):
+                columns[name] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast('d')
+            else:
+                column = array('d')
+                column.fromfile(f, header['rows'])
+                columns[name] = column
+    return columns
+
+
+def is_columns(path):
+    """ True if the path is a columnar folder written by :func:`ingest` """
+    return os.path.isfile(os.path.join(path, COLUMNS_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a tegrastats log in columnar files")
+    parser.add_argument('log', help='tegrastats log file')
+    parser.add_argument('output', help='Output folder')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of processes (default: number of CPUs)')
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE // 1024, help='Size of each chunk in kB')
+    args = parser.parse_args()
+    start = time.time()
+    header = ingest(args.log, args.output, workers=args.workers, chunk_size=args.chunk * 1024)
+    print("{rows} lines, {columns} columns, {skipped} skipped in {time:.1f}s".format(
+        rows=header['rows'], columns=len(header['columns']), skipped=header['skipped'], time=time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
+# EOF
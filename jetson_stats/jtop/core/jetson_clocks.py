@@ -22,9 +22,11 @@ import logging
 import sys
 # Launch command
 from datetime import timedelta
+from glob import glob
 from threading import Thread, Event
 # Local functions and classes
 from .command import Command
+from .sysfs import SysFile
 from .common import get_uptime, locate_commands
 # Import exceptions
 from .exceptions import JtopException
@@ -55,6 +57,22 @@ EMC_REGEXP = re.compile(r'EMC MinFreq=(.+?) MaxFreq=(.+?) CurrentFreq=(.+?) Freq
 # NVP Model
 # NV Power Mode: MAXN
 NVP_REGEXP = re.compile(r'NV Power Mode: ((.*))')
+# Files with the same status of jetson_clocks --show, relative to the root of the reader
+SHOW_CPU_PRESENT = 'sys/devices/system/cpu/present'
+SHOW_CPU = 'sys/devices/system/cpu/cpu{idx}'
+SHOW_CPU_FREQ = {'governor': 'cpufreq/scaling_governor', 'min_freq': 'cpufreq/scaling_min_freq',
+                 'max_freq': 'cpufreq/scaling_max_freq', 'current_freq': 'cpufreq/scaling_cur_freq'}
+SHOW_GPU_DEVFREQ = ['sys/devices/gpu.0/devfreq/*', 'sys/devices/platform/gpu.0/devfreq/*']
+SHOW_GPU_FREQ = {'min_freq': 'min_freq', 'max_freq': 'max_freq', 'current_freq': 'cur_freq'}
+# EMC clock on BPMP boards or on older boards, only as root
+SHOW_EMC = [{'min_freq': 'sys/kernel/debug/bpmp/debug/clk/emc/min_rate',
+             'max_freq': 'sys/kernel/debug/bpmp/debug/clk/emc/max_rate',
+             'current_freq': 'sys/kernel/debug/bpmp/debug/clk/emc/rate',
+             'FreqOverride': 'sys/kernel/debug/bpmp/debug/clk/emc/mrq_rate_locked'},
+            {'min_freq': 'sys/kernel/debug/tegra_bwmgr/emc_min_rate',
+             'max_freq': 'sys/kernel/debug/tegra_bwmgr/emc_max_rate',
+             'current_freq': 'sys/kernel/debug/clk/emc/clk_rate',
+             'FreqOverride': 'sys/kernel/debug/clk/override.emc/clk_state'}]
 
 
 def decode_show_message(lines):
@@ -129,6 +147,132 @@ def decode_show_message(lines):
     return status
 
 
+def _cpus(text):
+    """ Decode a list of cpus like 0-3,5 """
+    cpus = []
+    for item in text.strip().split(','):
+        if '-' in item:
+            start, end = item.split('-')
+            cpus += range(int(start), int(end) + 1)
+        elif item:
+            cpus.append(int(item))
+    return cpus
+
+
+def _files(root, names):
+    """ Open all files, None if a file is missing """
+    files = {}
+    try:
+        for key, path in names.items():
+            files[key] = SysFile(os.path.join(root, path))
+    except (OSError, IOError):
+        for sysfile in files.values():
+            sysfile.close()
+        return None
+    return files
+
+
+class ShowReader(object):
+    """
+    Status of jetson_clocks --show read from sysfs, without running jetson_clocks:
+
+    * **CPU** - cpufreq and cpuidle of all present CPUs, a CPU without cpufreq is not reported
+    * **GPU** - devfreq of the GPU
+    * **EMC** - EMC clock from debugfs, only as root
+
+    The NV Power Mode and the CPU cluster are not available.
+    The files stay open and are read again at every call, the result has the same
+    structure of :func:`decode_show_message`.
+
+    :param root: Root of the sysfs paths, used for tests
+    """
+
+    def __init__(self, root='/'):
+        self.root = root
+        self._cpus = []
+        present = os.path.join(root, SHOW_CPU_PRESENT)
+        try:
+            with open(present, 'r') as f:
+                cpus = _cpus(f.read())
+        except (OSError, IOError):
+            cpus = []
+        for idx in cpus:
+            folder = os.path.join(root, SHOW_CPU.format(idx=idx))
+            try:
+                # CPU0 cannot go offline
+                online = SysFile(os.path.join(folder, 'online'))
+            except (OSError, IOError):
+                online = None
+            idle = []
+            for state in sorted(glob(os.path.join(folder, 'cpuidle', 'state*'))):
+                try:
+                    with open(os.path.join(state, 'name'), 'r') as f:
+                        name = f.read().strip()
+                    idle.append((name, SysFile(os.path.join(state, 'disable'))))
+                except (OSError, IOError):
+                    continue
+            self._cpus.append((idx, folder, online, idle))
+        self._freqs = {}
+        self._gpu = None
+        for pattern in SHOW_GPU_DEVFREQ:
+            devfreq = sorted(glob(os.path.join(root, pattern)))
+            if devfreq:
+                self._gpu = _files(devfreq[0], SHOW_GPU_FREQ)
+                break
+        self._emc = None
+        for names in SHOW_EMC:
+            self._emc = _files(root, names)
+            if self._emc is not None:
+                break
+
+    def available(self):
+        """ True on a board with cpufreq and the GPU devfreq """
+        return self._gpu is not None and bool(self.read().get('CPU'))
+
+    def _read_cpu(self, idx, folder):
+        # cpufreq files are removed when the CPU is offline
+        files = self._freqs.get(idx)
+        if files is None:
+            files = _files(folder, SHOW_CPU_FREQ)
+            if files is None:
+                return None
+            self._freqs[idx] = files
+        try:
+            cpu = dict((key, sysfile.read().strip()) for key, sysfile in files.items())
+        except (OSError, IOError):
+            del self._freqs[idx]
+            return None
+        for key in ['min_freq', 'max_freq', 'current_freq']:
+            cpu[key] = int(cpu[key])
+        return cpu
+
+    def read(self):
+        """ Status with the same structure of :func:`decode_show_message` """
+        show = {'CPU': {}}
+        for idx, folder, online, idle in self._cpus:
+            cpu = self._read_cpu(idx, folder)
+            if cpu is None:
+                continue
+            cpu['Online'] = online.read_int() == 1 if online is not None else True
+            cpu['IdleStates'] = dict((name, int(disable.read_int() == 0)) for name, disable in idle)
+            show['CPU']["CPU{num}".format(num=idx + 1)] = cpu
+        for name, files in [('GPU', self._gpu), ('EMC', self._emc)]:
+            if files is not None:
+                try:
+                    show[name] = dict((key, sysfile.read_int()) for key, sysfile in files.items())
+                except (OSError, IOError, ValueError):
+                    pass
+        return show
+
+    def close(self):
+        files = [sysfile for _, _, online, idle in self._cpus for sysfile in [online] + [disable for _, disable in idle]]
+        for group in list(self._freqs.values()) + [self._gpu, self._emc]:
+            files += list(group.values()) if group is not None else []
+        for sysfile in files:
+            if sysfile is not None:
+                sysfile.close()
+
+
 def jetson_clocks_alive(show):
     # Make statistics
     stat = []
@@ -151,6 +295,52 @@ def jetson_clocks_alive(show):
     return all(stat)
 
 
+class ShowSnapshot(object):
+    """
+    Immutable status of jetson_clocks --show, a new snapshot replaces the old one at every read.
+
+    The dictionaries of a snapshot must not be changed: they are shared by reference
+    with all samples of the service until the next snapshot.
+
+    :param version: Number of the snapshot, incremented at every read
+    :param show: Status decoded with :func:`decode_show_message`
+    """
+
+    __slots__ = ('version', 'show', '_view')
+
+    def __init__(self, version, show):
+        self.version = version
+        self.show = show
+        self._view = None
+
+    def view(self):
+        """
+        Status to merge in a sample, computed only once for each snapshot:
+
+        * **CPU** - For each CPU: online status (None if not available) and all values without *Online* and *current_freq*
+        * **GPU**, **EMC** - All values without *current_freq*
+        * **NVP**, **cluster** - As in the show
+
+        :return: View dictionary
+        :rtype: dict
+        """
+        if self._view is None:
+            view = {}
+            if 'CPU' in self.show:
+                view['CPU'] = {}
+                for name, cpu in self.show['CPU'].items():
+                    values = dict((k, v) for k, v in cpu.items() if k not in ('Online', 'current_freq'))
+                    view['CPU'][name] = (cpu.get('Online'), values)
+            for name in ['GPU', 'EMC']:
+                if name in self.show:
+                    view[name] = dict((k, v) for k, v in self.show[name].items() if k != 'current_freq')
+            for name in ['NVP', 'cluster']:
+                if name in self.show:
+                    view[name] = self.show[name]
+            self._view = view
+        return self._view
+
+
 class JetsonClocks(object):
     """
         Reference:
@@ -187,7 +377,7 @@ class JetsonClocks(object):
         if value == self._boot:
             return
         # Set new jetson_clocks configuration
-        self._controller.put({'jc': {'boot': value}})
+        self._controller.put({'jc': {'boot': value}}, self._reply)
 
     @property
     def is_alive(self):
@@ -202,6 +392,12 @@ class JetsonClocks(object):
     def __repr__(self):
         return str(self._alive)
 
+    def _reply(self, reply):
+        jc = reply['jc']
+        if not jc.get('enable', True):
+            logger.warning("jetson_clocks is still running, status not changed")
+        self._boot = jc['boot']
+
     def _update(self, jc_status):
         self._config = jc_status['config']
         self._alive = jc_status['status']
@@ -236,23 +432,22 @@ class JetsonClocksService(object):
         self._error = None
         # Fan configuration
         self.fan = fan
+        # Last status of jetson_clocks --show
+        self._snapshot = ShowSnapshot(0, {})
+        # Reader of the status from sysfs, None to run jetson_clocks --show
+        self._reader = None
 
     def initialization(self, nvpmodel):
         self.nvpmodel = nvpmodel
-        # Update status jetson_clocks
-        cmd = Command([self.jc_bin, '--show'])
-        for idx in range(5):
-            try:
-                lines = cmd(timeout=COMMAND_TIMEOUT)
-                break
-            except Command.CommandException as error:
-                logger.error("[{idx}] {error}".format(idx=idx, error=error))
-                # Sleep for a while before run again this script
-                time.sleep(1.0)
-        if idx == 4:
-            raise JtopException("I cannot initialize jetson_clocks controller")
-        # Decode jetson_clocks --show
-        self._show = decode_show_message(lines)
+        # Read the status from sysfs if available
+        reader = ShowReader()
+        if reader.available():
+            logger.info("jetson_clocks status from sysfs")
+            self._reader = reader
+            self._update_show(reader.read())
+        else:
+            reader.close()
+            self._update_show(self._initial_show())
         if not self.event_show.is_set():
             self.event_show.set()
         # Check if exist configuration file
@@ -273,6 +468,22 @@ class JetsonClocksService(object):
             self._set_jc = Thread(target=self._th_start, args=(False, ))
             self._set_jc.start()
 
+    def _initial_show(self):
+        # Update status jetson_clocks
+        cmd = Command([self.jc_bin, '--show'])
+        for idx in range(5):
+            try:
+                lines = cmd(timeout=COMMAND_TIMEOUT)
+                break
+            except Command.CommandException as error:
+                logger.error("[{idx}] {error}".format(idx=idx, error=error))
+                # Sleep for a while before run again this script
+                time.sleep(1.0)
+        if idx == 4:
+            raise JtopException("I cannot initialize jetson_clocks controller")
+        # Decode jetson_clocks --show
+        return decode_show_message(lines)
+
     def _fix_fan(self, speed, status):
         logger.debug("fan mode: {mode}".format(mode=self.fan.mode))
         # Configure fan
@@ -384,10 +595,18 @@ class JetsonClocksService(object):
                 raise JtopException("Lost connection from jtop")
         self.event_show.clear()
         # Return status jetson_clocks
-        return jetson_clocks_alive(self._show)
+        return jetson_clocks_alive(self._snapshot.show)
+
+    def _update_show(self, show):
+        # Replace the snapshot with a single assignment, readers never see a partial status
+        self._snapshot = ShowSnapshot(self._snapshot.version + 1, show)
+
+    def snapshot(self):
+        """ Last :class:`ShowSnapshot` of jetson_clocks --show """
+        return self._snapshot
 
     def show(self):
-        return self._show
+        return self._snapshot.show
 
     def _th_show(self, interval):
         cmd = Command([self.jc_bin, '--show'])
@@ -395,8 +614,11 @@ class JetsonClocksService(object):
             while self._running:
                 try:
                     start = time.time()
-                    lines = cmd(timeout=COMMAND_TIMEOUT)
-                    self._show = decode_show_message(lines)
+                    if self._reader is not None:
+                        self._update_show(self._reader.read())
+                    else:
+                        lines = cmd(timeout=COMMAND_TIMEOUT)
+                        self._update_show(decode_show_message(lines))
                     # Set event from jetson_clocks
                     if not self.event_show.is_set():
                         self.event_show.set()
@@ -446,6 +668,8 @@ class JetsonClocksService(object):
             if self._set_jc.is_alive():
                 logger.warning("Wait switch off set jetson_clocks")
                 self._set_jc.join(COMMAND_TIMEOUT)
+        if self._reader is not None:
+            self._reader.close()
 
     def _error_status(self):
         # Catch exception if exist
@@ -15,11 +15,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import os
 import re
 # Logging
 import logging
 # from .exceptions import JtopException
+from . import sysfs
 # Create logger
 logger = logging.getLogger(__name__)
 # Memory regular exception
@@ -28,15 +28,14 @@ REGEXP = re.compile(r'(.+?):\s+(.+?) (.?)B')
 
 def mem_info(path="/proc/meminfo"):
     list_memory = {}
-    with open(path, "r") as fp:
-        for line in fp:
-            # Search line
-            match = REGEXP.search(line)
-            if match:
-                key = str(match.group(1).strip())
-                value = int(match.group(2).strip())
-                unit = str(match.group(3).strip())
-                list_memory[key] = {'val': value, 'unit': unit}
+    for line in sysfs.read(path).splitlines():
+        # Search line
+        match = REGEXP.search(line)
+        if match:
+            key = str(match.group(1).strip())
+            value = int(match.group(2).strip())
+            unit = str(match.group(3).strip())
+            list_memory[key] = {'val': value, 'unit': unit}
     return list_memory
 
 
@@ -51,9 +50,10 @@ class MemoryService(object):
         - NvMapMemUsed: Is the shared memory between CPU and GPU
         - NvMapMemFree: To be define
         """
-        meminfo = {}
-        if os.path.isfile("/proc/meminfo"):
+        try:
             meminfo = mem_info()
+        except (OSError, IOError):
+            meminfo = {}
         total = meminfo.get('MemTotal', {})
         available = meminfo.get('MemAvailable', {})
         shared = meminfo.get('NvMapMemUsed', {})
@@ -0,0 +1,111 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Cache of the probes read by the service at every sample.
+# Every probe has a time to live, or is read again only when invalidated:
+# a fork of a command or a parse of a file every few seconds instead of every sample.
+import time
+from threading import Lock
+# Monotonic clock
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+
+
+class _Probe(object):
+
+    def __init__(self, read, ttl):
+        self.read = read
+        self.ttl = ttl
+        self.value = None
+        self.time = None
+        # Changed at every invalidate, a read started before is not stored
+        self.generation = 0
+        self.reads = 0
+        self.hits = 0
+
+
+class ProbeCache(object):
+    """
+    Values of probes, read again when the time to live is expired or when invalidated.
+
+    .. code-block:: python
+
+        probes = ProbeCache()
+        probes.register('swap', swap.all, ttl=10.0)
+        probes.get('swap')
+        # After a new swap
+        probes.invalidate('swap')
+    """
+
+    def __init__(self):
+        self._probes = {}
+        self._lock = Lock()
+
+    def register(self, name, read, ttl=None):
+        """ New probe
+
+            :param name: Name of the probe
+            :param read: Function without arguments that reads the probe
+            :param ttl: Time to live in seconds, None to read again only when invalidated
+        """
+        with self._lock:
+            self._probes[name] = _Probe(read, ttl)
+
+    def get(self, name):
+        """ Value of the probe, read only if the time to live is expired or after an invalidate
+
+            :raises KeyError: if the probe is not registered
+        """
+        probe = self._probes[name]
+        now = clock()
+        with self._lock:
+            if probe.time is not None and (probe.ttl is None or now - probe.time < probe.ttl):
+                probe.hits += 1
+                return probe.value
+            generation = probe.generation
+        # Read outside the lock, a probe can be slow
+        value = probe.read()
+        with self._lock:
+            probe.reads += 1
+            if probe.generation == generation:
+                probe.value = value
+                probe.time = now
+        return value
+
+    def invalidate(self, name=None):
+        """ Read again the probe at the next get, all probes if name is None """
+        with self._lock:
+            probes = self._probes.values() if name is None else [self._probes[name]]
+            for probe in probes:
+                probe.time = None
+                probe.generation += 1
+
+    def status(self):
+        """
+        Status of all probes, for each probe:
+
+        * **reads** - Number of reads
+        * **hits** - Number of values from the cache
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((name, {'reads': probe.reads, 'hits': probe.hits}) for name, probe in self._probes.items())
+# EOF
@@ -0,0 +1,279 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Flight recorder of the samples, written by the service also without clients.
+# The samples are stored in segments, files with a sequence of blocks:
+#  - header: magic, number of samples, time of the first and last sample, length and crc32 of the payload
+#  - payload: zlib of all samples, each sample is time, length and the sample encoded with pack
+# A block is written and synced every few seconds, a block not complete after a power off is skipped.
+import csv
+import logging
+import os
+import struct
+import zlib
+from datetime import datetime
+from threading import Thread, Event, Lock
+from .sample import RECORDS
+from .stream import pack, unpack
+# Create logger
+logger = logging.getLogger(__name__)
+BLOCK_MAGIC = b'JREC'
+BLOCK_HEADER = struct.Struct('<4sIddII')
+RECORD_HEADER = struct.Struct('<dI')
+SEGMENT_PREFIX = 'jtop-'
+SEGMENT_SUFFIX = '.rec'
+# Minimum time between two samples, in seconds
+RECORDER_INTERVAL = 5.0
+# Time between two blocks written and synced, in seconds
+RECORDER_SYNC = 30.0
+# Size of a segment, size and age of all segments
+SEGMENT_SIZE = 1024 * 1024
+RECORDER_SIZE = 64 * 1024 * 1024
+RECORDER_AGE = 7 * 24 * 3600
+COMPRESS_LEVEL = 6
+
+
+def segments(path):
+    """ All segments in the folder, from the oldest """
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return []
+    names = [name for name in names if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+    return [os.path.join(path, name) for name in sorted(names)]
+
+
+def _read_segment(name, start, end):
+    with open(name, 'rb') as segment:
+        while True:
+            header = segment.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            magic, count, first, last, length, crc = BLOCK_HEADER.unpack(header)
+            if magic != BLOCK_MAGIC:
+                logger.warning("Segment {name} damaged".format(name=name))
+                return
+            # Skip a block outside the window without decompress
+            if last < start or first > end:
+                segment.seek(length, os.SEEK_CUR)
+                continue
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) & 0xffffffff != crc:
+                # Block not complete, the service was stopped while writing
+                logger.warning("Segment {name} truncated".format(name=name))
+                return
+            payload = zlib.decompress(payload)
+            offset = 0
+            for _ in range(count):
+                stamp, size = RECORD_HEADER.unpack_from(payload, offset)
+                offset += RECORD_HEADER.size
+                if start <= stamp <= end:
+                    yield stamp, unpack(payload[offset:offset + size])
+                offset += size
+
+
+def read(path, start=0, end=None):
+    """ Read all samples recorded between start and end
+
+        :param path: Folder of the recorder
+        :param start: Time in seconds from epoch
+        :param end: Time in seconds from epoch, None for all samples after start
+        :return: Generator of time and sample
+    """
+    end = float('inf') if end is None else end
+    for name in segments(path):
+        for stamp, data in _read_segment(name, start, end):
+            yield stamp, data
+
+
+def flatten(data, prefix=''):
+    """ A single level dictionary, the keys are the path of each value joined with / """
+    values = {}
+    items = data.items() if isinstance(data, dict) else enumerate(data)
+    for key, value in items:
+        name = "{prefix}{key}".format(prefix=prefix, key=key)
+        if isinstance(value, RECORDS):
+            value = value.to_dict()
+        if isinstance(value, (dict, list)):
+            values.update(flatten(value, name + '/'))
+        else:
+            values[name] = value
+    return values
+
+
+def dump_csv(path, output, start=0, end=None):
+    """ Write all samples recorded between start and end in a CSV file
+
+        The first column is the local time of the sample, the other columns are
+        all values of the samples, look :func:`flatten`
+
+        :param output: File opened in write mode
+        :return: Number of samples
+        :rtype: int
+    """
+    # Columns of all samples in the window, the time of the sample is the first column
+    fields = []
+    known = set(['time'])
+    for _, data in read(path, start, end):
+        for name in sorted(flatten(data)):
+            if name not in known:
+                known.add(name)
+                fields.append(name)
+    writer = csv.DictWriter(output, fieldnames=['time'] + fields)
+    writer.writeheader()
+    count = 0
+    for stamp, data in read(path, start, end):
+        row = flatten(data)
+        row['time'] = datetime.fromtimestamp(stamp).isoformat()
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+class Recorder(object):
+    """
+    Flight recorder of the samples in a folder.
+
+    Samples closer than **interval** are skipped. Every **sync** seconds all new samples are compressed
+    in a block, written and synced on disk by a thread: at most the last **sync** seconds are lost
+    if the board switches off. When a segment is bigger than **segment** a new segment is opened,
+    the oldest segments are removed when all segments are bigger than **size** or older than **age**.
+
+    Read the samples with :func:`read` or :func:`dump_csv`
+    """
+
+    def __init__(self, path, interval=RECORDER_INTERVAL, sync=RECORDER_SYNC, segment=SEGMENT_SIZE, size=RECORDER_SIZE, age=RECORDER_AGE):
+        self.path = path
+        self.interval = interval
+        self.sync = sync
+        self.segment = segment
+        self.size = size
+        self.age = age
+        self._pending = []
+        # Time of the first pending sample and of the last sample
+        self._first = None
+        self._last = None
+        self._lock = Lock()
+        # Lock of the segment file, flush is called by the thread and by close
+        self._write_lock = Lock()
+        self._file = None
+        self._stop = Event()
+        self._thread = None
+        self._blocks = 0
+        self._samples = 0
+        self._removed = 0
+
+    def open(self):
+        if self._thread is not None:
+            return False
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._stop = Event()
+        self._thread = Thread(target=self._run, args=(self._stop, ))
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def append(self, time, data):
+        """ Store a new sample
+
+            :param time: Time of the sample in seconds from epoch
+            :return: False if the sample is closer than interval to the last sample
+            :rtype: bool
+        """
+        if self._last is not None and 0 <= time - self._last < self.interval:
+            return False
+        # Encoded now, the service can change the dictionaries of the sample later
+        sample = pack(data)
+        with self._lock:
+            if not self._pending:
+                self._first = time
+            self._pending.append(RECORD_HEADER.pack(time, len(sample)) + sample)
+            self._last = time
+        return True
+
+    def _run(self, stop):
+        while not stop.wait(self.sync):
+            try:
+                self.flush()
+            except (OSError, IOError) as e:
+                logger.error("Recorder write failed: {error}".format(error=e))
+
+    def flush(self):
+        """ Write and sync all new samples in a block """
+        with self._lock:
+            if not self._pending:
+                return
+            records, self._pending = self._pending, []
+            first, last = self._first, self._last
+        payload = zlib.compress(b''.join(records), COMPRESS_LEVEL)
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(records), first, last, len(payload), zlib.crc32(payload) & 0xffffffff)
+        with self._write_lock:
+            if self._file is None:
+                name = "{prefix}{stamp:013d}{suffix}".format(prefix=SEGMENT_PREFIX, stamp=int(first * 1000), suffix=SEGMENT_SUFFIX)
+                self._file = open(os.path.join(self.path, name), 'ab')
+            self._file.write(header + payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._blocks += 1
+            self._samples += len(records)
+            # New segment on next block
+            if self._file.tell() >= self.segment:
+                self._file.close()
+                self._file = None
+            self._retention(last)
+
+    def _retention(self, now):
+        names = segments(self.path)
+        current = self._file.name if self._file is not None else None
+        sizes = dict((name, os.path.getsize(name)) for name in names)
+        total = sum(sizes.values())
+        for name in names:
+            if name == current:
+                break
+            if total <= self.size and now - os.path.getmtime(name) <= self.age:
+                break
+            os.remove(name)
+            total -= sizes[name]
+            self._removed += 1
+            logger.info("Recorder removed {name}".format(name=name))
+
+    def status(self):
+        """
+        Status of the recorder:
+
+        * **blocks** - Number of blocks written
+        * **samples** - Number of samples written
+        * **removed** - Number of segments removed
+        * **segments** - Number of segments in the folder
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        return {'blocks': self._blocks, 'samples': self._samples, 'removed': self._removed, 'segments': len(segments(self.path))}
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+# EOF
@@ -0,0 +1,222 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Ring buffer of samples in shared memory.
+# Layout of the memory:
+#  - header: magic, version, number of slots, size of each slot, index of the last sample
+#  - slots: sequence, length, crc32 and time of the sample, then the sample encoded with pack
+# Every slot is guarded by a seqlock: the sequence is odd while the service writes the slot.
+# Readers never lock, they copy the slot and check that the sequence did not change.
+# Only the service writes the memory, the clients map it read only. The sample is decoded
+# with unpack, that builds only dictionaries, lists, strings and numbers: never pickle here.
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 2 and Python < 3.8
+    shared_memory = None
+from .exceptions import JtopException
+from .stream import pack, unpack
+# Create logger
+logger = logging.getLogger(__name__)
+# Monotonic clock, the same for all processes
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+RING_MAGIC = b'JTOP'
+RING_VERSION = 2
+# Folder of the POSIX shared memory on Linux
+SHM_FOLDER = '/dev/shm'
+RING_HEADER = struct.Struct('<4sIIIQ')
+RING_HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct('<QIId')
+# Default number and size of the slots
+RING_SLOTS = 4
+SLOT_SIZE = 256 * 1024
+# Retries of a read while the service writes the same slot
+READ_RETRY = 10
+# Time between two checks of a new sample
+POLL_TIME = 0.005
+
+
+class _ReadOnlyMemory(object):
+    """ Shared memory of the service mapped read only, also without write permission on the memory """
+
+    def __init__(self, name):
+        self.name = name
+        fd = os.open(os.path.join(SHM_FOLDER, name.lstrip('/')), os.O_RDONLY)
+        try:
+            self.buf = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self.buf.close()
+
+
+class SampleRing(object):
+    """
+    Ring buffer of samples in shared memory, written by the service and read by all clients.
+
+    The service writes every sample in the next slot, a client copies the last slot without any
+    request to the service. A sample bigger than a slot is not written.
+
+    Use :func:`create` in the service and :func:`attach` in the clients, a client maps the memory read only.
+    """
+
+    def __init__(self, memory, owner=False):
+        self._memory = memory
+        self._owner = owner
+        magic, version, self.slots, self.size, _ = RING_HEADER.unpack_from(memory.buf, 0)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            memory.close()
+            raise JtopException("Shared memory {name} is not a jtop ring".format(name=memory.name))
+        self._slot_size = SLOT_HEADER.size + self.size
+        self._last_time = None
+
+    @staticmethod
+    def available():
+        """ True if this python can create the shared memory, a client can attach on any python """
+        return shared_memory is not None
+
+    @classmethod
+    def create(cls, name, slots=RING_SLOTS, size=SLOT_SIZE):
+        """ New ring, an old ring with the same name is removed """
+        if shared_memory is None:
+            raise JtopException("Shared memory is not supported on this python")
+        length = RING_HEADER_SIZE + slots * (SLOT_HEADER.size + size)
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=length)
+        except FileExistsError:
+            # Left by a service not closed
+            logger.warning("Remove old shared memory {name}".format(name=name))
+            os.remove(os.path.join(SHM_FOLDER, name.lstrip('/')))
+            memory = shared_memory.SharedMemory(name=name, create=True, size=length)
+        RING_HEADER.pack_into(memory.buf, 0, RING_MAGIC, RING_VERSION, slots, size, 0)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """ Attach read only to the ring of the service
+
+            :raises JtopException: if the ring does not exist or cannot be read
+        """
+        try:
+            memory = _ReadOnlyMemory(name)
+        except (OSError, IOError, ValueError) as e:
+            raise JtopException("Shared memory {name} not available: {error}".format(name=name, error=e))
+        return cls(memory)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    @property
+    def path(self):
+        """ Path of the shared memory on Linux """
+        return os.path.join(SHM_FOLDER, self._memory.name.lstrip('/'))
+
+    @property
+    def head(self):
+        """ Index of the last sample, 0 if there are not samples """
+        return RING_HEADER.unpack_from(self._memory.buf, 0)[4]
+
+    def write(self, data):
+        """ Write a new sample
+
+            :return: False if the sample is bigger than a slot
+            :rtype: bool
+        """
+        payload = pack(data)
+        if len(payload) > self.size:
+            logger.warning("Sample {size}B bigger than the slot {slot}B".format(size=len(payload), slot=self.size))
+            return False
+        buf = self._memory.buf
+        index = self.head + 1
+        offset = RING_HEADER_SIZE + (index % self.slots) * self._slot_size
+        # Odd sequence while writing
+        SLOT_HEADER.pack_into(buf, offset, 2 * index - 1, 0, 0, 0.0)
+        buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        SLOT_HEADER.pack_into(buf, offset, 2 * index, len(payload), zlib.crc32(payload) & 0xffffffff, clock())
+        # Publish the new sample
+        struct.pack_into('<Q', buf, RING_HEADER.size - 8, index)
+        return True
+
+    def _read_slot(self, index):
+        buf = self._memory.buf
+        offset = RING_HEADER_SIZE + (index % self.slots) * self._slot_size
+        seq, length, crc, stamp = SLOT_HEADER.unpack_from(buf, offset)
+        if seq != 2 * index or length > self.size:
+            return None
+        # Copy the sample and check that the slot did not change
+        payload = bytes(buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq or zlib.crc32(payload) & 0xffffffff != crc:
+            return None
+        self._last_time = stamp
+        return unpack(payload)
+
+    def read(self, last=0):
+        """ Read the last sample
+
+            :param last: Index of the last sample read
+            :return: Index and sample, None if there is not a sample newer than last
+            :rtype: tuple
+        """
+        for _ in range(READ_RETRY):
+            index = self.head
+            if index <= last:
+                return None
+            data = self._read_slot(index)
+            if data is not None:
+                return index, data
+        return None
+
+    def wait(self, last=0, timeout=None, period=None):
+        """ Wait a sample newer than last
+
+            :param period: Interval of the service, the ring is checked only near the next sample
+            :return: Index and sample, None on timeout
+            :rtype: tuple
+        """
+        start = clock()
+        if period is not None and self._last_time is not None:
+            # Sleep until the next sample is expected
+            delay = self._last_time + period - clock() - POLL_TIME
+            if delay > 0:
+                time.sleep(delay if timeout is None else min(delay, timeout))
+        while True:
+            sample = self.read(last)
+            if sample is not None:
+                return sample
+            if timeout is not None and clock() - start > timeout:
+                return None
+            time.sleep(POLL_TIME)
+
+    def close(self):
+        self._memory.close()
+        if self._owner:
+            try:
+                self._memory.unlink()
+            except OSError:
+                pass
+# EOF
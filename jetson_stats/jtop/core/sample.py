@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Records of a tegrastats sample.
+# All records are tuples without __dict__ (__slots__ is empty): one allocation for each record,
+# and a small pickle. to_dict() returns the same dictionaries of the old parsers.
+from collections import namedtuple
+
+
+class ValFreq(namedtuple('ValFreq', ['val', 'frq'])):
+    """ Value and frequency in kHz, **frq** is None if not available """
+    __slots__ = ()
+
+    def to_dict(self):
+        if self.frq is None:
+            return {'val': self.val}
+        return {'val': self.val, 'frq': self.frq}
+
+    def _paths(self):
+        return (('val', ), ('frq', ))
+
+
+class Rail(namedtuple('Rail', ['cur', 'avg'])):
+    """ Current and average power in milliwatt """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {'cur': self.cur, 'avg': self.avg}
+
+    def _paths(self):
+        return (('cur', ), ('avg', ))
+
+
+class Mts(namedtuple('Mts', ['fg', 'bg'])):
+    """ Time spent in foreground and background tasks """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {'fg': self.fg, 'bg': self.bg}
+
+    def _paths(self):
+        return (('fg', ), ('bg', ))
+
+
+class Memory(namedtuple('Memory', ['use', 'tot', 'unit', 'block', 'size', 'size_unit', 'nblock'])):
+    """ RAM, SWAP or IRAM usage
+
+        **block** is the name of the value in brackets: **lfb** for RAM and IRAM, **cached** for SWAP.
+        **nblock** is the number of largest free blocks, only for RAM.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        block = {'size': self.size, 'unit': self.size_unit}
+        if self.nblock is not None:
+            block['nblock'] = self.nblock
+        return {'use': self.use, 'tot': self.tot, 'unit': self.unit, self.block: block}
+
+    def _paths(self):
+        return (('use', ), ('tot', ), ('unit', ), None, (self.block, 'size'), (self.block, 'unit'), (self.block, 'nblock'))
+
+
+class TegraSample(namedtuple('TegraSample', ['ram', 'swap', 'iram', 'mts', 'cpu', 'vals', 'temp', 'watt'])):
+    """ A tegrastats line
+
+        * **ram**, **swap**, **iram** - :class:`Memory`, None if not available
+        * **mts** - :class:`Mts`, None if not available
+        * **cpu** - Tuple of :class:`ValFreq` for each core, None if the core is off
+        * **vals** - Dictionary of :class:`ValFreq` for all single values (EMC, GR3D, APE, NVENC, ...)
+        * **temp** - Dictionary of temperatures in Celsius
+        * **watt** - Dictionary of :class:`Rail`
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        """ Dictionary with the same keys of :func:`~jtop.core.tegra_parse.decode` """
+        stats = dict((name, val.to_dict()) for name, val in self.vals.items())
+        stats['RAM'] = self.ram.to_dict() if self.ram is not None else {}
+        if self.swap is not None:
+            stats['SWAP'] = self.swap.to_dict()
+        if self.iram is not None:
+            stats['IRAM'] = self.iram.to_dict()
+        if self.mts is not None:
+            stats['MTS'] = self.mts.to_dict()
+        stats['CPU'] = self.cpu_dict()
+        stats['TEMP'] = dict(self.temp)
+        stats['WATT'] = dict((name, rail.to_dict()) for name, rail in self.watt.items())
+        return stats
+
+    def cpu_dict(self):
+        """ Dictionary of CPU, from **CPU1**, an empty dictionary for cores off """
+        return dict(('CPU' + str(idx + 1), cpu.to_dict() if cpu is not None else {}) for idx, cpu in enumerate(self.cpu))
+
+    def _paths(self):
+        return (('RAM', ), ('SWAP', ), ('IRAM', ), ('MTS', ), ('CPU', ), (), ('TEMP', ), ('WATT', ))
+
+
+# Records sent by the service, the index is the type in the stream encoding
+RECORDS = (ValFreq, Rail, Mts, Memory)
+
+
+def to_dicts(value):
+    """ Same value with all records converted with to_dict, dictionaries are copied """
+    if isinstance(value, dict):
+        return dict((key, to_dicts(item)) for key, item in value.items())
+    if isinstance(value, RECORDS):
+        return value.to_dict()
+    return value
+# EOF
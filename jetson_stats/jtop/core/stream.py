@@ -0,0 +1,849 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Stream of samples from the service to all subscribers on a UNIX socket.
+# Every sample is encoded once in a binary frame and sent to all subscribers:
+#  - header: kind of frame, sequence number and length of the payload
+#  - payload: the sample in a compact binary format, look pack
+# Samples published with publish_sample are split in:
+#  - static: data that almost never change, sent only when changed
+#  - keyframe: all other data, sent every KEYFRAME_INTERVAL samples
+#  - delta: only the values changed from the previous sample
+# A subscriber can send a request frame, the service sends a reply frame with the same sequence number.
+import errno
+import logging
+import os
+import socket
+import struct
+import sys
+import time
+from collections import deque, namedtuple
+from select import select
+from threading import Thread, Lock
+from .exceptions import JtopException
+from .sample import RECORDS
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# Create logger
+logger = logging.getLogger(__name__)
+# Monotonic clock
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+# Header of every frame: kind, sequence, length
+FRAME_HEADER = struct.Struct('<BQI')
+FRAME_SAMPLE = 1
+FRAME_STATIC = 2
+FRAME_KEYFRAME = 3
+FRAME_DELTA = 4
+FRAME_REQUEST = 5
+FRAME_REPLY = 6
+# Samples between two keyframes
+KEYFRAME_INTERVAL = 30
+# Any key in a path of static data
+STATIC_ANY = '*'
+# Frames waiting for each subscriber, the oldest are dropped when full
+SUBSCRIBER_QUEUE = 16
+SEND_SIZE = 65536
+RECV_SIZE = 65536
+# Backlog of connections
+LISTEN_BACKLOG = 8
+# Max time to wait a reply and time between two checks of the reply
+REQUEST_TIMEOUT = 10.0
+REQUEST_POLL = 0.1
+# Errors of unpack on a malformed payload
+DECODE_ERRORS = (ValueError, TypeError, IndexError, RuntimeError, struct.error)
+# Types in the payload
+_INT = [(-0x80, 0x7f, b'b', struct.Struct('<b')), (-0x8000, 0x7fff, b'h', struct.Struct('<h')),
+        (-0x80000000, 0x7fffffff, b'i', struct.Struct('<i')), (-0x8000000000000000, 0x7fffffffffffffff, b'q', struct.Struct('<q'))]
+_FLOAT = struct.Struct('<d')
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_SIZES = {b'b': _INT[0][3], b'h': _INT[1][3], b'i': _INT[2][3], b'q': _INT[3][3], b'd': _FLOAT}
+_RECORD_TYPES = dict((record, idx) for idx, record in enumerate(RECORDS))
+if sys.version_info[0] == 2:
+    _TEXT = (str, unicode)  # noqa: F821
+    _INTEGER = (int, long)  # noqa: F821
+else:
+    _TEXT = (str, )
+    _INTEGER = (int, )
+
+
+class _Deleted(object):
+    """ Key removed from the previous sample """
+
+    def __repr__(self):
+        return 'DELETED'
+
+
+DELETED = _Deleted()
+
+
+def _pack_size(out, small, big, size):
+    if size < 0x100:
+        out += small
+        out += _U8.pack(size)
+    else:
+        out += big
+        out += _U32.pack(size)
+
+
+def _pack(out, obj):
+    if obj is None:
+        out += b'N'
+    elif obj is DELETED:
+        out += b'X'
+    elif obj is True:
+        out += b'T'
+    elif obj is False:
+        out += b'F'
+    elif isinstance(obj, _INTEGER):
+        for low, high, tag, fmt in _INT:
+            if low <= obj <= high:
+                out += tag
+                out += fmt.pack(obj)
+                return
+        raise ValueError("Integer {value} too big".format(value=obj))
+    elif isinstance(obj, float):
+        out += b'd'
+        out += _FLOAT.pack(obj)
+    elif isinstance(obj, _TEXT):
+        data = obj.encode('utf-8')
+        _pack_size(out, b's', b'S', len(data))
+        out += data
+    elif isinstance(obj, dict):
+        _pack_size(out, b'm', b'M', len(obj))
+        for key, value in obj.items():
+            _pack(out, key)
+            _pack(out, value)
+    elif type(obj) in _RECORD_TYPES:
+        # Type of the record and all fields, without the length
+        out += b'r'
+        out += _U8.pack(_RECORD_TYPES[type(obj)])
+        for value in obj:
+            _pack(out, value)
+    elif isinstance(obj, (list, tuple)):
+        _pack_size(out, b'l', b'L', len(obj))
+        for value in obj:
+            _pack(out, value)
+    else:
+        raise ValueError("Type {type} cannot be packed".format(type=type(obj).__name__))
+
+
+def pack(obj):
+    """ Encode in a compact binary format dictionaries, lists, strings, numbers, booleans and None
+
+        Tuples are decoded as lists, the records of :mod:`~jtop.core.sample` as the same records.
+    """
+    out = bytearray()
+    _pack(out, obj)
+    return bytes(out)
+
+
+def _unpack(data, idx):
+    tag = data[idx:idx + 1]
+    idx += 1
+    if tag in _SIZES:
+        fmt = _SIZES[tag]
+        return fmt.unpack_from(data, idx)[0], idx + fmt.size
+    if tag == b'N':
+        return None, idx
+    if tag == b'X':
+        return DELETED, idx
+    if tag == b'T':
+        return True, idx
+    if tag == b'F':
+        return False, idx
+    if tag == b'r':
+        kind = _U8.unpack_from(data, idx)[0]
+        idx += _U8.size
+        if kind >= len(RECORDS):
+            raise ValueError("Unknown record {kind} at {idx}".format(kind=kind, idx=idx - 2))
+        record = RECORDS[kind]
+        values = []
+        for _ in record._fields:
+            value, idx = _unpack(data, idx)
+            values.append(value)
+        return record(*values), idx
+    if tag in (b's', b'S', b'l', b'L', b'm', b'M'):
+        fmt = _U8 if tag in (b's', b'l', b'm') else _U32
+        size = fmt.unpack_from(data, idx)[0]
+        idx += fmt.size
+        if tag in (b's', b'S'):
+            return data[idx:idx + size].decode('utf-8'), idx + size
+        if tag in (b'l', b'L'):
+            values = []
+            for _ in range(size):
+                value, idx = _unpack(data, idx)
+                values.append(value)
+            return values, idx
+        values = {}
+        for _ in range(size):
+            key, idx = _unpack(data, idx)
+            values[key], idx = _unpack(data, idx)
+        return values, idx
+    raise ValueError("Unknown type {tag} at {idx}".format(tag=tag, idx=idx - 1))
+
+
+def unpack(data):
+    """ Decode an object encoded with :func:`pack` """
+    obj, _ = _unpack(bytes(data), 0)
+    return obj
+
+
+def _split(data, path, static, dynamic):
+    key, path = path[0], path[1:]
+    keys = list(data.keys()) if key == STATIC_ANY else [key] if key in data else []
+    for key in keys:
+        value = data[key]
+        if not path:
+            static[key] = value
+            del dynamic[key]
+        elif isinstance(value, dict):
+            # Copy only the dictionaries with static data
+            if dynamic[key] is value:
+                dynamic[key] = dict(value)
+            _split(value, path, static.setdefault(key, {}), dynamic[key])
+            if not static[key]:
+                del static[key]
+
+
+def split(data, paths):
+    """ Split a sample in static and dynamic data, the sample is not changed
+
+        :param paths: List of paths of static data, a path is a tuple of keys, **STATIC_ANY** for any key
+        :return: static and dynamic data
+        :rtype: tuple
+    """
+    static = {}
+    dynamic = dict(data)
+    for path in paths:
+        _split(data, tuple(path), static, dynamic)
+    return static, dynamic
+
+
+def merge(dynamic, static):
+    """ Sample with static and dynamic data, the opposite of :func:`split` """
+    data = dict(dynamic)
+    for key, value in static.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            data[key] = merge(data[key], value)
+        else:
+            data[key] = value
+    return data
+
+
+def diff(prev, data):
+    """ Values changed from prev to data, removed keys are **DELETED**
+
+        Dictionaries are compared key by key, all other values are replaced when different.
+    """
+    delta = {}
+    for key, value in data.items():
+        if key not in prev:
+            delta[key] = value
+            continue
+        old = prev[key]
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = diff(old, value)
+            if changed:
+                delta[key] = changed
+        elif value != old or type(value) is not type(old):
+            delta[key] = value
+    for key in prev:
+        if key not in data:
+            delta[key] = DELETED
+    return delta
+
+
+def patch(prev, delta):
+    """ Apply a delta from :func:`diff`, prev is not changed """
+    data = dict(prev)
+    for key, value in delta.items():
+        if value is DELETED:
+            data.pop(key, None)
+        elif isinstance(value, dict) and isinstance(data.get(key), dict):
+            data[key] = patch(data[key], value)
+        else:
+            data[key] = value
+    return data
+
+
+class Encoded(namedtuple('Encoded', ['static', 'changed', 'kind', 'payload'])):
+    """ Sample encoded by :class:`SampleEncoder`
+
+        * **static** - Static data encoded with :func:`pack`
+        * **changed** - True if the static data changed from the previous sample
+        * **kind** - **FRAME_KEYFRAME** or **FRAME_DELTA**
+        * **payload** - All other data, or only the values changed from the previous sample, encoded with :func:`pack`
+    """
+    __slots__ = ()
+
+
+class SampleEncoder(object):
+    """
+    Encoder of a sequence of samples in static data, keyframes and deltas.
+
+    A keyframe every **keyframe** samples, all other samples are deltas from the previous sample.
+    A sample is encoded once and shared by the stream and the history of the service.
+
+    :param static: List of paths of static data, look :func:`split`
+    :param keyframe: Samples between two keyframes
+    """
+
+    def __init__(self, static=(), keyframe=KEYFRAME_INTERVAL):
+        self._static_paths = static
+        self._keyframe = keyframe
+        self._static = None
+        self._last = None
+        self._samples = 0
+
+    def encode(self, data):
+        """ Encode a new sample, the sample is not changed
+
+            :rtype: Encoded
+        """
+        static, dynamic = split(data, self._static_paths)
+        # Compare the encoded static data, the sample can share dictionaries changed in place
+        static = pack(static)
+        changed = static != self._static
+        self._static = static
+        if self._last is None or self._samples % self._keyframe == 0:
+            kind, payload = FRAME_KEYFRAME, pack(dynamic)
+            # Own copy of the last sample, the same sample of the decoders
+            self._last = unpack(payload)
+        else:
+            kind, payload = FRAME_DELTA, pack(diff(self._last, dynamic))
+            self._last = patch(self._last, unpack(payload))
+        self._samples += 1
+        return Encoded(static, changed, kind, payload)
+
+    def keyframe(self):
+        """ Keyframe of the last sample, for a decoder that lost the previous frames """
+        return pack(self._last)
+
+
+class _Subscription(object):
+    """ Connection of a subscriber, with the frames not sent yet """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.frames = deque()
+        # Replies to the requests, never dropped
+        self.replies = deque()
+        # Frame partially sent and bytes already sent
+        self.current = None
+        self.offset = 0
+        self.dropped = 0
+        # Next sample with static data and keyframe, also for a new subscriber
+        self.resync = True
+        self.buffer = bytearray()
+
+    def full(self, size):
+        return len(self.frames) >= size
+
+    def push(self, frame, size):
+        # Drop the oldest frames
+        while len(self.frames) >= size:
+            self.frames.popleft()
+            self.dropped += 1
+        self.frames.append(frame)
+
+    def clear(self):
+        # Drop all frames not sent, the deltas are useless without the previous frames
+        self.dropped += len(self.frames)
+        self.frames.clear()
+
+    def pending(self):
+        return self.current is not None or bool(self.frames) or bool(self.replies)
+
+    def send(self):
+        """ Send all frames until the socket is full, the replies first
+
+            :return: False if the subscriber is disconnected
+        """
+        while True:
+            if self.current is None:
+                if self.replies:
+                    self.current = self.replies.popleft()
+                elif self.frames:
+                    self.current = self.frames.popleft()
+                else:
+                    return True
+                self.offset = 0
+            try:
+                sent = self.conn.send(memoryview(self.current)[self.offset:self.offset + SEND_SIZE])
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return True
+                return False
+            self.offset += sent
+            if self.offset >= len(self.current):
+                self.current = None
+
+    def receive(self):
+        """ Read the requests of the subscriber
+
+            :return: List of sequence number and request, None if the subscriber is disconnected or sent a malformed frame
+        """
+        try:
+            data = self.conn.recv(RECV_SIZE)
+        except socket.error as e:
+            return [] if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK) else None
+        if not data:
+            return None
+        self.buffer += data
+        requests = []
+        try:
+            frame = _read_frame(self.buffer)
+            while frame is not None:
+                kind, sequence, payload = frame
+                if kind == FRAME_REQUEST:
+                    requests.append((sequence, payload))
+                frame = _read_frame(self.buffer)
+        except DECODE_ERRORS as e:
+            # Only this subscriber is disconnected
+            logger.warning("Malformed request from subscriber {fd}: {error}".format(fd=self.conn.fileno(), error=e))
+            return None
+        return requests
+
+
+def _read_frame(buffer):
+    """ Remove the first frame from the buffer, None if the frame is not complete """
+    if len(buffer) < FRAME_HEADER.size:
+        return None
+    kind, sequence, length = FRAME_HEADER.unpack_from(buffer, 0)
+    end = FRAME_HEADER.size + length
+    if len(buffer) < end:
+        return None
+    payload = unpack(buffer[FRAME_HEADER.size:end])
+    del buffer[:end]
+    return kind, sequence, payload
+
+
+class Publisher(object):
+    """
+    Server of the stream of samples on a UNIX socket.
+
+    Every sample is encoded once and queued for each subscriber, a thread sends the frames
+    when the sockets are writable. A slow subscriber never blocks the service: when its queue
+    has **SUBSCRIBER_QUEUE** frames the oldest are dropped, and the subscriber sees a gap
+    in the sequence numbers.
+
+    With :func:`publish_sample` the static data is sent only when changed and the other data
+    as delta from the previous sample, with a keyframe every **KEYFRAME_INTERVAL** samples.
+    A new subscriber, or a subscriber with dropped frames, receives the static data and a keyframe:
+    the frames still queued for it are dropped, the deltas need the frames lost.
+
+    The requests of the subscribers are passed, one at a time, to the handler on another thread:
+    a slow request never delays the samples. The object returned is sent only to the subscriber
+    of the request, with the sequence number of the request.
+
+    :param path: Path of the UNIX socket
+    :param static: List of paths of static data, look :func:`split`
+    :param keyframe: Samples between two keyframes
+    :param handler: Function called with every request, returns the reply
+    """
+
+    def __init__(self, path, size=SUBSCRIBER_QUEUE, static=(), keyframe=KEYFRAME_INTERVAL, handler=None):
+        self.path = path
+        self._handler = handler
+        self._size = size
+        self.encoder = SampleEncoder(static, keyframe)
+        self._server = None
+        self._subscribers = {}
+        self._lock = Lock()
+        self._thread = None
+        self._requests = None
+        self._handler_thread = None
+        self._wakeup = None
+        self._running = False
+        self._sequence = 0
+        self._dropped = 0
+
+    def open(self, gid=None, mode=0o660):
+        """ Listen on the socket and start the sender thread """
+        if self._thread is not None:
+            return False
+        # Remove the socket of an old service
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(LISTEN_BACKLOG)
+        self._server.setblocking(False)
+        if gid is not None:
+            os.chown(self.path, os.getuid(), gid)
+        os.chmod(self.path, mode)
+        self._wakeup = os.pipe()
+        self._running = True
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        if self._handler is not None:
+            self._requests = queue.Queue()
+            self._handler_thread = Thread(target=self._handle, args=(self._requests, ))
+            self._handler_thread.daemon = True
+            self._handler_thread.start()
+        return True
+
+    def status(self):
+        """
+        Status of the stream:
+
+        * **subscribers** - Number of subscribers connected
+        * **sequence** - Sequence number of the last frame
+        * **dropped** - Frames dropped for slow subscribers
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        with self._lock:
+            dropped = self._dropped + sum(sub.dropped for sub in self._subscribers.values())
+            return {'subscribers': len(self._subscribers), 'sequence': self._sequence, 'dropped': dropped}
+
+    def publish(self, data, kind=FRAME_SAMPLE):
+        """ Send a sample to all subscribers
+
+            :return: Sequence number of the frame
+            :rtype: int
+        """
+        payload = pack(data)
+        with self._lock:
+            self._sequence += 1
+            frame = self._frame(kind, payload)
+            for subscriber in self._subscribers.values():
+                subscriber.push(frame, self._size)
+            sequence = self._sequence
+        self._wake()
+        return sequence
+
+    def _frame(self, kind, payload):
+        return FRAME_HEADER.pack(kind, self._sequence, len(payload)) + payload
+
+    def publish_sample(self, data):
+        """ Send a sample to all subscribers, static data only if changed and the other data as delta
+
+            :return: Sequence number of the frames
+            :rtype: int
+        """
+        return self.publish_encoded(self.encoder.encode(data))
+
+    def publish_encoded(self, encoded):
+        """ Send a sample encoded with :attr:`encoder` to all subscribers, look :func:`publish_sample`
+
+            :param encoded: Sample from encode of :attr:`encoder`
+            :return: Sequence number of the frames
+            :rtype: int
+        """
+        with self._lock:
+            self._sequence += 1
+            static_frame = self._frame(FRAME_STATIC, encoded.static)
+            frame = self._frame(encoded.kind, encoded.payload)
+            frames = [static_frame, frame] if encoded.changed else [frame]
+            key_frame = frame if encoded.kind == FRAME_KEYFRAME else None
+            for subscriber in self._subscribers.values():
+                if subscriber.resync or subscriber.full(self._size):
+                    # The frames lost are replaced by a new keyframe
+                    if key_frame is None:
+                        key_frame = self._frame(FRAME_KEYFRAME, self.encoder.keyframe())
+                    subscriber.clear()
+                    subscriber.push(static_frame, self._size)
+                    subscriber.push(key_frame, self._size)
+                    subscriber.resync = False
+                else:
+                    for item in frames:
+                        subscriber.push(item, self._size)
+            sequence = self._sequence
+        self._wake()
+        return sequence
+
+    def _wake(self):
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b'\0')
+            except OSError:
+                pass
+
+    def _remove(self, fd):
+        subscriber = self._subscribers.pop(fd)
+        self._dropped += subscriber.dropped
+        subscriber.conn.close()
+        logger.debug("Subscriber {fd} disconnected".format(fd=fd))
+
+    def _run(self):
+        try:
+            while self._running:
+                with self._lock:
+                    readers = [self._server, self._wakeup[0]] + [sub.conn for sub in self._subscribers.values()]
+                    writers = [sub.conn for sub in self._subscribers.values() if sub.pending()]
+                readable, writable, _ = select(readers, writers, [])
+                with self._lock:
+                    if self._server in readable:
+                        self._accept()
+                    if self._wakeup[0] in readable:
+                        os.read(self._wakeup[0], 4096)
+                    for fd, subscriber in list(self._subscribers.items()):
+                        if subscriber.conn not in readable:
+                            continue
+                        received = subscriber.receive()
+                        if received is None:
+                            self._remove(fd)
+                            continue
+                        for sequence, request in received:
+                            if self._requests is not None:
+                                self._requests.put((fd, subscriber, sequence, request))
+                            else:
+                                subscriber.replies.append(self._reply(sequence, request))
+                    # Send all frames, also to the sockets not in writable after a wake up
+                    for fd, subscriber in list(self._subscribers.items()):
+                        if subscriber.pending() and not subscriber.send():
+                            self._remove(fd)
+        except (OSError, IOError, ValueError) as e:
+            if self._running:
+                logger.error("Stream closed {error}".format(error=e))
+
+    def _handle(self, requests):
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            fd, subscriber, sequence, request = item
+            frame = self._reply(sequence, request)
+            with self._lock:
+                # Subscriber still connected
+                if self._subscribers.get(fd) is subscriber:
+                    subscriber.replies.append(frame)
+            self._wake()
+
+    def _reply(self, sequence, request):
+        try:
+            if self._handler is None:
+                raise JtopException("Requests not supported")
+            reply = {'reply': self._handler(request)}
+        except Exception as e:
+            logger.error("Request {request} failed: {error}".format(request=request, error=e))
+            reply = {'error': str(e)}
+        payload = pack(reply)
+        return FRAME_HEADER.pack(FRAME_REPLY, sequence, len(payload)) + payload
+
+    def _accept(self):
+        try:
+            conn, _ = self._server.accept()
+        except socket.error:
+            return
+        conn.setblocking(False)
+        self._subscribers[conn.fileno()] = _Subscription(conn)
+        logger.debug("Subscriber {fd} connected".format(fd=conn.fileno()))
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._running = False
+        self._wake()
+        self._thread.join()
+        self._thread = None
+        if self._handler_thread is not None:
+            self._requests.put(None)
+            self._handler_thread.join()
+            self._handler_thread = None
+            self._requests = None
+        with self._lock:
+            for fd in list(self._subscribers):
+                self._remove(fd)
+        self._server.close()
+        self._server = None
+        for fd in self._wakeup:
+            os.close(fd)
+        self._wakeup = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Subscriber(object):
+    """
+    Client of the stream of samples.
+
+    The samples and the replies to :func:`request` and :func:`send` arrive on the same socket,
+    read and request can be called from different threads: the thread that reads the socket
+    keeps the frames and the replies for the other threads.
+
+    :param path: Path of the UNIX socket
+    :raises JtopException: if the stream is not available
+    """
+
+    def __init__(self, path):
+        self._conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._conn.connect(path)
+        except socket.error as e:
+            self._conn.close()
+            raise JtopException("Stream {path} not available: {error}".format(path=path, error=e))
+        self._buffer = bytearray()
+        self._lock = Lock()
+        # Frames read while waiting a reply
+        self._frames = deque()
+        self._replies = {}
+        # Functions waiting the replies of send
+        self._callbacks = {}
+        self._requests = 0
+        self._static = None
+        self._last = None
+        # Sequence number of the last sample decoded
+        self._previous = 0
+        self.sequence = 0
+        self.lost = 0
+
+    def _receive(self, timeout):
+        """ Read the socket and decode all complete frames, the socket is waited without the lock
+
+            :return: False on timeout
+        """
+        ready, _, _ = select([self._conn], [], [], timeout)
+        if not ready:
+            return False
+        callbacks = []
+        with self._lock:
+            try:
+                data = self._conn.recv(RECV_SIZE, socket.MSG_DONTWAIT)
+            except socket.error as e:
+                # Data already read by another thread
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return True
+                raise
+            if not data:
+                raise JtopException("Lost connection with jtop server")
+            self._buffer += data
+            frame = _read_frame(self._buffer)
+            while frame is not None:
+                kind, sequence, data = frame
+                if kind == FRAME_REPLY:
+                    if sequence in self._callbacks:
+                        callbacks.append((self._callbacks.pop(sequence), data))
+                    else:
+                        self._replies[sequence] = data
+                else:
+                    # Frames dropped by the service
+                    if self.sequence and sequence > self.sequence + 1:
+                        self.lost += sequence - self.sequence - 1
+                    self.sequence = sequence
+                    self._frames.append(frame)
+                frame = _read_frame(self._buffer)
+        # Replies of send, out of the lock
+        for callback, reply in callbacks:
+            if callback is not None:
+                callback(reply)
+        return True
+
+    def read(self, timeout=None):
+        """ Read the next frame
+
+            :return: kind, sequence number and sample, None on timeout
+            :rtype: tuple
+            :raises JtopException: if the service closed the stream
+        """
+        deadline = None if timeout is None else clock() + timeout
+        while True:
+            with self._lock:
+                if self._frames:
+                    return self._frames.popleft()
+            # Wait in steps, the frames can be read by a thread waiting a reply
+            remaining = REQUEST_POLL if deadline is None else min(deadline - clock(), REQUEST_POLL)
+            if remaining <= 0:
+                return None
+            self._receive(remaining)
+
+    def _send(self, data, callback):
+        payload = pack(data)
+        with self._lock:
+            self._requests += 1
+            ident = self._requests
+            if callback is not False:
+                self._callbacks[ident] = callback
+            # The lock keeps the frames of two threads apart
+            self._conn.sendall(FRAME_HEADER.pack(FRAME_REQUEST, ident, len(payload)) + payload)
+        return ident
+
+    def send(self, data, callback=None):
+        """ Send a request to the service without wait the reply
+
+            The reply is passed to callback by the thread that reads the stream,
+            a dictionary with **reply** or with **error** if the request failed
+
+            :param callback: Function called with the reply, None to drop the reply
+        """
+        self._send(data, callback)
+
+    def request(self, data, timeout=REQUEST_TIMEOUT):
+        """ Send a request to the service and wait the reply
+
+            :return: Reply of the service
+            :raises JtopException: if the service does not reply in time or the request fails
+        """
+        ident = self._send(data, False)
+        deadline = clock() + timeout
+        while True:
+            with self._lock:
+                if ident in self._replies:
+                    reply = self._replies.pop(ident)
+                    break
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    # Drop the reply if it arrives later
+                    self._callbacks[ident] = None
+                    raise JtopException("Request {ident} without reply in {timeout}s".format(ident=ident, timeout=timeout))
+            self._receive(min(remaining, REQUEST_POLL))
+        if 'error' in reply:
+            raise JtopException(reply['error'])
+        return reply['reply']
+
+    def sample(self, timeout=None):
+        """ Read the next sample, static data and deltas are merged with the previous frames
+
+            :return: sequence number and sample, None on timeout
+            :rtype: tuple
+            :raises JtopException: if the service closed the stream
+        """
+        while True:
+            frame = self.read(timeout)
+            if frame is None:
+                return None
+            kind, sequence, data = frame
+            if kind == FRAME_SAMPLE:
+                return sequence, data
+            if kind == FRAME_STATIC:
+                self._static = data
+                continue
+            # Frames lost, the deltas need the next keyframe
+            if self._previous and sequence > self._previous + 1:
+                self._last = None
+            self._previous = sequence
+            if kind == FRAME_KEYFRAME:
+                self._last = data
+            elif kind == FRAME_DELTA and self._last is not None:
+                self._last = patch(self._last, data)
+            else:
+                # Delta without a keyframe
+                continue
+            return sequence, merge(self._last, self._static or {})
+
+    def close(self):
+        self._conn.close()
+# EOF
@@ -18,24 +18,26 @@
 # Logging
 import logging
 # Launch command
-import subprocess as sp
+from .command import Command, command_pool
 # from .exceptions import JtopException
 # Create logger
 logger = logging.getLogger(__name__)
 
 CONFIG_DEFAULT_SWAP_DIRECTORY = ''
 CONFIG_DEFAULT_SWAP_NAME = 'swfile'
+COMMAND_TIMEOUT = 3.0
 
 
 def list_swaps():
-    swap_status = sp.Popen(['swapon', '--show', '--raw', '--byte'], stdout=sp.PIPE, stderr=sp.PIPE)
-    out, _ = swap_status.communicate()
+    try:
+        lines = Command(['swapon', '--show', '--raw', '--byte'])(timeout=COMMAND_TIMEOUT)
+    except Command.CommandException:
+        lines = []
     swaps = {}
-    if out:
-        swap_data = out.decode("utf-8")
+    if lines:
         # Read all data
         names = []
-        for line in swap_data.split("\n"):
+        for line in lines:
             # Extract names
             # The names are: name, type, size, used, prio
             if not names:
@@ -75,7 +77,7 @@ class Swap(object):
         if not isinstance(value, (int, float)):
             raise ValueError("Need a Number")
         # Set new swap size configuration
-        self._controller.put({'swap': {'size': value, 'boot': on_boot}})
+        self._controller.put({'swap': {'size': value, 'boot': on_boot}}, self._reply)
 
     @property
     def is_enable(self):
@@ -88,7 +90,11 @@ class Swap(object):
 
     def deactivate(self):
         # Set new swap size configuration
-        self._controller.put({'swap': {}})
+        self._controller.put({'swap': {}}, self._reply)
+
+    def _reply(self, reply):
+        # Path of the swap managed by the service
+        self._this_swap = reply['swap']['path']
 
     def _update(self, swap_status):
         # Update status swaps
@@ -123,6 +129,8 @@ class SwapService(object):
 
     def __init__(self, config):
         self._config = config
+        # Last jetson_swap command
+        self._job = None
         # Load swap information
         # self.update()
 
@@ -130,20 +138,24 @@ class SwapService(object):
         """
         Clear cache following https://coderwall.com/p/ef1gcw/managing-ram-and-swap
         """
-        clear_cache = sp.Popen(['sysctl', 'vm.drop_caches=3'], stdout=sp.PIPE, stderr=sp.PIPE)
-        out, _ = clear_cache.communicate()
-        return True if out else False
+        try:
+            lines = Command(['sysctl', 'vm.drop_caches=3'])(timeout=COMMAND_TIMEOUT)
+        except Command.CommandException:
+            return False
+        return True if lines else False
 
     def _update(self):
         config = self._config.get('swap', {})
         directory = config.get('directory', CONFIG_DEFAULT_SWAP_DIRECTORY)
         swap_name = config.get('name', CONFIG_DEFAULT_SWAP_NAME)
         # Update swap
-        swap_status = sp.Popen(['jetson_swap', '--status', '--dir', directory, '--name', swap_name], stdout=sp.PIPE, stderr=sp.PIPE)
-        out, _ = swap_status.communicate()
+        try:
+            lines = Command(['jetson_swap', '--status', '--dir', directory, '--name', swap_name])(timeout=COMMAND_TIMEOUT)
+        except Command.CommandException:
+            lines = []
         swap_info = {}
-        if out:
-            swap_data = out.decode("utf-8")
+        if lines:
+            swap_data = "\n".join(lines)
             swap_data = swap_data.split("\t")
             # Load swap information
             swap_info['file'] = str(swap_data[0].strip())
@@ -180,8 +192,12 @@ class SwapService(object):
         if on_boot:
             swap_cmd += ['--auto']
         logger.info("Activate {directory}/{name} auto={on_boot}".format(directory=directory, name=swap_name, on_boot=on_boot))
-        # Run script
-        sp.Popen(swap_cmd, stdout=sp.PIPE, stderr=sp.PIPE)
+        # Run script, without timeout: a new swap file can take long
+        self._job = command_pool().submit(swap_cmd)
+
+    def is_running(self):
+        """ True while jetson_swap is changing the swap """
+        return self._job is not None and not self._job.done()
 
     def deactivate(self):
         # Load swap configuration
@@ -192,5 +208,5 @@ class SwapService(object):
         swap_cmd = ['jetson_swap', '--off', '--dir', directory, '--name', swap_name]
         # Run script
         logger.info("Deactivate {directory}/{name}".format(directory=directory, name=swap_name))
-        sp.Popen(swap_cmd, stdout=sp.PIPE, stderr=sp.PIPE)
+        self._job = command_pool().submit(swap_cmd)
 # EOF
@@ -0,0 +1,137 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Reader of sysfs and procfs files.
+# A file is opened only once and read again from the beginning with pread:
+# one syscall for each read instead of open, read and close.
+import errno
+import os
+from threading import Lock
+# Initial size of the buffer, doubled if the file is bigger
+READ_SIZE = 4096
+# Errors of a file removed or of a device unplugged, the file is opened again
+REOPEN_ERRORS = (errno.ENOENT, errno.ENODEV, errno.ESTALE)
+
+
+def _preadinto(fd, buffer, offset):
+    """ Read in the buffer from offset, return the number of bytes read """
+    if hasattr(os, 'preadv'):
+        return os.preadv(fd, [buffer], offset)
+    if hasattr(os, 'pread'):
+        data = os.pread(fd, len(buffer), offset)
+    else:
+        # Python 2
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = os.read(fd, len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+
+class SysFile(object):
+    """
+    File always open, every read starts from the beginning of the file.
+
+    The file is read in the same buffer at every read.
+    If the file is removed or the device is unplugged, the file is opened again at the next read.
+
+    :param path: Path of the file
+    :raises OSError: if the file does not exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reopens = 0
+        self._fd = None
+        self._buffer = bytearray(READ_SIZE)
+        self._lock = Lock()
+        self._open()
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDONLY)
+
+    def _read(self):
+        if self._fd is None:
+            self._open()
+        size = _preadinto(self._fd, self._buffer, 0)
+        while size == len(self._buffer):
+            self._buffer = bytearray(2 * len(self._buffer))
+            size = _preadinto(self._fd, self._buffer, 0)
+        return self._buffer[:size].decode('utf-8', 'replace')
+
+    def read(self):
+        """ Content of the file """
+        with self._lock:
+            try:
+                return self._read()
+            except (OSError, IOError) as e:
+                if e.errno not in REOPEN_ERRORS:
+                    raise
+                self._close()
+                self.reopens += 1
+                return self._read()
+
+    def read_int(self):
+        return int(self.read().strip())
+
+    def _close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# Files shared by all readers
+_FILES = {}
+_FILES_LOCK = Lock()
+
+
+def sysfile(path):
+    """ Shared :class:`SysFile` of path, opened on the first call
+
+    :raises OSError: if the file does not exist
+    """
+    with _FILES_LOCK:
+        shared = _FILES.get(path)
+        if shared is None:
+            shared = SysFile(path)
+            _FILES[path] = shared
+        return shared
+
+
+def read(path):
+    """ Content of a sysfs or procfs file, from a shared open file """
+    return sysfile(path).read()
+
+
+def read_int(path):
+    """ Integer in a sysfs file, from a shared open file """
+    return sysfile(path).read_int()
+
+
+def close_all():
+    """ Close all shared files """
+    with _FILES_LOCK:
+        for shared in _FILES.values():
+            shared.close()
+        _FILES.clear()
+# EOF
@@ -17,6 +17,9 @@
 
 import re
 import os
+from functools import partial
+from operator import itemgetter
+from .sample import ValFreq, Rail, Mts, Memory, TegraSample
 # All regular expressions
 SWAP_RE = re.compile(r'SWAP (\d+)\/(\d+)(\w)B( ?)\(cached (\d+)(\w)B\)')
 IRAM_RE = re.compile(r'IRAM (\d+)\/(\d+)(\w)B( ?)\(lfb (\d+)(\w)B\)')
@@ -27,6 +30,16 @@ VAL_FRE_RE = re.compile(r'\b(\d+)%@(\d+)')
 CPU_RE = re.compile(r'CPU \[(.*?)\]')
 WATT_RE = re.compile(r'\b(\w+) ([0-9.]+)\/([0-9.]+)\b')
 TEMP_RE = re.compile(r'\b(\w+)@(-?[0-9.]+)C\b')
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+# Numbers in the layout template
+TEMPLATE_INT = r'(\d+)'
+TEMPLATE_FLOAT = r'(-?\d+(?:\.\d+)?)'
+# Value used to find the field of each number in the line
+TEMPLATE_SENTINEL = 7919
+# Consecutive lines with a different layout before learn the new one
+TEMPLATE_RELEARN = 3
+# Lines before try again to learn a layout from a line that cannot be a template
+TEMPLATE_RETRY = 100
 
 
 def val_freq(val):
@@ -112,7 +125,7 @@ def MTS(text):
     """
     match = MTS_RE.search(text)
     if match:
-        return {'fg': int(match.group(1)), 'bg': int(match.group(1))}
+        return {'fg': int(match.group(1)), 'bg': int(match.group(2))}
     else:
         return {}
 
@@ -212,4 +225,314 @@ def WATTS(text):
         Y = Average power consumption in milliwatts.
     """
     return {str(name): {'cur': int(cur), 'avg': int(avg)} for name, cur, avg in re.findall(WATT_RE, text)}
+
+
+def _size(text):
+    """ Split a size like 252kB or 4MB) in value and unit """
+    text = text.rstrip(')')
+    return int(text[:-2]), text[-2]
+
+
+def _memory(tokens, idx):
+    """ Parse X/YUB (name Z) of RAM, SWAP and IRAM, the bracket can be attached to the size
+
+        :return: use, total, unit, the value in brackets and the index of the next token
+    """
+    used = tokens[idx]
+    if '(' in used:
+        used = used.split('(')[0]
+        idx += 1
+    else:
+        idx += 2
+    use, tot = used.split('/')
+    tot, unit = _size(tot)
+    return int(use), tot, unit, tokens[idx], idx + 1
+
+
+def _val_freq(val):
+    """ Fast version of val_freq for X, X% or X%@Y """
+    if '@' in val:
+        val, freq = val.split('@')
+        return ValFreq(int(val.rstrip('%')), int(freq) * 1000)
+    return ValFreq(int(val.rstrip('%')), None)
+
+
+def parse(text):
+    """ Parse a full tegrastats line in a single pass
+
+        The line is split in tokens and every field is decoded from left to right.
+        Tokens that cannot be decoded are skipped.
+
+        :return: The sample of this line
+        :rtype: TegraSample
+    """
+    mem = {}
+    mts = None
+    cpus = ()
+    vals = {}
+    temps = {}
+    watts = {}
+    tokens = text.split()
+    size = len(tokens)
+    idx = 0
+    while idx < size:
+        name = tokens[idx]
+        idx += 1
+        try:
+            if name == 'RAM' or name == 'IRAM' or name == 'SWAP':
+                use, tot, unit, extra, idx = _memory(tokens, idx)
+                if name == 'RAM':
+                    nblock, lfb = extra.split('x')
+                    lfb, lfb_unit = _size(lfb)
+                    mem[name] = Memory(use, tot, unit, 'lfb', lfb, lfb_unit, int(nblock))
+                else:
+                    extra, extra_unit = _size(extra)
+                    mem[name] = Memory(use, tot, unit, 'lfb' if name == 'IRAM' else 'cached', extra, extra_unit, None)
+            elif name == 'CPU' and idx < size and tokens[idx].startswith('['):
+                # CPU list, can contain spaces in old tegrastats versions
+                cpu_list = tokens[idx]
+                idx += 1
+                while ']' not in cpu_list and idx < size:
+                    cpu_list += tokens[idx]
+                    idx += 1
+                cpus = tuple(_val_freq(cpu) if cpu and cpu != 'off' else None
+                             for cpu in (cpu.strip() for cpu in cpu_list[1:cpu_list.index(']')].split(',')))
+            elif name == 'MTS' and idx + 3 < size and tokens[idx] == 'fg':
+                mts = Mts(int(tokens[idx + 1].rstrip('%')), int(tokens[idx + 3].rstrip('%')))
+                idx += 4
+            elif '@' in name and name[-1] == 'C':
+                # Temperature name@XC
+                label, temp = name.split('@')
+                temps[label] = float(temp[:-1])
+            elif idx < size:
+                value = tokens[idx]
+                if '/' in value:
+                    # Power name X/Y
+                    cur, avg = value.split('/')
+                    if cur.isdigit() and avg.isdigit():
+                        watts[name] = Rail(int(cur), int(avg))
+                        idx += 1
+                elif value[0].isdigit() and name.isupper():
+                    # Single value name X%@Y
+                    val = _val_freq(value)
+                    vals[name.split('_')[0] if "FREQ" in name else name] = val
+                    idx += 1
+        except (ValueError, IndexError):
+            continue
+    return TegraSample(mem.get('RAM'), mem.get('SWAP'), mem.get('IRAM'), mts, cpus, vals, temps, watts)
+
+
+def decode(text):
+    """ Parse a full tegrastats line in a single pass, look :func:`parse`
+
+        The output is the same of all parsers RAM, SWAP, IRAM, MTS, CPUS, VALS, TEMPS and WATTS:
+
+        * **RAM**, **CPU**, **TEMP** and **WATT** - Always available
+        * **SWAP**, **IRAM** and **MTS** - Only if available in the line
+        * All single values, like **EMC**, **GR3D**, **APE**, **NVENC**, ...
+    """
+    return parse(text).to_dict()
+
+
+def _flatten(stats, path=()):
+    """ All leaves of the stats dictionary as {path: value} """
+    leaves = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            leaves.update(_flatten(value, path + (key, )))
+        else:
+            leaves[path + (key, )] = value
+    return leaves
+
+
+def _record_paths(value, path=(), steps=()):
+    """ Position in the sample records of every value in the dictionary from :func:`decode`
+
+        :return: {path in the dictionary: steps in the records}, a step is an index of a record or a key of a dictionary
+        :rtype: dict
+    """
+    paths = {}
+    if hasattr(value, '_paths'):
+        for idx, (item, sub) in enumerate(zip(value, value._paths())):
+            if sub is not None:
+                paths.update(_record_paths(item, path + sub, steps + (idx, )))
+    elif isinstance(value, tuple):
+        # CPU cores
+        for idx, item in enumerate(value):
+            paths.update(_record_paths(item, path + ('CPU' + str(idx + 1), ), steps + (idx, )))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            paths.update(_record_paths(item, path + (key, ), steps + (key, )))
+    else:
+        paths[path] = steps
+    return paths
+
+
+def _items(indexes):
+    """ Getter of the items at the indexes as a tuple, also for a single index """
+    if len(indexes) > 1:
+        return itemgetter(*indexes)
+    idx = indexes[0]
+
+    def get(values):
+        return (values[idx], )
+    return get
+
+
+def _dict(keys):
+    """ Builder of a dictionary with the keys, from the tuple of its values """
+    def build(items):
+        return dict(zip(keys, items))
+    return build
+
+
+class LayoutTemplate(object):
+    """ Layout of a tegrastats line, look :func:`learn_layout`
+
+        A line is decoded in two passes:
+
+        1. the groups of the regular expression are converted, all integers and then all floats
+        2. the records are built from the inside out with a list of steps, each step takes its items
+           from the converted numbers, the constants and the records built before
+
+        :param pattern: Regular expression of the line, a group for each number
+        :param sample: Sample of the line used to learn the layout
+        :param fields: List of (steps in the records, index of the group, converter, scale) for each number,
+            a step is an index of a record or a key of a dictionary. The scale is the unit of an integer,
+            like 1000 for a frequency in kHz
+    """
+
+    def __init__(self, pattern, sample, fields):
+        self.pattern = re.compile(pattern)
+        self.sample = sample
+        self.fields = fields
+        ints = [field for field in fields if field[2] is int and field[3] == 1]
+        floats = [field for field in fields if field[2] is float]
+        self._scaled = [(group, scale) for _, group, convert, scale in fields if convert is int and scale != 1]
+        self._ints = _items([group for _, group, _, _ in ints]) if ints else None
+        self._floats = _items([group for _, group, _, _ in floats]) if floats else None
+        # Position of each number in the values of a line
+        numbers = {}
+        for idx, (path, _, _, _) in enumerate(ints + floats + [field for field in fields if field[2] is int and field[3] != 1]):
+            numbers[tuple(path)] = idx
+        self._constants = []
+        steps = []
+        root = self._index(sample, (), numbers, steps)
+        # Values of a line: numbers, constants, then records
+        offsets = {'number': 0, 'constant': len(numbers), 'step': len(numbers) + len(self._constants)}
+        self._root = offsets[root[0]] + root[1]
+        self._steps = [(build, _items([offsets[kind] + idx for kind, idx in items])) for build, items in steps]
+
+    def _index(self, value, path, numbers, steps):
+        """ Position of value in the values of a line, after the steps of all records inside """
+        if path in numbers:
+            return ('number', numbers[path])
+        if not value or not any(key[:len(path)] == path for key in numbers):
+            # Without numbers, shared by all samples
+            self._constants.append(value)
+            return ('constant', len(self._constants) - 1)
+        if isinstance(value, dict):
+            keys = tuple(value.keys())
+            items = [self._index(value[key], path + (key, ), numbers, steps) for key in keys]
+            steps.append((_dict(keys), items))
+        else:
+            items = [self._index(item, path + (idx, ), numbers, steps) for idx, item in enumerate(value)]
+            # Records and CPU cores
+            steps.append((tuple if type(value) is tuple else partial(tuple.__new__, type(value)), items))
+        return ('step', len(steps) - 1)
+
+    def __call__(self, text):
+        """ Sample of the line, None if the line has another layout """
+        match = self.pattern.match(text)
+        if match is None:
+            return None
+        groups = match.groups()
+        values = list(map(int, self._ints(groups))) if self._ints is not None else []
+        if self._floats is not None:
+            values.extend(map(float, self._floats(groups)))
+        values.extend([int(groups[group]) * scale for group, scale in self._scaled])
+        values.extend(self._constants)
+        for build, get in self._steps:
+            values.append(build(get(values)))
+        return values[self._root]
+
+
+def learn_layout(text):
+    """ Learn the layout of a tegrastats line
+
+        Every number in the line is replaced with a sentinel and the line is decoded again:
+        the field changed by the sentinel is the field of this number. Numbers that are part
+        of a name (like GR3D) or that are not decoded stay fixed in the template.
+
+        :return: The template of the line, None if the line cannot be used as template
+        :rtype: LayoutTemplate
+    """
+    text = text.strip()
+    sample = parse(text)
+    leaves = _flatten(sample.to_dict())
+    paths = _record_paths(sample)
+    pattern, fields, end = [], [], 0
+    for match in NUMBER_RE.finditer(text):
+        pattern.append(re.escape(text[end:match.start()]))
+        end = match.end()
+        changed = _flatten(decode(text[:match.start()] + str(TEMPLATE_SENTINEL) + text[match.end():]))
+        if set(changed) != set(leaves):
+            # The number is part of a name
+            pattern.append(re.escape(match.group()))
+            continue
+        diff = [path for path, value in changed.items() if value != leaves[path]]
+        if not diff:
+            # Not decoded
+            pattern.append(re.escape(match.group()))
+            continue
+        if len(diff) > 1 or diff[0] not in paths:
+            return None
+        value = changed[diff[0]]
+        if isinstance(value, float):
+            fields.append((paths[diff[0]], len(fields), float, 1))
+            pattern.append(TEMPLATE_FLOAT)
+        elif isinstance(value, int) and value % TEMPLATE_SENTINEL == 0 and '-' not in match.group():
+            scale = value // TEMPLATE_SENTINEL
+            fields.append((paths[diff[0]], len(fields), int, scale))
+            pattern.append(TEMPLATE_INT)
+        else:
+            return None
+    pattern.append(re.escape(text[end:]))
+    return LayoutTemplate("".join(pattern) + r'\Z', sample, fields)
+
+
+class TegraParser(object):
+    """ Tegrastats parser with a fast path for lines with the same layout
+
+        On a board all tegrastats lines have the same fields in the same order, only the numbers change.
+        The layout is learned from the first line, and the next lines are decoded with a single regular
+        expression that extracts only the numbers. Lines with a different layout are decoded with
+        :func:`parse`, and after **TEMPLATE_RELEARN** of them in a row the new layout is learned.
+    """
+
+    def __init__(self):
+        self._template = None
+        self._misses = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    def learn(self, text):
+        self._template = learn_layout(text)
+        self._misses = 0
+
+    def __call__(self, text):
+        if self._misses is None:
+            self.learn(text)
+        if self._template is not None:
+            sample = self._template(text.strip())
+            if sample is not None:
+                self.hits += 1
+                self._misses = 0
+                return sample
+        # Different layout, use the general parser
+        self.fallbacks += 1
+        self._misses += 1
+        if self._misses >= (TEMPLATE_RELEARN if self._template is not None else TEMPLATE_RETRY):
+            self.learn(text)
+        return parse(text)
 # EOF
@@ -17,20 +17,77 @@
 
 # Logging
 import logging
+import os
 import sys
+import time
 # Launch command
 import subprocess as sp
+from collections import deque
+try:
+    import selectors
+except ImportError:
+    selectors = None
+    from select import select
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 # Threading
 from threading import Thread, Event
 # Tegrastats parser
-from .tegra_parse import VALS, MTS, RAM, SWAP, IRAM, CPUS, TEMPS, WATTS
+from .tegra_parse import TegraParser
 from .common import locate_commands
 # Create logger for tegrastats
 logger = logging.getLogger(__name__)
+# Wait before restart tegrastats, doubled after every restart without data
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+# tegrastats is stalled if there are not lines for this number of intervals
+STALL_INTERVALS = 5
+# Minimum time in seconds before a stall, tegrastats needs time to start with short intervals
+STALL_MIN = 1.0
+# Time without lines longer than this number of intervals is a gap in the data
+GAP_INTERVALS = 2
+# Number of gaps stored
+GAPS_SIZE = 20
+# Lines waiting to be decoded, the oldest is dropped when full
+LINES_QUEUE = 16
+READ_SIZE = 4096
+
+
+class _Selector(object):
+    """ Wait for readable files, with selectors or select on python 2 """
+
+    def __init__(self, fds):
+        self._fds = fds
+        self._selector = None
+        if selectors is not None:
+            self._selector = selectors.DefaultSelector()
+            for fd in fds:
+                self._selector.register(fd, selectors.EVENT_READ)
+
+    def select(self, timeout):
+        if self._selector is not None:
+            return [key.fd for key, _ in self._selector.select(timeout)]
+        return select(self._fds, [], [], timeout)[0]
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
 
 
 class Tegrastats:
     """
+        Supervisor of the tegrastats process.
+
+        If tegrastats exits or does not write a line for **STALL_INTERVALS** intervals (at least **STALL_MIN** seconds),
+        it is restarted with an exponential backoff from **BACKOFF_MIN** to **BACKOFF_MAX** seconds.
+        Restarts, stalls and gaps in the data are available from :func:`status`.
+
+        The output of tegrastats is read without blocking and the lines are stored in a small queue,
+        another thread decodes the lines and runs the callback. A slow callback never blocks
+        the tegrastats pipe: when the queue is full the oldest line is dropped.
+
         - Subprocess read:
         https://stackoverflow.com/questions/375427/non-blocking-read-on-a-subprocess-pipe-in-python/4896288#4896288
         - Property
@@ -39,6 +96,7 @@ class Tegrastats:
 
     def __init__(self, callback, tegrastats_path):
         self._running = Event()
+        self._stop = Event()
         # Error message from thread
         self._error = None
         # Start process tegrastats
@@ -47,49 +105,70 @@ class Tegrastats:
         self._thread = None
         # Initialize callback
         self.callback = callback
+        # Parser with the layout learned from the first line
+        self._parser = TegraParser()
+        # Supervisor status
+        self._restarts = 0
+        self._stalls = 0
+        self._stalled = False
+        self._last_line = None
+        self._gaps = deque(maxlen=GAPS_SIZE)
+        # Lines from reader to decoder
+        self._lines = queue.Queue(LINES_QUEUE)
+        self._dropped = 0
+        self._wakeup = None
+        self._decoder = None
+
+    def status(self):
+        """
+        Status of the tegrastats process:
+
+        * **collector** - Name of the collector
+        * **restarts** - Number of restarts of tegrastats
+        * **stalls** - Number of times tegrastats did not write for **STALL_INTERVALS** intervals
+        * **stalled** - True until the first line after a stall or an exit of tegrastats
+        * **gaps** - List of the last gaps in the data, [time, seconds without data]
+        * **queue** - Lines waiting to be decoded
+        * **dropped** - Lines dropped because the decoder was too slow
+
+        :return: Status dictionary
+        :rtype: dict
+        """
+        return {'collector': 'tegrastats',
+                'restarts': self._restarts,
+                'stalls': self._stalls,
+                'stalled': self._stalled,
+                'gaps': list(self._gaps),
+                'queue': self._lines.qsize(),
+                'dropped': self._dropped}
 
     def _decode(self, text):
-        # Find and parse all single values
-        stats = VALS(text)
-        # Parse if exist MTS
-        mts = MTS(text)
-        if mts:
-            stats['MTS'] = mts
-        # Parse RAM
-        stats['RAM'] = RAM(text)
-        # If exists parse SWAP
-        swap = SWAP(text)
-        if swap:
-            stats['SWAP'] = swap
-        # If exists parse IRAM
-        iram = IRAM(text)
-        if iram:
-            stats['IRAM'] = iram
-        # Parse CPU status
-        stats['CPU'] = CPUS(text)
-        # Parse temperatures
-        stats['TEMP'] = TEMPS(text)
-        # Parse Watts
-        stats['WATT'] = WATTS(text)
-        return stats
-
-    def _read_tegrastats(self, interval, running):
-        pts = sp.Popen([self.path, '--interval', str(interval)], stdout=sp.PIPE)
+        # Parse all fields in a TegraSample, with the fast path when the layout does not change
+        return self._parser(text)
+
+    def _push(self, line):
+        # Store the line, drop the oldest if the decoder is too slow
+        while True:
+            try:
+                self._lines.put_nowait(line)
+                return
+            except queue.Full:
+                try:
+                    self._lines.get_nowait()
+                    self._dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _decode_lines(self):
         try:
-            # Reading loop
-            while running.is_set():
-                if pts.poll() is not None:
-                    continue
-                out = pts.stdout
-                if out is not None:
-                    # Read line process output
-                    line = out.readline()
-                    # Decode line in UTF-8
-                    tegrastats_data = line.decode("utf-8")
-                    # Decode and store
-                    stats = self._decode(tegrastats_data)
-                    # Launch callback
-                    self.callback(stats)
+            while True:
+                line = self._lines.get()
+                if line is None:
+                    break
+                # Decode line in UTF-8, decode and store
+                stats = self._decode(line.decode("utf-8"))
+                # Launch callback
+                self.callback(stats)
         except AttributeError:
             pass
         except IOError:
@@ -97,12 +176,85 @@ class Tegrastats:
         except Exception:
             # Write error message
             self._error = sys.exc_info()
+
+    def _read_lines(self, pts, interval, running):
+        """ Read all lines from tegrastats until exit, stall or close
+
+            :return: Reason of the end: 'exit', 'stall' or None if closed
+        """
+        out = pts.stdout.fileno()
+        selector = _Selector([out, self._wakeup[0]])
+        stall = max(STALL_INTERVALS * interval, STALL_MIN)
+        buffer = b''
+        try:
+            while running.is_set():
+                ready = selector.select(interval)
+                now = time.time()
+                if self._wakeup[0] in ready:
+                    return None
+                if out in ready:
+                    data = os.read(out, READ_SIZE)
+                    if not data:
+                        return 'exit'
+                    lines = (buffer + data).split(b'\n')
+                    buffer = lines.pop()
+                    for line in lines:
+                        if self._last_line is not None and now - self._last_line > GAP_INTERVALS * interval:
+                            self._gaps.append([self._last_line, now - self._last_line])
+                        self._last_line = now
+                        self._stalled = False
+                        self._push(line)
+                elif pts.poll() is not None:
+                    return 'exit'
+                elif now - self._last_line > stall:
+                    return 'stall'
         finally:
-            # Kill process
-            try:
-                pts.kill()
-            except OSError:
-                pass
+            selector.close()
+        return None
+
+    def _read_tegrastats(self, interval, running, stop):
+        backoff = BACKOFF_MIN
+        # Reference time for stalls before the first line
+        self._last_line = time.time()
+        try:
+            while running.is_set():
+                reason = 'error'
+                last_line = self._last_line
+                try:
+                    pts = sp.Popen([self.path, '--interval', str(interval)], stdout=sp.PIPE)
+                except OSError as e:
+                    logger.error("tegrastats not started {error}".format(error=e))
+                else:
+                    try:
+                        reason = self._read_lines(pts, interval / 1000.0, running)
+                    finally:
+                        # Kill process
+                        try:
+                            pts.kill()
+                            pts.wait()
+                        except OSError:
+                            pass
+                if reason is None:
+                    break
+                # Restart tegrastats
+                if reason == 'stall':
+                    self._stalls += 1
+                self._stalled = True
+                self._restarts += 1
+                # Start again from the minimum backoff if tegrastats wrote some lines
+                if self._last_line != last_line:
+                    backoff = BACKOFF_MIN
+                logger.warning("tegrastats {reason}, restart in {backoff}s".format(reason=reason, backoff=backoff))
+                if stop.wait(backoff):
+                    break
+                backoff = min(backoff * 2, BACKOFF_MAX)
+        except AttributeError:
+            pass
+        except IOError:
+            pass
+        except Exception:
+            # Write error message
+            self._error = sys.exc_info()
 
     def open(self, interval=0.5):
         if self._thread is not None:
@@ -111,22 +263,39 @@ class Tegrastats:
         interval = int(interval * 1000)
         # Check if thread or process exist
         self._running.set()
-        # Start thread Service client
-        self._thread = Thread(target=self._read_tegrastats, args=(interval, self._running, ))
+        self._stop = Event()
+        # Pipe to wake up the reader on close
+        self._wakeup = os.pipe()
+        self._lines = queue.Queue(LINES_QUEUE)
+        # Start decoder and reader
+        self._decoder = Thread(target=self._decode_lines)
+        self._decoder.start()
+        self._thread = Thread(target=self._read_tegrastats, args=(interval, self._running, self._stop, ))
         self._thread.start()
         return True
 
     def close(self, timeout=None):
+        # Check if thread and process are already empty
+        self._running.clear()
+        if self._thread is not None:
+            self._stop.set()
+            # Wake up the reader
+            os.write(self._wakeup[1], b'\0')
+            self._thread.join(timeout)
+            self._thread = None
+            # Stop decoder
+            self._push(None)
+            self._decoder.join(timeout)
+            self._decoder = None
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
         # Catch exception if exist
         if self._error:
             # Extract exception and raise
             ex_type, ex_value, tb_str = self._error
+            self._error = None
             ex_value.__traceback__ = tb_str
             raise ex_value
-        # Check if thread and process are already empty
-        self._running.clear()
-        if self._thread is not None:
-            self._thread.join(timeout)
-            self._thread = None
         return True
 # EOF
@@ -21,6 +21,7 @@ import curses
 import logging
 # Timer
 from datetime import datetime, timedelta
+from ..core import JtopException
 # Graphics elements
 from .lib.common import (check_size,
                          check_curses,
@@ -32,6 +33,8 @@ logger = logging.getLogger(__name__)
 ABC = abc.ABCMeta('ABC', (object,), {})
 # Gui refresh rate
 GUI_REFRESH = 1000 // 20
+# Time of the history loaded in all charts when the GUI starts, in seconds
+GUI_BACKFILL = 10.0
 
 
 class Page(ABC):
@@ -96,6 +99,12 @@ class JTOPGUI:
             page = obj(stdscr, jetson)
             page.setcontroller(self)
             self.pages += [page]
+        # Fill the charts with the last samples of the service
+        try:
+            samples = jetson.backfill(GUI_BACKFILL)
+            logger.info("Loaded {samples} samples from the history".format(samples=samples))
+        except JtopException as e:
+            logger.info("History not available: {error}".format(error=e))
         # Set default page
         self.n_page = 0
         self.set(init_page)
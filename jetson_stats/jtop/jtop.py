@@ -58,10 +58,11 @@ Follow the next attributes to know in detail how you can you in your python proj
 import logging
 import os
 import sys
+import time
 from datetime import datetime, timedelta
 from multiprocessing import Event, AuthenticationError
-from threading import Thread
-from .service import JtopManager
+from threading import Thread, RLock
+from .service import JtopManager, JTOP_SHM, JTOP_STREAM, TRANSPORT_STREAM, TRANSPORT_SHM, TRANSPORT_MANAGER, decode_sample
 from .core import (
     Board,
     Engine,
@@ -73,6 +74,9 @@ from .core import (
     import_os_variables,
     get_local_interfaces,
     JetsonClocks,
+    SampleRing,
+    Subscriber,
+    Controller,
     JtopException)
 # Fix connection refused for python 2.7
 try:
@@ -120,8 +124,16 @@ class jtop(Thread):
         self._observers = set()
         # Stats read from service
         self._stats = {}
+        # Lock of the decoded status, changed by the live samples and by a replay of the history
+        self._decode_lock = RLock()
+        # Stream of samples pushed by the service
+        self._stream = None
+        # Ring of samples in shared memory and index of the last sample read
+        self._ring = None
+        self._last = 0
         # Read stats
         JtopManager.register('get_queue')
+        JtopManager.register('get_replies')
         JtopManager.register("sync_data")
         JtopManager.register('sync_event')
         # Initialize broadcaster manager
@@ -430,7 +442,11 @@ class jtop(Thread):
         if mode == self._nvp.id:
             return
         # Send new nvpmodel
-        self._controller.put({'nvp': mode})
+        self._controller.put({'nvp': mode}, self._reply_nvp)
+
+    def _reply_nvp(self, reply):
+        if not reply['nvp']:
+            logger.warning("nvpmodel is still setting the previous mode, mode not changed")
 
     @property
     def jetson_clocks(self):
@@ -485,7 +501,7 @@ class jtop(Thread):
             return
         if value != self._jc.is_alive:
             # Send status jetson_clocks
-            self._controller.put({'jc': {'enable': value}})
+            self._controller.put({'jc': {'enable': value}}, self._jc._reply)
 
     @property
     def stats(self):
@@ -498,7 +514,7 @@ class jtop(Thread):
 
         The field listed are:
 
-        * **time** - A `datetime` variable with the local time in your board
+        * **time** - A `datetime` variable with the local time of the sample in your board
         * **uptime** - A `timedelta` with the up time of your board, same from :func:`~jtop.jtop.jtop.uptime`
         * **jetson_clocks** - Status of jetson_clocks, human readable :func:`~jtop.jtop.jtop.jetson_clocks`
         * **nvp model** - If exist, the NV Power Model name active :func:`~jtop.jtop.jtop.nvpmodel`
@@ -522,7 +538,7 @@ class jtop(Thread):
         :return: Compacts jetson statistics
         :rtype: dict
         """
-        stats = {'time': datetime.now(), 'uptime': self.uptime}
+        stats = {'time': datetime.fromtimestamp(self.timestamp) if self.timestamp is not None else datetime.now(), 'uptime': self.uptime}
         # -- jetson_clocks --
         if self.jetson_clocks is not None:
             stats['jetson_clocks'] = 'ON' if self.jetson_clocks else 'OFF'
@@ -802,6 +818,32 @@ class jtop(Thread):
         """
         return self._stats['temperature']
 
+    @property
+    def tegrastats(self):
+        """
+        Status of the stats collector in the jtop service.
+
+        * **collector** - **tegrastats** or **sysfs** if the service reads directly sysfs and procfs
+
+        With tegrastats:
+
+        * **restarts** - Number of restarts of tegrastats
+        * **stalls** - Number of times tegrastats did not write a line for too long
+        * **stalled** - True if there are not new data from tegrastats
+        * **gaps** - List of the last gaps in the data, [time, seconds without data]
+        * **queue** - Lines waiting to be decoded
+        * **dropped** - Lines dropped because the service was too slow
+
+        With sysfs:
+
+        * **samples** - Number of samples read
+        * **late** - Number of samples read later than the interval
+
+        :return: tegrastats status
+        :rtype: dict
+        """
+        return self._stats.get('tegrastats', {})
+
     @property
     def local_interfaces(self):
         """
@@ -832,6 +874,17 @@ class jtop(Thread):
         """
         return status_disk()
 
+    @property
+    def timestamp(self):
+        """
+        Time of the last sample read by the jtop service, also for the samples
+        replayed with :func:`~jtop.jtop.jtop.backfill`
+
+        :return: Time in seconds from epoch, None if the service does not send it
+        :rtype: float
+        """
+        return self._stats.get('time')
+
     @property
     def uptime(self):
         """
@@ -842,10 +895,11 @@ class jtop(Thread):
         """
         return timedelta(seconds=get_uptime())
 
-    def _decode(self, data):
+    def _update(self, data):
         """
         Internal decode function to decode and refactoring data
         """
+        data = decode_sample(data)
         self._stats = data
         # -- ENGINES --
         self._engine._update(data['engines'])
@@ -859,12 +913,72 @@ class jtop(Thread):
         # -- NVP Model --
         if 'nvp' in data:
             self._nvp._update(data['nvp'])
-        # Set trigger
-        self._trigger.set()
-        # Notify all observers
-        for observer in self._observers:
-            # Call all observer in list
-            observer(self)
+
+    def _decode(self, data):
+        with self._decode_lock:
+            self._update(data)
+            # Set trigger
+            self._trigger.set()
+            # Notify all observers
+            for observer in self._observers:
+                # Call all observer in list
+                observer(self)
+
+    def _replay(self, seconds, callback):
+        """ Decode the samples of the last seconds stored by the service, then the last live sample again """
+        if self._stream is None:
+            raise JtopException("The history needs the stream of jtop service")
+        samples = self._stream.request({'history': {'start': time.time() - seconds}})
+        with self._decode_lock:
+            last = self._stats
+            try:
+                for stamp, data in samples:
+                    # Samples of older services have not the time
+                    data.setdefault('time', stamp)
+                    self._update(data)
+                    callback()
+            finally:
+                self._update(last)
+        return len(samples)
+
+    def history(self, seconds=60):
+        """
+        Status of the last seconds, stored by the jtop service also before this jtop started.
+
+        The service keeps all samples of the last 15 minutes and the mean of every 10 seconds
+        for the last 24 hours, at the interval of the service.
+
+        .. code-block:: python
+
+            with jtop() as jetson:
+                for stats in jetson.history(60):
+                    print(stats['time'], stats['GPU'])
+
+        :param seconds: Time of the history
+        :type seconds: float
+        :return: List of samples in the same format of :func:`~jtop.jtop.jtop.stats`, **time** is the time of the sample
+        :rtype: list
+        :raises JtopException: if the stream of the service is not available
+        """
+        stats = []
+        self._replay(seconds, lambda: stats.append(self.stats))
+        return stats
+
+    def backfill(self, seconds):
+        """
+        Call all observers with the samples of the last seconds stored by the jtop service,
+        for example to fill a chart when jtop starts. Look :func:`~jtop.jtop.jtop.history`
+
+        :param seconds: Time of the history
+        :type seconds: float
+        :return: Number of samples
+        :rtype: int
+        :raises JtopException: if the stream of the service is not available
+        """
+        def notify():
+            for observer in list(self._observers):
+                observer(self)
+        return self._replay(seconds, notify)
 
     def run(self):
         """ """
@@ -873,8 +987,7 @@ class jtop(Thread):
         try:
             while self._running:
                 # Send alive message
-                if self._controller.empty():
-                    self._controller.put({})
+                self._controller.alive()
                 # Read stats from jtop service
                 data = self._get_data()
                 # Decode and update all jtop data
@@ -882,8 +995,29 @@ class jtop(Thread):
         except Exception:
             # Store error message
             self._error = sys.exc_info()
+        finally:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
 
     def _get_data(self):
+        # Next sample pushed by the service
+        if self._stream is not None:
+            sample = self._stream.sample(timeout=self._interval * TIMEOUT_GAIN)
+            if sample is None:
+                raise JtopException("Lost connection with jtop server")
+            _, data = sample
+            return data
+        # Copy the last sample from shared memory, without requests to the service
+        if self._ring is not None:
+            sample = self._ring.wait(self._last, timeout=self._interval * TIMEOUT_GAIN, period=self._server_interval)
+            if sample is None:
+                raise JtopException("Lost connection with jtop server")
+            self._last, data = sample
+            return data
         try:
             # Check if is not set event otherwise wait
             if not self._sync_event.is_set():
@@ -899,14 +1033,12 @@ class jtop(Thread):
             raise JtopException("Lost connection with jtop server")
         return data
 
-    def _get_configuration(self):
-        while True:
-            # Send configuration connection
-            self._controller.put({'interval': self._interval})
-            # Return configuration
-            data = self._controller.get(self._interval * TIMEOUT_GAIN)
-            if 'init' in data:
-                return data['init']
+    def _transport(self):
+        if self._stream is not None:
+            return TRANSPORT_STREAM
+        if self._ring is not None:
+            return TRANSPORT_SHM
+        return TRANSPORT_MANAGER
 
     def start(self):
         """
@@ -949,11 +1081,26 @@ class jtop(Thread):
         except AuthenticationError:
             raise JtopException("Authentication mismatch with jetson-stats server")
         # Initialize synchronized data and condition
-        self._controller = self._broadcaster.get_queue()
         self._sync_data = self._broadcaster.sync_data()
         self._sync_event = self._broadcaster.sync_event()
+        # Read the samples from the stream, or from shared memory if available
+        try:
+            self._stream = Subscriber(JTOP_STREAM)
+        except JtopException as e:
+            logger.info(e)
+        if self._stream is None:
+            try:
+                self._ring = SampleRing.attach(JTOP_SHM)
+            except JtopException as e:
+                logger.info(e)
+        # Control messages, with a reply for this client on the stream
+        self._controller = Controller(self._broadcaster.get_queue(), self._stream, self._broadcaster.get_replies())
         # Initialize connection
-        init = self._get_configuration()
+        init = self._controller.init(self._interval, self._transport(), self._interval * TIMEOUT_GAIN)
+        # Service without shared memory
+        if self._ring is not None and not init.get('shm'):
+            self._ring.close()
+            self._ring = None
         # Load server speed
         self._server_interval = init['interval']
         # Load board information
@@ -19,13 +19,14 @@
 import logging
 # Operative system
 # import signal
-import copy
 import os
 import sys
 import stat
+import time
 from grp import getgrnam
 from multiprocessing import Process, Queue, Event, Value
 from multiprocessing.managers import SyncManager
+from threading import Lock
 # jetson_stats imports
 from .core import (
     cpu_models,
@@ -33,13 +34,24 @@ from .core import (
     MemoryService,
     JtopException,
     Tegrastats,
+    SysfsCollector,
+    SampleRing,
+    History,
+    Recorder,
+    ProbeCache,
+    Publisher,
+    STATIC_ANY,
+    Rail,
+    to_dicts,
     JetsonClocksService,
     Config,
     NVPModelService,
     FanService,
     SwapService,
     get_key,
+    command_pool,
     import_os_variables)
+from .core import sysfs
 # Create logger for tegrastats
 logger = logging.getLogger(__name__)
 # Load queue library for python 2 and python 3
@@ -54,6 +66,11 @@ except ImportError:
     import Queue as queue
 
 PATH_TEGRASTATS = ['/usr/bin/tegrastats', '/home/nvidia/tegrastats']
+# Stats collectors
+COLLECTOR_AUTO = 'auto'
+COLLECTOR_TEGRASTATS = 'tegrastats'
+COLLECTOR_SYSFS = 'sysfs'
+COLLECTORS = [COLLECTOR_AUTO, COLLECTOR_TEGRASTATS, COLLECTOR_SYSFS]
 PATH_JETSON_CLOCKS = ['/usr/bin/jetson_clocks', '/home/nvidia/jetson_clocks.sh']
 PATH_FAN = ['/sys/kernel/debug/tegra_fan', '/sys/devices/pwm-fan']
 PATH_NVPMODEL = ['nvpmodel']
@@ -61,7 +78,24 @@ PATH_NVPMODEL = ['nvpmodel']
 # https://refspecs.linuxfoundation.org/FHS_3.0/fhs/ch05s13.html
 # https://en.wikipedia.org/wiki/Filesystem_Hierarchy_Standard
 JTOP_PIPE = '/run/jtop.sock'
+# Shared memory with the last samples, /dev/shm/jtop
+JTOP_SHM = 'jtop'
+# Stream of samples pushed to all subscribers
+JTOP_STREAM = '/run/jtop_stream.sock'
+# Data that almost never change, sent on the stream only when changed
+STREAM_STATIC = [('nvp', 'modes'), ('swap', 'list'), ('cpu_models', ), ('show', 'CPU', STATIC_ANY, 'IdleStates')]
+# Folder of the flight recorder, samples stored also without clients
+JTOP_RECORDER = '/var/log/jtop'
+# How a client reads the samples
+TRANSPORT_STREAM = 'stream'
+TRANSPORT_SHM = 'shm'
+TRANSPORT_MANAGER = 'manager'
 JTOP_USER = 'jetson_stats'
+# Time to live of the probes read at every sample, in seconds
+PROBE_CPU_MODELS_TTL = 5.0
+PROBE_NVJPG_TTL = 1.0
+PROBE_SWAP_TTL = 10.0
+PROBE_NVP_MODE_TTL = 5.0
 # Gain timeout lost connection
 TIMEOUT_GAIN = 3
 TIMEOUT_SWITCHOFF = 3.0
@@ -96,6 +130,39 @@ def load_jetson_variables():
     return {'info': info, 'hardware': hardware}
 
 
+def decode_sample(data):
+    """
+    Sample of the service with the dictionaries of the clients.
+
+    The service sends the records of tegrastats as they are, and in separate keys the values
+    of jetson_clocks --show, the CPU models and meminfo. All records are converted with to_dict
+    and merged with these values, the sample is not changed.
+
+    :param data: Sample of the service
+    :return: Sample with only dictionaries
+    :rtype: dict
+    """
+    data = to_dicts(data)
+    show = data.pop('show', {})
+    # -- CPU --
+    cpus = data['cpu']
+    for name, cpu in cpus.items():
+        if cpu is None:
+            # CPU off
+            cpus[name] = {}
+    for name, jc_cpu in show.get('CPU', {}).items():
+        cpus[name].update(jc_cpu)
+    for name, model in data.pop('cpu_models', {}).items():
+        cpus[name]['model'] = model
+    # -- GPU and EMC --
+    data['gpu'].update(show.get('GPU', {}))
+    if 'emc' in data:
+        data['emc'].update(show.get('EMC', {}))
+    # -- RAM --
+    data['ram'].update(data.pop('meminfo', {}))
+    return data
+
+
 class JtopManager(SyncManager):
 
     def __init__(self, authkey=None):
@@ -106,6 +173,9 @@ class JtopManager(SyncManager):
     def get_queue(self):
         pass
 
+    def get_replies(self):
+        pass
+
     def sync_data(self):
         pass
 
@@ -123,7 +193,8 @@ class JtopServer(Process):
         - https://docs.python.org/2.7/reference/datamodel.html
     """
 
-    def __init__(self, force=False, path_tegrastats=PATH_TEGRASTATS, path_jetson_clocks=PATH_JETSON_CLOCKS, path_fan=PATH_FAN, path_nvpmodel=PATH_NVPMODEL):
+    def __init__(self, force=False, path_tegrastats=PATH_TEGRASTATS, path_jetson_clocks=PATH_JETSON_CLOCKS, path_fan=PATH_FAN, path_nvpmodel=PATH_NVPMODEL,
+                 collector=COLLECTOR_AUTO, shared_memory=True, recorder=None):
         self.force = force
         # Check if running a root
         if os.getuid() != 0:
@@ -134,17 +205,39 @@ class JtopServer(Process):
         self._error = Queue()
         # Command queue
         self.q = Queue()
+        # Configurations for the clients without the stream
+        self.replies = Queue()
         # Speed interval
         self.interval = Value('d', -1.0)
         # Dictionary to sync
         self.data = {}
         # Event lock
         self.event = Event()
+        # Ring of samples in shared memory, created on start
+        self._shared_memory = shared_memory and SampleRing.available()
+        self.ring = None
+        # History of the samples, sent to the subscribers of the stream on request
+        self.history = History()
+        # Stream of samples, opened by the service process
+        self.publisher = Publisher(JTOP_STREAM, static=STREAM_STATIC, handler=self.request)
+        # Every sample is encoded once for the stream and the history, also if the stream is not available
+        self.encoder = self.publisher.encoder
+        self._gid = None
+        # True when a client without stream and shared memory is connected, the samples are sent also with the manager
+        self._manager_data = False
+        # Flight recorder, optional, stores the samples in the recorder folder
+        self.recorder = Recorder(recorder) if recorder is not None else None
+        # True when tegrastats runs only for the recorder
+        self._recording = False
+        # Control messages from the queue and from the stream, and timeout of the clients
+        self._control_lock = Lock()
+        self._timeout = None
         # Load super Thread constructor
         super(JtopServer, self).__init__()
         # Register stats
         # https://docs.python.org/2/library/multiprocessing.html#using-a-remote-manager
         JtopManager.register('get_queue', callable=lambda: self.q)
+        JtopManager.register('get_replies', callable=lambda: self.replies)
         JtopManager.register("sync_data", callable=lambda: self.data)
         JtopManager.register('sync_event', callable=lambda: self.event)
         # Generate key and open broadcaster
@@ -167,10 +260,29 @@ class JtopServer(Process):
             self.nvpmodel = None
         # Setup memory servive
         self.memory = MemoryService()
-        # Setup tegrastats
-        self.tegra = Tegrastats(self.tegra_stats, path_tegrastats)
+        # Setup collector, tegrastats or direct read from sysfs
+        if collector not in COLLECTORS:
+            raise JtopException("Collector {collector} does not exist, use: {collectors}".format(collector=collector, collectors=", ".join(COLLECTORS)))
+        if collector == COLLECTOR_SYSFS:
+            self.tegra = SysfsCollector(self.tegra_stats)
+        else:
+            try:
+                self.tegra = Tegrastats(self.tegra_stats, path_tegrastats)
+            except JtopException as error:
+                if collector != COLLECTOR_AUTO:
+                    raise
+                logger.warning("{error}, read stats from sysfs".format(error=error))
+                self.tegra = SysfsCollector(self.tegra_stats)
         # Swap manager
         self.swap = SwapService(self.config)
+        # Probes read again only after a time to live or when changed by a control message
+        self.probes = ProbeCache()
+        self.probes.register('cpu_models', cpu_models, ttl=PROBE_CPU_MODELS_TTL)
+        self.probes.register('nvjpg', nvjpg, ttl=PROBE_NVJPG_TTL)
+        self.probes.register('swap', self.swap.all, ttl=PROBE_SWAP_TTL)
+        if self.nvpmodel is not None:
+            self.probes.register('nvp_modes', self.nvpmodel.modes)
+            self.probes.register('nvp_mode', self.nvpmodel.get, ttl=PROBE_NVP_MODE_TTL)
 
     def run(self):
         # Read nvp_mode
@@ -181,14 +293,25 @@ class JtopServer(Process):
             self.jetson_clocks.initialization(self.nvpmodel)
         # Initialize jetson_fan
         self.fan.initialization(self.jetson_clocks)
-        # Initialize variables
-        timeout = None
-        interval = 1
+        # Open stream of samples
+        try:
+            self.publisher.open(gid=self._gid)
+        except (OSError, IOError) as e:
+            logger.warning("Stream not available: {error}".format(error=e))
+            self.publisher = None
+        # Start the flight recorder
+        if self.recorder is not None:
+            try:
+                self.recorder.open()
+                self._record()
+            except (OSError, IOError) as e:
+                logger.warning("Recorder not available: {error}".format(error=e))
+                self.recorder = None
         try:
             while True:
                 try:
                     # Decode control message
-                    control = self.q.get(timeout=timeout)
+                    control = self.q.get(timeout=self._timeout)
                     # Check if the configuration exist
                     if self.jetson_clocks:
                         if not self.jetson_clocks.is_config():
@@ -197,89 +320,30 @@ class JtopServer(Process):
                     # Check if control is not empty
                     if not control:
                         continue
-                    # If service read the same init message resend it
-                    if 'init' in control:
-                        self.q.put(control)
-                        continue
                     logger.debug("control message {control}".format(control=control))
-                    # Manage swap
-                    if 'swap' in control:
-                        swap = control['swap']
-                        if swap:
-                            self.swap.set(swap['size'], swap['boot'])
-                        else:
-                            self.swap.deactivate()
-                    # Manage jetson_clocks
-                    if 'config' in control:
-                        command = control['config']
-                        if command == 'reset':
-                            logger.info('Reset configuration')
-                            self.config.clear()
-                            if self.jetson_clocks is not None:
-                                logger.info('Remove jetson_clocks config')
-                                self.jetson_clocks.clear()
-                    if 'jc' in control:
-                        jc = control['jc']
-                        # Enable / disable jetson_clocks
-                        if 'enable' in jc:
-                            self.jetson_clocks.set(jc['enable'])
-                        # Update jetson_clocks configuration
-                        if 'boot' in jc:
-                            self.jetson_clocks.boot = jc['boot']
-                    # Speed Fan and configuration
-                    if 'fan' in control:
-                        fan = control['fan']
-                        for key, value in fan.items():
-                            logger.info('Fan config {} {}'.format(key, value))
-                            if key == 'mode':
-                                self.fan.mode = value
-                            elif key == 'speed':
-                                self.fan.speed = value
-                    # Decode nvp model
-                    if 'nvp' in control:
-                        mode = control['nvp']
-                        logger.info("Set new NV Power Mode {mode}".format(mode=mode))
-                        # Set new NV Power Mode
-                        self.nvpmodel.set(mode)
-                    if 'memory' in control:
-                        logger.info("Clear cache")
-                        # Clear cache
-                        self.swap.clear_cache()
-                    # Initialize tegrastats speed
-                    if 'interval' in control:
-                        interval = control['interval']
-                        # Run stats
-                        if self.tegra.open(interval=interval):
-                            # Start jetson_clocks
-                            if self.jetson_clocks is not None:
-                                self.jetson_clocks.start(interval)
-                            # Set interval value
-                            self.interval.value = interval
-                            # Status start tegrastats
-                            logger.info("tegrastats started {interval}ms".format(interval=int(interval * 1000)))
-                        # send configuration board
-                        init = {
-                            'board': self.board,
-                            'interval': self.interval.value,
-                            'swap': self.swap.path,
-                            'fan': self.fan.get_configs(),
-                            'jc': self.jetson_clocks is not None,
-                            'nvpmodel': self.nvpmodel is not None}
-                        self.q.put({'init': init})
-                    # Update timeout interval
-                    timeout = TIMEOUT_GAIN if interval <= TIMEOUT_GAIN else interval * TIMEOUT_GAIN
+                    try:
+                        reply = self.control(control)
+                    except (JtopException, ValueError) as e:
+                        logger.error("Control {control} failed: {error}".format(control=control, error=e))
+                        continue
+                    # Clients without the stream read the configuration from the queue of the replies
+                    if 'interval' in reply:
+                        self.replies.put({'init': self._init(), 'client': control.get('client'), 'expire': control.get('expire', 0)})
                 except queue.Empty:
                     self.sync_event.clear()
-                    # Close and log status
-                    if self.tegra.close():
-                        logger.info("tegrastats close")
-                        # Start jetson_clocks
-                        if self.jetson_clocks is not None:
-                            self.jetson_clocks.stop()
-                            logger.info("jetson_clocks show closed")
-                    # Disable timeout
-                    timeout = None
-                    self.interval.value = -1.0
+                    with self._control_lock:
+                        # Close and log status
+                        if self.tegra.close():
+                            logger.info("tegrastats close")
+                            # Start jetson_clocks
+                            if self.jetson_clocks is not None:
+                                self.jetson_clocks.stop()
+                                logger.info("jetson_clocks show closed")
+                        # Disable timeout
+                        self._timeout = None
+                        self.interval.value = -1.0
+                        # Keep sampling for the recorder
+                        self._record()
         except (KeyboardInterrupt, SystemExit):
             pass
         except FileNotFoundError:
@@ -289,12 +353,29 @@ class JtopServer(Process):
             # Write error messag
             self._error.put(sys.exc_info())
         finally:
-            # Close tegra
+            # Close tegra, no more samples after this point
             if self.tegra.close(timeout=TIMEOUT_SWITCHOFF):
                 logger.info("Force tegrastats close")
                 # Start jetson_clocks
                 if self.jetson_clocks is not None:
                     self.jetson_clocks.close()
+            # Close stream
+            if self.publisher is not None:
+                self.publisher.close()
+            # Write the last samples of the recorder
+            if self.recorder is not None:
+                self.recorder.close()
+                logger.info("Recorder {status}".format(status=self.recorder.status()))
+            logger.debug("Commands {status}".format(status=command_pool().status()))
+            # Close all files kept open by the probes, last: every thread that reads them is stopped
+            sysfs.close_all()
+
+    def _record(self):
+        """ Sample at the interval of the recorder while clients are not connected """
+        if self.recorder is None or not self.tegra.open(interval=self.recorder.interval):
+            return
+        self._recording = True
+        logger.info("tegrastats started for the recorder {interval}s".format(interval=self.recorder.interval))
 
     def start(self):
         # Initialize socket
@@ -320,6 +401,19 @@ class JtopServer(Process):
         self.sync_event = self.broadcaster.sync_event()
         # Change owner
         os.chown(JTOP_PIPE, os.getuid(), gid)
+        self._gid = gid
+        # Shared memory with the samples, same permission of the pipe
+        if self._shared_memory:
+            try:
+                self.ring = SampleRing.create(JTOP_SHM)
+                os.chown(self.ring.path, os.getuid(), gid)
+                # Equivalent permission 640, only the service writes the samples
+                os.chmod(self.ring.path, stat.S_IREAD | stat.S_IWRITE | stat.S_IRGRP)
+            except (JtopException, OSError) as e:
+                logger.warning("Shared memory not available: {error}".format(error=e))
+                if self.ring is not None:
+                    self.ring.close()
+                self.ring = None
         # Change mode cotroller and stats
         # https://www.tutorialspoint.com/python/os_chmod.htm
         # Equivalent permission 660 srw-rw----
@@ -344,6 +438,7 @@ class JtopServer(Process):
 
     def close(self):
         self.q.close()
+        self.replies.close()
         self.broadcaster.shutdown()
         # If process is alive wait to quit
         # logger.debug("Status subprocess {status}".format(status=self.is_alive()))
@@ -365,6 +460,10 @@ class JtopServer(Process):
                 raise ex_value
         except queue.Empty:
             pass
+        # Remove shared memory
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
         self.remove_files()
         # Close stats server
         logger.info("Service closed")
@@ -375,6 +474,9 @@ class JtopServer(Process):
         if os.path.exists(JTOP_PIPE):
             logger.info("Remove pipe {pipe}".format(pipe=JTOP_PIPE))
             os.remove(JTOP_PIPE)
+        # Stream of a service closed without cleanup
+        if os.path.exists(JTOP_STREAM):
+            os.remove(JTOP_STREAM)
 
     def _total_power(self, power):
         """
@@ -400,88 +502,203 @@ class JtopServer(Process):
             del power[total_name]
             return total, power
         # Otherwise measure all total power
-        total = {'cur': 0, 'avg': 0}
-        for value in power.values():
-            total['cur'] += value['cur']
-            total['avg'] += value['avg']
-        return total, power
+        return Rail(sum(value.cur for value in power.values()), sum(value.avg for value in power.values())), power
+
+    def request(self, request):
+        """ Reply to a request of a subscriber of the stream """
+        if 'history' in request:
+            history = request['history']
+            return self.history.reply(history.get('start', 0), history.get('end'))
+        if 'control' in request:
+            return self.control(request['control'])
+        raise JtopException("Unknown request {request}".format(request=list(request)))
+
+    def control(self, control):
+        """
+        Run a control message of a client, from the queue or from a request on the stream.
+        The reply has a key for each control:
+
+        * **init** - Configuration of the service for a new client, look :func:`_init`
+        * **interval** - Interval of the service
+        * **fan** - Mode and speed of the fan
+        * **nvp** - False if nvpmodel is still setting the previous mode
+        * **jc** - False in **enable** if jetson_clocks is still running, **boot**
+        * **swap** - Path of the swap and True in **running** while changing the swap
+        * **memory**, **config** - True
+
+        :return: Reply dictionary
+        :rtype: dict
+        :raises JtopException: if the control is not available on this board
+        """
+        reply = {}
+        with self._control_lock:
+            # Manage swap
+            if 'swap' in control:
+                swap = control['swap']
+                if swap:
+                    self.swap.set(swap['size'], swap['boot'])
+                else:
+                    self.swap.deactivate()
+                self.probes.invalidate('swap')
+                reply['swap'] = {'path': self.swap.path, 'running': self.swap.is_running()}
+            # Manage jetson_clocks
+            if 'config' in control:
+                command = control['config']
+                if command == 'reset':
+                    logger.info('Reset configuration')
+                    self.config.clear()
+                    if self.jetson_clocks is not None:
+                        logger.info('Remove jetson_clocks config')
+                        self.jetson_clocks.clear()
+                reply['config'] = True
+            if 'jc' in control:
+                if self.jetson_clocks is None:
+                    raise JtopException("jetson_clocks not available")
+                jc = control['jc']
+                reply['jc'] = {}
+                # Enable / disable jetson_clocks
+                if 'enable' in jc:
+                    reply['jc']['enable'] = self.jetson_clocks.set(jc['enable'])
+                # Update jetson_clocks configuration
+                if 'boot' in jc:
+                    self.jetson_clocks.boot = jc['boot']
+                reply['jc']['boot'] = self.jetson_clocks.boot
+            # Speed Fan and configuration
+            if 'fan' in control:
+                fan = control['fan']
+                for key, value in fan.items():
+                    logger.info('Fan config {} {}'.format(key, value))
+                    if key == 'mode':
+                        self.fan.mode = value
+                    elif key == 'speed':
+                        self.fan.speed = value
+                reply['fan'] = {'mode': self.fan.mode, 'speed': self.fan.speed if self.fan.is_speed else None}
+            # Decode nvp model
+            if 'nvp' in control:
+                if self.nvpmodel is None:
+                    raise JtopException("nvpmodel not available")
+                mode = control['nvp']
+                logger.info("Set new NV Power Mode {mode}".format(mode=mode))
+                # Set new NV Power Mode
+                reply['nvp'] = self.nvpmodel.set(mode)
+                self.probes.invalidate('nvp_modes')
+                self.probes.invalidate('nvp_mode')
+            if 'memory' in control:
+                logger.info("Clear cache")
+                # Clear cache
+                self.swap.clear_cache()
+                reply['memory'] = True
+            # Initialize tegrastats speed, a new client sends init on the stream or interval on the queue
+            if 'init' in control or 'interval' in control:
+                config = control['init'] if 'init' in control else control
+                self._start(config['interval'], config.get('transport', TRANSPORT_MANAGER))
+                if 'init' in control:
+                    reply['init'] = self._init()
+                else:
+                    reply['interval'] = self.interval.value
+        return reply
+
+    def _start(self, interval, transport):
+        """ Start the sampling at the interval of the first client """
+        # Old clients and clients without stream and shared memory read from the manager
+        if transport == TRANSPORT_MANAGER and not self._manager_data:
+            logger.info("Client without stream and shared memory, send data with the manager")
+            self._manager_data = True
+        # Stop the sampling of the recorder and restart at the client interval
+        if self._recording:
+            self.tegra.close()
+            self._recording = False
+        # Run stats
+        if self.tegra.open(interval=interval):
+            # Start jetson_clocks
+            if self.jetson_clocks is not None:
+                self.jetson_clocks.start(interval)
+            # Set interval value
+            self.interval.value = interval
+            # Status start tegrastats
+            logger.info("tegrastats started {interval}ms".format(interval=int(interval * 1000)))
+        # Update timeout interval
+        self._timeout = TIMEOUT_GAIN if interval <= TIMEOUT_GAIN else interval * TIMEOUT_GAIN
+
+    def _init(self):
+        """ Configuration of the service sent to a new client """
+        return {
+            'board': self.board,
+            'interval': self.interval.value,
+            'swap': self.swap.path,
+            'fan': self.fan.get_configs(),
+            'jc': self.jetson_clocks is not None,
+            'nvpmodel': self.nvpmodel is not None,
+            'shm': self.ring.name if self.ring is not None else None,
+            'stream': self.publisher.path if self.publisher is not None else None}
 
     def tegra_stats(self, tegrastats):
         # Make configuration dict
         # logger.debug("tegrastats read")
         data = {}
-        jetson_clocks_show = copy.deepcopy(self.jetson_clocks.show()) if self.jetson_clocks is not None else {}
+        # Status of jetson_clocks, shared by reference until the next jetson_clocks --show
+        jetson_clocks_show = self.jetson_clocks.snapshot().view() if self.jetson_clocks is not None else {}
+        vals = tegrastats.vals
+        # The records of tegrastats are sent as they are, the clients merge them with the other
+        # values in the same dictionaries of the old clients, look decode_sample
         # -- Engines --
-        nvjpg_data = nvjpg()
+        nvjpg_data = self.probes.get('nvjpg')
         data['engines'] = {
-            'APE': tegrastats['APE'],
-            'NVENC': tegrastats['NVENC'] if 'NVENC' in tegrastats else {},
-            'NVDEC': tegrastats['NVDEC'] if 'NVDEC' in tegrastats else {},
-            'MSENC': tegrastats['MSENC'] if 'MSENC' in tegrastats else {}}
+            'APE': vals.get('APE', {}),
+            'NVENC': vals.get('NVENC', {}),
+            'NVDEC': vals.get('NVDEC', {}),
+            'MSENC': vals.get('MSENC', {})}
         if nvjpg_data:
             data['engines']['NVJPG'] = nvjpg_data['rate'] if nvjpg_data['status'] else {}
         # -- Power --
         # Refactor names
-        power = {k.replace("VDD_", "").replace("POM_", "").replace("_", " "): v for k, v in tegrastats['WATT'].items()}
+        power = {k.replace("VDD_", "").replace("POM_", "").replace("_", " "): v for k, v in tegrastats.watt.items()}
         total, power = self._total_power(power)
         data['power'] = {'all': total, 'power': power}
         # -- Temperature --
         # Remove PMIC temperature
-        if 'PMIC' in tegrastats['TEMP']:
-            del tegrastats['TEMP']['PMIC']
-        data['temperature'] = tegrastats['TEMP']
+        data['temperature'] = {k: v for k, v in tegrastats.temp.items() if k != 'PMIC'}
         # -- CPU --
-        data['cpu'] = tegrastats['CPU']
-        # Update data from jetson_clocks show
+        data['cpu'] = dict(('CPU' + str(idx + 1), cpu) for idx, cpu in enumerate(tegrastats.cpu))
+        data['cpu_models'] = self.probes.get('cpu_models')
+        # Values of jetson_clocks --show for CPU, GPU and EMC
+        show = {}
         if 'CPU' in jetson_clocks_show:
-            for name, v in tegrastats['CPU'].items():
+            show['CPU'] = {}
+            for name, cpu in data['cpu'].items():
                 # Extract jc_cpu info
-                jc_cpu = jetson_clocks_show['CPU'].get(name, {})
-                # Remove current frequency
-                del jc_cpu['current_freq']
-                # Fix online status
-                if 'Online' in jc_cpu:
-                    if jc_cpu['Online']:
-                        # Remove online info
-                        del jc_cpu['Online']
-                        # Update CPU information
-                        v.update(jc_cpu)
-                elif v:
-                    # Update CPU information
-                    v.update(jc_cpu)
-                data['cpu'][name] = v
-        for name, value in cpu_models().items():
-            data['cpu'][name]['model'] = value
+                online, jc_cpu = jetson_clocks_show['CPU'].get(name, (None, {}))
+                # Add information only for online CPUs
+                if online or (online is None and cpu is not None):
+                    show['CPU'][name] = jc_cpu
+        if 'GPU' in jetson_clocks_show:
+            show['GPU'] = jetson_clocks_show['GPU']
+        if 'EMC' in jetson_clocks_show and 'EMC' in vals:
+            show['EMC'] = jetson_clocks_show['EMC']
+        data['show'] = show
         # -- MTS --
-        if 'MTS' in tegrastats:
-            data['mts'] = tegrastats['MTS']
+        if tegrastats.mts is not None:
+            data['mts'] = tegrastats.mts
         # -- GPU --
-        data['gpu'] = tegrastats['GR3D']
-        if 'GPU' in jetson_clocks_show:
-            data['gpu'].update(jetson_clocks_show['GPU'])
-            # Remove current_freq data
-            del data['gpu']['current_freq']
+        data['gpu'] = vals.get('GR3D', {})
         # -- RAM --
-        meminfo = self.memory.meminfo()
-        data['ram'] = tegrastats['RAM']
-        if meminfo:
-            data['ram'].update(meminfo)
+        data['ram'] = tegrastats.ram if tegrastats.ram is not None else {}
+        data['meminfo'] = self.memory.meminfo()
         # -- IRAM --
-        if 'IRAM' in tegrastats:
-            data['iram'] = tegrastats['IRAM']
+        if tegrastats.iram is not None:
+            data['iram'] = tegrastats.iram
         # -- EMC --
-        if 'EMC' in tegrastats:
-            data['emc'] = tegrastats['EMC']
-            if self.jetson_clocks is not None:
-                data['emc'].update(jetson_clocks_show['EMC'])
-                # Remove current_freq data
-                del data['emc']['current_freq']
+        if 'EMC' in vals:
+            data['emc'] = vals['EMC']
         # -- SWAP --
+        if self.swap.is_running():
+            # Read the new swap when jetson_swap is done
+            self.probes.invalidate('swap')
         data['swap'] = {
-            'list': self.swap.all(),
-            'all': tegrastats['SWAP'] if 'SWAP' in tegrastats else {}}
+            'list': self.probes.get('swap'),
+            'all': tegrastats.swap if tegrastats.swap is not None else {}}
         # -- OTHER --
-        data['other'] = dict((k, tegrastats[k]) for k in tegrastats if k not in LIST_PRINT)
+        data['other'] = dict((k, v) for k, v in vals.items() if k not in LIST_PRINT)
         # -- FAN --
         # Update status fan speed
         data['fan'] = self.fan.update()
@@ -495,16 +712,37 @@ class JtopServer(Process):
         # -- NVP MODEL --
         if self.nvpmodel is not None:
             # Read nvp_mode
-            nvp_mode = jetson_clocks_show['NVP'] if 'NVP' in jetson_clocks_show else self.nvpmodel.get()
+            if self.nvpmodel.is_running():
+                # Read the new mode when nvpmodel is done
+                self.probes.invalidate('nvp_mode')
+            nvp_mode = jetson_clocks_show['NVP'] if 'NVP' in jetson_clocks_show else self.probes.get('nvp_mode')
             if not self.nvpmodel.is_running():
                 self.nvp_mode = nvp_mode
             data['nvp'] = {
-                'modes': self.nvpmodel.modes(),
+                'modes': self.probes.get('nvp_modes'),
                 'thread': self.nvpmodel.is_running(),
                 'mode': self.nvp_mode}
         # -- Cluster --
         if 'cluster' in jetson_clocks_show:
             data['cluster'] = jetson_clocks_show['cluster']
+        # -- Tegrastats --
+        data['tegrastats'] = self.tegra.status()
+        # Time of the sample, the clients integrate on it also when the samples are replayed
+        now = time.time()
+        data['time'] = now
+        encoded = self.encoder.encode(data)
+        # Store the sample in the history and in the recorder
+        self.history.append(now, encoded)
+        if self.recorder is not None:
+            self.recorder.append(now, data)
+        # Push the sample to all subscribers
+        if self.publisher is not None:
+            self.publisher.publish_encoded(encoded)
+        # Write the sample for the clients with shared memory
+        if self.ring is not None:
+            self.ring.write(data)
+        if not self._manager_data:
+            return
         # Pack and send all data
         # https://stackoverflow.com/questions/6416131/add-a-new-item-to-a-dictionary-in-python
         self.sync_data.update(data)
@@ -16,9 +16,17 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import re
+import random
 import warnings
+from collections import OrderedDict
 # Max count to wait
 MAX_COUNT = 50
+# tegrastats emulator
+TEGRASTATS_EMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tests', 'tegrastats')
+TEGRASTATS_PYTHON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tests', 'tegrastats.py')
+TEGRASTATS_MODEL_RE = re.compile(r'\$JETSON_MODEL" = "(\w+)"')
+TEGRASTATS_RANDOM_RE = re.compile(r'\$\(\(\$RANDOM%100\+0\)\)|\$RAND_GPU')
 # TEST NVP MODELS:
 # - [0] MAXTEST (DEFAULT)
 # - [1] TEST
@@ -67,6 +75,33 @@ def set_jetson_clocks(jetson, status):
     assert bool(jetson.jetson_clocks) == status
 
 
+def tegrastats_models(seed=0):
+    """ Lines of the tegrastats emulator for each model, without and with sudo.
+        Random values are replaced with a fixed seed.
+    """
+    rand = random.Random(seed)
+    models = OrderedDict()
+    model = None
+    with open(TEGRASTATS_EMULATOR, 'r') as f:
+        for line in f:
+            line = line.strip()
+            match = TEGRASTATS_MODEL_RE.search(line)
+            if match:
+                model = match.group(1)
+            elif line == 'else':
+                model = 'Extra'
+            elif line.startswith('echo "RAM '):
+                line = line[len('echo "'):-1]
+                line = TEGRASTATS_RANDOM_RE.sub(lambda match: str(rand.randint(0, 99)), line)
+                models.setdefault(model, []).append(line)
+    return models
+
+
+def tegrastats_lines(seed=0):
+    """ All lines of the tegrastats emulator, for all models with and without sudo. """
+    return [line for lines in tegrastats_models(seed).values() for line in lines]
+
+
 def remove_tests():
     if os.path.isfile('/tmp/jetson_model'):
         os.remove('/tmp/jetson_model')
@@ -0,0 +1,138 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import time
+from jtop.core.collector import SysfsCollector
+from jtop.core.tegra_parse import decode
+from .common import tegrastats_lines
+# Max time to wait
+MAX_TIME = 10.0
+# Fake sysfs and procfs of a board with 4 cores, CPU4 is off
+FILES = {
+    'proc/stat': "cpu  400 0 400 1200 0 0 0 0 0 0\ncpu0 100 0 100 300 0 0 0 0 0 0\ncpu1 100 0 100 300 0 0 0 0 0 0\n"
+                 "cpu2 100 0 100 300 0 0 0 0 0 0\n",
+    'proc/meminfo': "MemTotal:        4059152 kB\nMemFree:         2048000 kB\nBuffers:           10240 kB\nCached:           512000 kB\n"
+                    "SwapTotal:       2029564 kB\nSwapFree:        1005564 kB\nSwapCached:        10240 kB\n",
+    'proc/buddyinfo': "Node 0, zone      DMA      1      2      3      4      5      6      7      8      9     10      3\n",
+    'sys/devices/system/cpu/present': "0-3\n",
+    'sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq': "1428000\n",
+    'sys/devices/system/cpu/cpu1/cpufreq/scaling_cur_freq': "1428000\n",
+    'sys/devices/system/cpu/cpu2/cpufreq/scaling_cur_freq': "102000\n",
+    'sys/devices/gpu.0/load': "500\n",
+    'sys/devices/gpu.0/devfreq/57000000.gpu/cur_freq': "921600000\n",
+    'sys/kernel/debug/clk/emc/clk_rate': "1600000000\n",
+    'sys/kernel/actmon_avg_activity/mc_all': "400000\n",
+    'sys/kernel/debug/clk/ape/clk_rate': "150000000\n",
+    'sys/kernel/debug/clk/ape/clk_enable_count': "1\n",
+    'sys/devices/virtual/thermal/thermal_zone0/type': "CPU-therm\n",
+    'sys/devices/virtual/thermal/thermal_zone0/temp': "40500\n",
+    'sys/devices/virtual/thermal/thermal_zone1/type': "GPU-therm\n",
+    'sys/devices/virtual/thermal/thermal_zone1/temp': "38000\n",
+    'sys/class/hwmon/hwmon0/name': "ina3221\n",
+    'sys/class/hwmon/hwmon0/in1_label': "VDD_IN\n",
+    'sys/class/hwmon/hwmon0/curr1_input': "1000\n",
+    'sys/class/hwmon/hwmon0/in1_input': "5000\n",
+    'sys/bus/i2c/drivers/ina3221x/6-0040/iio:device0/rail_name_0': "VDD_GPU\n",
+    'sys/bus/i2c/drivers/ina3221x/6-0040/iio:device0/in_power0_input': "200\n",
+}
+
+
+def fake_sysfs(tmpdir):
+    root = str(tmpdir)
+    for path, text in FILES.items():
+        write(root, path, text)
+    return root
+
+
+def write(root, path, text):
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def shape(stats):
+    # Keys of the dictionaries and type of all values
+    if isinstance(stats, dict):
+        return dict((key, shape(value)) for key, value in stats.items())
+    return type(stats) if not isinstance(stats, int) else float
+
+
+def test_read(tmpdir):
+    root = fake_sysfs(tmpdir)
+    collector = SysfsCollector(None, root=root)
+    collector.setup()
+    collector.read()
+    # CPU0 busy, CPU1 idle
+    write(root, 'proc/stat', "cpu  400 0 400 1200 0 0 0 0 0 0\ncpu0 200 0 200 300 0 0 0 0 0 0\ncpu1 100 0 100 400 0 0 0 0 0 0\n"
+                             "cpu2 150 0 100 350 0 0 0 0 0 0\n")
+    write(root, 'sys/class/hwmon/hwmon0/curr1_input', "2000\n")
+    sample = collector.read()
+    collector.close_files()
+    assert [cpu.val if cpu is not None else None for cpu in sample.cpu] == [100, 0, 50, None]
+    assert sample.cpu[0].frq == 1428000
+    assert sample.vals['GR3D'].to_dict() == {'val': 50, 'frq': 921600}
+    assert sample.vals['EMC'].to_dict() == {'val': 25, 'frq': 1600000}
+    assert sample.vals['APE'].to_dict() == {'val': 150}
+    assert sample.temp == {'CPU': 40.5, 'GPU': 38.0}
+    # Average from the first sample
+    assert sample.watt['VDD_IN'].to_dict() == {'cur': 10000, 'avg': 7500}
+    assert sample.watt['VDD_GPU'].to_dict() == {'cur': 200, 'avg': 200}
+    assert sample.ram.to_dict() == {'use': 1454, 'tot': 3964, 'unit': 'M', 'lfb': {'size': 4, 'unit': 'M', 'nblock': 3}}
+    assert sample.swap.to_dict() == {'use': 1000, 'tot': 1981, 'unit': 'M', 'cached': {'size': 10, 'unit': 'M'}}
+    assert sample.iram is None and sample.mts is None
+
+
+def test_schema(tmpdir):
+    collector = SysfsCollector(None, root=fake_sysfs(tmpdir))
+    collector.setup()
+    stats = collector.read().to_dict()
+    collector.close_files()
+    # Same keys and types of a tegrastats line
+    line = [line for line in tegrastats_lines() if 'SWAP' in line and re.search(r'EMC_FREQ \d+%@', line)][0]
+    reference = shape(decode(line))
+    for key in ['RAM', 'SWAP', 'EMC', 'GR3D']:
+        assert shape(stats[key]) == reference[key]
+    assert shape(stats['CPU']['CPU1']) == reference['CPU']['CPU1']
+    assert stats['CPU']['CPU4'] == {}
+
+
+def test_missing(tmpdir):
+    # Without files all values are empty
+    collector = SysfsCollector(None, root=str(tmpdir))
+    collector.setup()
+    sample = collector.read()
+    assert sample.cpu == () and sample.vals == {} and sample.temp == {} and sample.watt == {}
+    assert sample.ram is None
+
+
+def test_open_close(tmpdir):
+    samples = []
+    collector = SysfsCollector(samples.append, root=fake_sysfs(tmpdir))
+    assert collector.open(interval=0.01)
+    assert not collector.open(interval=0.01)
+    start = time.time()
+    while len(samples) < 3 and time.time() - start < MAX_TIME:
+        time.sleep(0.01)
+    assert collector.close()
+    assert len(samples) >= 3
+    assert collector.status()['collector'] == 'sysfs'
+    assert collector.status()['samples'] >= 3
+# EOF
@@ -0,0 +1,98 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import pytest
+from jtop.core import Command, CommandPool
+from jtop.core import command
+
+
+@pytest.fixture
+def pool():
+    pool = CommandPool(workers=2)
+    yield pool
+    pool.close()
+
+
+def test_command():
+    assert Command(['echo', ' first \nsecond'])(timeout=5.0) == ['first', 'second']
+    with pytest.raises(Command.CommandException):
+        Command(['false'])(timeout=5.0)
+    with pytest.raises(Command.TimeoutException):
+        Command(['sleep', '10'])(timeout=0.1)
+    with pytest.raises(OSError):
+        Command(['jtop_command_does_not_exist'])(timeout=1.0)
+
+
+@pytest.mark.parametrize('communicate_timeout', [True, False])
+def test_timeout(monkeypatch, communicate_timeout):
+    # Python 2 reads the output in another thread
+    monkeypatch.setattr(command, 'COMMUNICATE_TIMEOUT', communicate_timeout)
+    start = time.time()
+    # The child keeps the pipe open, stopped with its process group
+    with pytest.raises(Command.TimeoutException):
+        Command(['sh', '-c', 'sleep 30 & sleep 30'])(timeout=0.2)
+    # A shell that ignores SIGTERM is killed
+    with pytest.raises(Command.TimeoutException):
+        Command(['sh', '-c', 'trap "" TERM; sleep 30'])(timeout=0.2)
+    assert time.time() - start < 5.0
+    assert Command(['echo', 'done'])(timeout=5.0) == ['done']
+
+
+def test_workers(pool):
+    start = time.time()
+    jobs = [pool.submit(['sleep', '0.3'], timeout=5.0) for _ in range(4)]
+    for job in jobs:
+        assert job.wait() == []
+    # Only two commands at the same time
+    assert time.time() - start >= 0.6
+    status = pool.status()['sleep']
+    assert status['calls'] == 4 and status['errors'] == 0 and status['timeouts'] == 0
+    assert status['max'] >= 0.6 > status['mean'] >= 0.3
+
+
+def test_queue_timeout(pool):
+    # Commands without timeout on all threads
+    busy = [pool.submit(['sleep', '1']) for _ in range(pool.workers)]
+    start = time.time()
+    # The timeout counts the time in the queue, the command is cancelled
+    job = pool.submit(['echo', 'late'], timeout=0.2)
+    with pytest.raises(Command.TimeoutException):
+        job.wait()
+    assert time.time() - start < 0.8
+    # A wait with a limit on a job without timeout
+    with pytest.raises(Command.TimeoutException):
+        pool.submit(['echo', 'later']).wait(timeout=0.1)
+    for item in busy:
+        assert item.wait() == []
+    assert pool.run(['echo', 'done'], timeout=5.0) == ['done']
+    # The cancelled commands are not run
+    status = pool.status()['echo']
+    assert status['calls'] == 3 and status['timeouts'] == 2
+
+
+def test_status(pool):
+    pool.run(['true'])
+    with pytest.raises(Command.CommandException):
+        pool.run(['false'])
+    with pytest.raises(Command.TimeoutException):
+        pool.run(['sleep', '10'], timeout=0.1)
+    status = pool.status()
+    assert status['true']['calls'] == 1
+    assert status['false']['errors'] == 1
+    assert status['sleep']['timeouts'] == 1
+# EOF
@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+from threading import Thread
+from jtop.core import Controller, Publisher, Subscriber, JtopException
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# Max time to wait
+MAX_TIME = 10.0
+
+
+def handler(request):
+    control = request['control']
+    if 'init' in control:
+        return {'init': {'interval': control['init']['interval']}}
+    if 'nvp' in control:
+        raise JtopException("nvpmodel not available")
+    return {'fan': control['fan']}
+
+
+def test_stream(tmpdir):
+    publisher = Publisher(os.path.join(str(tmpdir), 'stream.sock'), handler=handler)
+    publisher.open()
+    controllers = [Controller(queue.Queue(), Subscriber(publisher.path)) for _ in range(16)]
+    replies = {}
+
+    def init(idx):
+        replies[idx] = controllers[idx].init(float(idx), 'stream', MAX_TIME)
+    # All clients start together, every client receives only its reply
+    threads = [Thread(target=init, args=(idx, )) for idx in range(len(controllers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert replies == dict((idx, {'interval': float(idx)}) for idx in range(len(controllers)))
+    controller = controllers[0]
+    replies = []
+    controller.put({'fan': {'mode': 'quiet'}}, replies.append)
+    # Failed control without exception, the error is logged
+    controller.put({'nvp': 'MAXN'}, replies.append)
+    controller.put({'fan': {'mode': 'cool'}}, replies.append)
+    # The replies are read with the stream
+    deadline = time.time() + MAX_TIME
+    while len(replies) < 2 and time.time() < deadline:
+        assert controller._stream.read(timeout=0.1) is None
+    assert replies == [{'fan': {'mode': 'quiet'}}, {'fan': {'mode': 'cool'}}]
+    # Keep alive on the queue
+    controller.alive()
+    controller.alive()
+    assert controller._queue.qsize() == 1
+    for controller in controllers:
+        controller._stream.close()
+    publisher.close()
+
+
+def test_queue():
+    shared = queue.Queue()
+    replies = queue.Queue()
+    controller = Controller(shared, replies=replies, timeout=MAX_TIME)
+    # Message of another client in the queue
+    controller.put({'fan': {'mode': 'quiet'}})
+    # Reply of a client gone and reply of a client still waiting
+    replies.put({'init': {'interval': 1.0}, 'client': 'gone', 'expire': time.time() - 1.0})
+    replies.put({'init': {'interval': 2.0}, 'client': 'other', 'expire': time.time() + MAX_TIME})
+
+    def service():
+        while True:
+            control = shared.get()
+            if 'interval' in control:
+                replies.put({'init': {'interval': control['interval']}, 'client': control['client'], 'expire': control['expire']})
+                return
+            received.append(control)
+    received = []
+    thread = Thread(target=service)
+    thread.start()
+    assert controller.init(0.5, 'manager', 0.1) == {'interval': 0.5}
+    thread.join()
+    # The service read the message of the other client, nothing is sent again
+    assert received == [{'fan': {'mode': 'quiet'}}]
+    assert shared.empty()
+    # Only the reply of the client still waiting is in the queue
+    assert replies.get(timeout=MAX_TIME)['client'] == 'other'
+    assert replies.empty()
+# EOF
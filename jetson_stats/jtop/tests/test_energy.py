@@ -0,0 +1,90 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from jtop.core.energy import EnergyMeter, TOTAL
+
+
+def power(total, **rails):
+    return {'cur': total, 'avg': total}, {name: {'cur': value, 'avg': value} for name, value in rails.items()}
+
+
+def test_energy_trapezoidal():
+    meter = EnergyMeter()
+    # Linear ramp from 1W to 3W in 2 seconds on one rail
+    meter.update(*power(1000, GPU=1000), timestamp=10.0)
+    meter.update(*power(2000, GPU=2000), timestamp=11.0)
+    meter.update(*power(3000, GPU=3000), timestamp=12.0)
+    assert meter.energy[TOTAL] == pytest.approx(4.0)
+    assert meter.energy['GPU'] == pytest.approx(4.0)
+    report = meter.report()['run']
+    assert report['duration'] == pytest.approx(2.0)
+    assert report['power'][TOTAL] == pytest.approx(2000.0)
+
+
+def test_energy_phases_work():
+    meter = EnergyMeter()
+    meter.phase('warmup')
+    meter.update(*power(1000, CPU=500), timestamp=0.0)
+    meter.update(*power(1000, CPU=500), timestamp=1.0)
+    meter.phase('inference')
+    meter.update(*power(2000, CPU=1000), timestamp=3.0)
+    meter.add_work(10)
+    report = meter.report()
+    warmup, inference = report['phases']
+    assert warmup['energy'][TOTAL] == pytest.approx(1.0)
+    assert 'energy_per_work' not in warmup
+    # Interval between phases belongs to the new phase
+    assert inference['energy'][TOTAL] == pytest.approx(3.0)
+    assert inference['energy_per_work'][TOTAL] == pytest.approx(0.3)
+    assert report['run']['energy'][TOTAL] == pytest.approx(4.0)
+    assert report['run']['work'] == 10
+
+
+def test_energy_split_nvpmodel():
+    class FakeJetson(object):
+        nvpmodel = 'MAXN'
+        timestamp = None
+
+        def __init__(self):
+            self.power = power(1000)
+
+    jetson = FakeJetson()
+    meter = EnergyMeter()
+    meter(jetson)
+    meter(jetson)
+    jetson.nvpmodel = '5W'
+    meter(jetson)
+    phases = meter.report()['phases']
+    assert [phase['nvpmodel'] for phase in phases] == ['MAXN', '5W']
+
+
+def test_energy_sample_time():
+    class FakeJetson(object):
+        nvpmodel = None
+
+        def __init__(self, timestamp, total):
+            self.timestamp = timestamp
+            self.power = power(total)
+
+    meter = EnergyMeter()
+    # Samples replayed at once, integrated on the time of each sample
+    for timestamp, total in [(100.0, 1000), (101.0, 1000), (103.0, 3000)]:
+        meter(FakeJetson(timestamp, total))
+    assert meter.energy[TOTAL] == pytest.approx(5.0)
+    assert meter.report()['run']['duration'] == pytest.approx(3.0)
+# EOF
@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from jtop.core import History
+from jtop.core.history import rollup, skeleton, fill
+from jtop.core.sample import ValFreq
+from jtop.core.stream import pack, unpack, SampleEncoder
+
+
+def sample(idx):
+    return {'ram': {'use': 1000 + idx, 'tot': 4000}, 'GPU': float(idx), 'fan': {'auto': idx % 2 == 0}, 'mode': str(idx)}
+
+
+def test_rollup():
+    assert rollup([sample(0), sample(2)]) == {'ram': {'use': 1001, 'tot': 4000}, 'GPU': 1.0, 'fan': {'auto': True}, 'mode': '2'}
+    # Keys missing in some samples
+    assert rollup([{'a': 1}, {'a': 3, 'b': 5}]) == {'a': 2, 'b': 5}
+
+
+def test_skeleton():
+    data = dict(sample(3), cpu=[ValFreq(10, 1000), ValFreq(20, None)])
+    numbers = []
+    layout = skeleton(data, numbers)
+    assert layout['ram'] == {'use': int, 'tot': int}
+    assert layout['cpu'][1] == ValFreq(int, None)
+    assert sorted(numbers) == sorted([1003, 4000, 3.0, 10, 1000, 20])
+    assert fill(layout, iter(numbers)) == data
+
+
+def append(history, encoder, idx, data=None):
+    history.append(float(idx), encoder.encode(sample(idx) if data is None else data))
+
+
+def test_range():
+    history = History(duration=10, interval=5, rollups=100)
+    # Static data and keyframes every 4 samples
+    encoder = SampleEncoder(static=[('mode', )], keyframe=4)
+    for idx in range(60):
+        append(history, encoder, idx)
+    # Full rate for the last 10 seconds
+    samples = history.range(49)
+    assert samples == [(float(idx), sample(idx)) for idx in range(49, 60)]
+    # Rollups before the first sample at full rate
+    samples = history.range(0)
+    times = [stamp for stamp, _ in samples]
+    assert times == [0.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 35.0, 40.0, 45.0] + [float(idx) for idx in range(49, 60)]
+    assert samples[1][1] == rollup([sample(idx) for idx in range(5, 10)])
+    expected = [(float(start), rollup([sample(idx) for idx in range(start, start + 5)])) for start in (20, 25)]
+    assert history.range(20, 29) == expected
+    assert history.range(100) == []
+
+
+def test_changed_in_place():
+    history = History()
+    encoder = SampleEncoder()
+    data = sample(0)
+    append(history, encoder, 0, data)
+    data['ram']['use'] = 0
+    assert history.range(0) == [(0.0, sample(0))]
+
+
+def test_keyframes():
+    history = History(duration=10, interval=100, rollups=100)
+    encoder = SampleEncoder(keyframe=7)
+    # Deltas without a keyframe are not stored
+    encoder.encode(sample(0))
+    for idx in range(1, 100):
+        append(history, encoder, idx)
+    assert history.range(0) == [(float(idx), sample(idx)) for idx in range(89, 100)]
+    assert history.range(95, 96) == [(95.0, sample(95)), (96.0, sample(96))]
+
+
+def test_reply():
+    history = History()
+    encoder = SampleEncoder()
+    for idx in range(5):
+        append(history, encoder, idx)
+    assert len(history) == 5
+    reply = unpack(pack(history.reply(2, 3)))
+    assert reply == [[2.0, sample(2)], [3.0, sample(3)]]
+# EOF
@@ -0,0 +1,77 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import os
+import time
+from jtop.core.ingest import ingest, load_columns, flatten, is_columns
+from jtop.core.tegra_parse import parse
+from .common import tegrastats_models
+
+
+def write_log(tmpdir, lines):
+    path = os.path.join(str(tmpdir), 'tegrastats.log')
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def check_columns(columns, lines):
+    for row, line in enumerate(lines):
+        values = dict(flatten(parse(line)))
+        for name, column in columns.items():
+            if name == 'time':
+                continue
+            if name in values and not math.isnan(values[name]):
+                assert column[row] == values[name]
+            else:
+                assert math.isnan(column[row])
+
+
+def test_ingest(tmpdir):
+    models = tegrastats_models()
+    # Same board for many lines, then a new board with other columns
+    lines = [models['TX2'][1]] * 500 + [models['Xavier'][1]] * 300
+    header = ingest(write_log(tmpdir, lines), os.path.join(str(tmpdir), 'columns'), workers=2, chunk_size=4096)
+    assert header['rows'] == len(lines)
+    assert header['skipped'] == 0
+    columns = load_columns(os.path.join(str(tmpdir), 'columns'))
+    assert all(len(column) == len(lines) for column in columns.values())
+    check_columns(columns, lines)
+
+
+def test_timestamp(tmpdir):
+    line = tegrastats_models()['Nano'][0]
+    lines = ["10-19-2026 12:00:0{sec} {line}".format(sec=sec, line=line) for sec in range(5)]
+    ingest(write_log(tmpdir, lines + ['', 'not a tegrastats line']), os.path.join(str(tmpdir), 'columns'), workers=1)
+    columns = load_columns(os.path.join(str(tmpdir), 'columns'))
+    start = time.mktime(time.strptime('10-19-2026 12:00:00', '%m-%d-%Y %H:%M:%S'))
+    assert list(columns['time'])[:5] == [start + sec for sec in range(5)]
+    check_columns(columns, [line] * 5)
+
+
+def test_columns_buffers(tmpdir):
+    lines = [tegrastats_models()['TX2'][1]] * 3
+    output = os.path.join(str(tmpdir), 'columns')
+    ingest(write_log(tmpdir, lines), output, workers=1)
+    assert is_columns(output)
+    assert not is_columns(str(tmpdir))
+    # The tools wrap the columns in numpy arrays without copy
+    for name, column in load_columns(output).items():
+        view = memoryview(column)
+        assert view.format == 'd' and view.nbytes == 8 * len(lines)
+# EOF
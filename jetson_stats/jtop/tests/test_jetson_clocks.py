@@ -15,12 +15,91 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import time
 from jtop import jtop
 from ..service import JtopServer
+from ..core.jetson_clocks import decode_show_message, ShowSnapshot, ShowReader
 # test functions
 from .common import remove_tests
 MAX_COUNT = 10
+# jetson_clocks --show on a TX2
+SHOW_TX2 = ['CPU Cluster Switching: Disabled',
+            'cpu0: Online=1 Governor=schedutil MinFreq=345600 MaxFreq=2035200 CurrentFreq=2035200 IdleStates: C1=1 c7=1',
+            'cpu1: Online=0 Governor=schedutil MinFreq=345600 MaxFreq=2035200 CurrentFreq=1113600 IdleStates: C1=1 c6=1 c7=1',
+            'GPU MinFreq=114750000 MaxFreq=1134750000 CurrentFreq=114750000',
+            'EMC MinFreq=40800000 MaxFreq=1600000000 CurrentFreq=1600000000 FreqOverride=0',
+            'NV Power Mode: MAXP_CORE_ARM']
+
+
+def test_snapshot():
+    show = decode_show_message(SHOW_TX2)
+    snapshot = ShowSnapshot(1, show)
+    view = snapshot.view()
+    assert view['CPU']['CPU1'] == (True, {'governor': 'schedutil', 'min_freq': 345600, 'max_freq': 2035200, 'IdleStates': {'C1': 1, 'c7': 1}})
+    assert view['CPU']['CPU2'][0] is False
+    assert view['GPU'] == {'min_freq': 114750000, 'max_freq': 1134750000}
+    assert view['EMC'] == {'min_freq': 40800000, 'max_freq': 1600000000, 'FreqOverride': 0}
+    assert view['NVP'] == 'MAXP_CORE_ARM'
+    assert view['cluster'] == 'Disabled'
+    # The view is computed once and the show is not changed
+    assert snapshot.view() is view
+    assert show == decode_show_message(SHOW_TX2)
+
+
+# Same status of SHOW_TX2 in sysfs
+SYSFS_TX2 = {
+    'sys/devices/system/cpu/present': "0-1\n",
+    'sys/devices/system/cpu/cpu1/online': "0\n",
+    'sys/devices/gpu.0/devfreq/17000000.gp10b/min_freq': "114750000\n",
+    'sys/devices/gpu.0/devfreq/17000000.gp10b/max_freq': "1134750000\n",
+    'sys/devices/gpu.0/devfreq/17000000.gp10b/cur_freq': "114750000\n",
+    'sys/kernel/debug/bpmp/debug/clk/emc/min_rate': "40800000\n",
+    'sys/kernel/debug/bpmp/debug/clk/emc/max_rate': "1600000000\n",
+    'sys/kernel/debug/bpmp/debug/clk/emc/rate': "1600000000\n",
+    'sys/kernel/debug/bpmp/debug/clk/emc/mrq_rate_locked': "0\n",
+}
+for cpu, freq, states in [(0, 2035200, ['C1', 'c7']), (1, 1113600, ['C1', 'c6', 'c7'])]:
+    folder = 'sys/devices/system/cpu/cpu{idx}/'.format(idx=cpu)
+    SYSFS_TX2[folder + 'cpufreq/scaling_governor'] = "schedutil\n"
+    SYSFS_TX2[folder + 'cpufreq/scaling_min_freq'] = "345600\n"
+    SYSFS_TX2[folder + 'cpufreq/scaling_max_freq'] = "2035200\n"
+    SYSFS_TX2[folder + 'cpufreq/scaling_cur_freq'] = "{freq}\n".format(freq=freq)
+    for idx, state in enumerate(states):
+        SYSFS_TX2[folder + 'cpuidle/state{idx}/name'.format(idx=idx)] = state + "\n"
+        SYSFS_TX2[folder + 'cpuidle/state{idx}/disable'.format(idx=idx)] = "0\n"
+
+
+def write_files(root, files):
+    for path, text in files.items():
+        path = os.path.join(root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def test_show_reader(tmpdir):
+    root = str(tmpdir)
+    write_files(root, SYSFS_TX2)
+    reader = ShowReader(root=root)
+    assert reader.available()
+    show = decode_show_message(SHOW_TX2)
+    del show['NVP']
+    del show['cluster']
+    assert reader.read() == show
+    # New frequency read from the same open file
+    write_files(root, {'sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq': "345600\n"})
+    assert reader.read()['CPU']['CPU1']['current_freq'] == 345600
+    reader.close()
+    # CPU2 without cpufreq
+    os.remove(os.path.join(root, 'sys/devices/system/cpu/cpu1/cpufreq/scaling_cur_freq'))
+    reader = ShowReader(root=root)
+    assert list(reader.read()['CPU']) == ['CPU1']
+    reader.close()
+    # Not a Jetson, without GPU
+    os.remove(os.path.join(root, 'sys/devices/gpu.0/devfreq/17000000.gp10b/cur_freq'))
+    assert not ShowReader(root=root).available()
 
 
 def test_set_true_false(jtop_server):
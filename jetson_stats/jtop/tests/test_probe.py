@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import pytest
+from jtop.core import ProbeCache
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.count
+
+
+def test_invalidate():
+    probes = ProbeCache()
+    counter = Counter()
+    probes.register('counter', counter)
+    assert [probes.get('counter') for _ in range(5)] == [1] * 5
+    probes.invalidate('counter')
+    assert probes.get('counter') == 2
+    assert probes.status() == {'counter': {'reads': 2, 'hits': 4}}
+    with pytest.raises(KeyError):
+        probes.get('missing')
+
+
+def test_ttl():
+    probes = ProbeCache()
+    fast = Counter()
+    slow = Counter()
+    probes.register('fast', fast, ttl=0.05)
+    probes.register('slow', slow, ttl=60.0)
+    assert probes.get('fast') == 1 and probes.get('slow') == 1
+    time.sleep(0.1)
+    assert probes.get('fast') == 2 and probes.get('slow') == 1
+    # Invalidate all probes
+    probes.invalidate()
+    assert probes.get('fast') == 3 and probes.get('slow') == 2
+
+
+def test_invalidate_while_reading():
+    probes = ProbeCache()
+    values = iter(['old', 'new'])
+
+    def read():
+        value = next(values)
+        if value == 'old':
+            # Changed while the probe is read
+            probes.invalidate('probe')
+        return value
+    probes.register('probe', read)
+    assert probes.get('probe') == 'old'
+    assert probes.get('probe') == 'new'
+    assert probes.get('probe') == 'new'
+# EOF
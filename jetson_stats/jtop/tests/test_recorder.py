@@ -0,0 +1,88 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import csv
+from io import StringIO
+from jtop.core import Recorder
+from jtop.core.recorder import read, segments, dump_csv, flatten
+
+
+def sample(idx):
+    return {'ram': {'use': 1000 + idx, 'tot': 4000}, 'GPU': float(idx), 'fan': [{'speed': idx}]}
+
+
+def record(path, count, **kwargs):
+    recorder = Recorder(path, interval=1.0, **kwargs)
+    for idx in range(count):
+        recorder.append(float(idx), sample(idx))
+        # A block every 10 samples
+        if idx % 10 == 9:
+            recorder.flush()
+    recorder.close()
+    return recorder
+
+
+def test_record(tmpdir):
+    path = str(tmpdir)
+    recorder = Recorder(path, interval=1.0)
+    assert recorder.append(0.0, sample(0))
+    # Too close to the last sample
+    assert not recorder.append(0.5, sample(1))
+    assert recorder.append(1.0, sample(1))
+    recorder.close()
+    assert list(read(path)) == [(0.0, sample(0)), (1.0, sample(1))]
+    assert recorder.status()['samples'] == 2
+    # Window of samples in many blocks
+    path = str(tmpdir.mkdir('window'))
+    record(path, 50)
+    assert list(read(path, 15, 24)) == [(float(idx), sample(idx)) for idx in range(15, 25)]
+    assert list(read(path, 100)) == []
+
+
+def test_truncated(tmpdir):
+    path = str(tmpdir)
+    record(path, 20)
+    name = segments(path)[0]
+    with open(name, 'rb+') as segment:
+        segment.truncate(os.path.getsize(name) - 10)
+    # The last block is not complete
+    assert list(read(path)) == [(float(idx), sample(idx)) for idx in range(10)]
+
+
+def test_retention(tmpdir):
+    path = str(tmpdir)
+    recorder = record(path, 100, segment=1, size=300)
+    names = segments(path)
+    assert recorder.status()['removed'] > 0
+    assert sum(os.path.getsize(name) for name in names[:-1]) <= 300
+    # Only the newest samples
+    samples = list(read(path))
+    assert samples[-1] == (99.0, sample(99))
+    assert samples[0][0] > 0
+
+
+def test_dump_csv(tmpdir):
+    path = str(tmpdir)
+    record(path, 20)
+    assert flatten(sample(1)) == {'ram/use': 1001, 'ram/tot': 4000, 'GPU': 1.0, 'fan/0/speed': 1}
+    output = StringIO()
+    assert dump_csv(path, output, start=5, end=7) == 3
+    rows = list(csv.DictReader(StringIO(output.getvalue())))
+    assert [row['ram/use'] for row in rows] == ['1005', '1006', '1007']
+    assert set(rows[0]) == set(['time', 'ram/use', 'ram/tot', 'GPU', 'fan/0/speed'])
+# EOF
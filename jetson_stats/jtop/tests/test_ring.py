@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pytest
+from threading import Thread
+from jtop.core import SampleRing, JtopException
+from jtop.core.tegra_parse import decode
+from .common import tegrastats_lines
+# Skip all tests without shared memory
+pytestmark = pytest.mark.skipif(not SampleRing.available(), reason="shared memory not available")
+
+
+@pytest.fixture
+def ring():
+    ring = SampleRing.create("jtop_test_{pid}".format(pid=os.getpid()), slots=3, size=16 * 1024)
+    yield ring
+    ring.close()
+
+
+def test_read(ring):
+    reader = SampleRing.attach(ring.name)
+    assert reader.read() is None
+    stats = [decode(line) for line in tegrastats_lines()]
+    for sample in stats:
+        assert ring.write(sample)
+    # Only the last sample
+    index, data = reader.read()
+    assert index == len(stats)
+    assert data == stats[-1]
+    assert reader.read(index) is None
+    assert reader.wait(index, timeout=0.05) is None
+    reader.close()
+
+
+def test_read_only(ring):
+    reader = SampleRing.attach(ring.name)
+    ring.write({'idx': 1})
+    # The clients cannot change the samples
+    with pytest.raises(TypeError):
+        reader._memory.buf[0:4] = b'XXXX'
+    # Also without write permission on the memory
+    os.chmod(ring.path, 0o440)
+    other = SampleRing.attach(ring.name)
+    assert other.read() == (1, {'idx': 1})
+    other.close()
+    reader.close()
+
+
+def test_not_packed(ring):
+    # Only data encoded with pack, pickle is never used
+    with pytest.raises(ValueError):
+        ring.write({'data': object()})
+    assert ring.head == 0
+
+
+def test_too_big(ring):
+    assert not ring.write({'data': 'x' * ring.size})
+    assert ring.head == 0
+
+
+def test_missing():
+    with pytest.raises(JtopException):
+        SampleRing.attach("jtop_test_missing")
+
+
+def test_concurrent(ring):
+    reader = SampleRing.attach(ring.name)
+    count = 2000
+
+    def writer():
+        for idx in range(1, count + 1):
+            ring.write({'idx': idx, 'values': [idx] * (idx % 200)})
+    thread = Thread(target=writer)
+    thread.start()
+    last = 0
+    while last < count:
+        sample = reader.wait(last, timeout=5.0)
+        assert sample is not None
+        index, data = sample
+        # Never a torn sample
+        assert index > last
+        assert data == {'idx': index, 'values': [index] * (index % 200)}
+        last = index
+    thread.join()
+    reader.close()
+    # The reader does not remove the memory
+    reader = SampleRing.attach(ring.name)
+    assert reader.head == count
+    reader.close()
+# EOF
@@ -0,0 +1,307 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import socket
+import time
+import pytest
+from threading import Thread
+from jtop.core import Publisher, Subscriber, JtopException
+from jtop.core.stream import (pack, unpack, split, merge, diff, patch, DELETED, STATIC_ANY,
+                              FRAME_HEADER, FRAME_SAMPLE, FRAME_STATIC, FRAME_KEYFRAME, FRAME_DELTA, FRAME_REQUEST)
+from jtop.core.tegra_parse import decode, parse
+from jtop.core.sample import Rail
+from .common import tegrastats_lines
+# Max time to wait
+MAX_TIME = 10.0
+
+
+STATIC = [('nvp', 'modes'), ('cpu', STATIC_ANY, 'model')]
+
+
+def sample(idx, modes=None):
+    return {'nvp': {'modes': modes or ['MAXN', '5W'], 'mode': 'MAXN'},
+            'cpu': {'CPU1': {'val': idx, 'model': 'ARMv8'}, 'CPU2': {'model': 'ARMv8'}},
+            'ram': {'use': 1000 + idx, 'tot': 4000},
+            'gpu': {'val': 10} if idx % 2 else {}}
+
+
+@pytest.fixture
+def publisher(tmpdir):
+    publisher = Publisher(os.path.join(str(tmpdir), 'stream.sock'), size=4, static=STATIC)
+    publisher.open()
+    yield publisher
+    publisher.close()
+
+
+@pytest.fixture
+def big_publisher(tmpdir):
+    # Queue big enough to never drop frames
+    publisher = Publisher(os.path.join(str(tmpdir), 'stream.sock'), size=64, static=STATIC, keyframe=5)
+    publisher.open()
+    yield publisher
+    publisher.close()
+
+
+def wait_subscribers(publisher, count):
+    start = time.time()
+    while publisher.status()['subscribers'] != count and time.time() - start < MAX_TIME:
+        time.sleep(0.01)
+    assert publisher.status()['subscribers'] == count
+
+
+def test_pack():
+    for line in tegrastats_lines():
+        stats = decode(line)
+        assert unpack(pack(stats)) == stats
+    values = {'none': None, 'bool': [True, False], 'int': [0, -1, 300, -70000, 2 ** 40], 'float': -1.5,
+              'text': u'°C', 'long': 'x' * 1000, 'list': list(range(300)), 1: 'key'}
+    assert unpack(pack(values)) == values
+    # Tuples are lists
+    assert unpack(pack((1, 2))) == [1, 2]
+    with pytest.raises(ValueError):
+        pack(set())
+
+
+def test_pack_records():
+    for line in tegrastats_lines():
+        sample = parse(line)
+        records = {'ram': sample.ram, 'swap': sample.swap, 'mts': sample.mts, 'cpu': list(sample.cpu), 'vals': sample.vals, 'watt': sample.watt}
+        values = unpack(pack(records))
+        assert values == dict(records, cpu=list(sample.cpu))
+        assert [type(cpu) for cpu in values['cpu']] == [type(cpu) for cpu in sample.cpu]
+        assert all(type(rail) is Rail for rail in values['watt'].values())
+    with pytest.raises(ValueError):
+        unpack(b'r\xff')
+
+
+def test_delta():
+    data = sample(1)
+    static, dynamic = split(data, STATIC)
+    assert static == {'nvp': {'modes': ['MAXN', '5W']}, 'cpu': {'CPU1': {'model': 'ARMv8'}, 'CPU2': {'model': 'ARMv8'}}}
+    assert dynamic == {'nvp': {'mode': 'MAXN'}, 'cpu': {'CPU1': {'val': 1}, 'CPU2': {}}, 'ram': {'use': 1001, 'tot': 4000}, 'gpu': {'val': 10}}
+    # The sample is not changed
+    assert data == sample(1)
+    assert merge(dynamic, static) == data
+    _, new = split(sample(2), STATIC)
+    delta = diff(dynamic, new)
+    assert delta == {'cpu': {'CPU1': {'val': 2}}, 'ram': {'use': 1002}, 'gpu': {'val': DELETED}}
+    assert unpack(pack(delta)) == delta
+    assert patch(dynamic, delta) == new
+    assert dynamic == split(sample(1), STATIC)[1]
+    # Same values with a different type
+    assert diff({'val': 1}, {'val': 1.0}) == {'val': 1.0}
+
+
+def test_samples(big_publisher):
+    publisher = big_publisher
+    first = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    publisher.publish_sample(sample(0))
+    assert first.sample(timeout=MAX_TIME) == (1, sample(0))
+    # Static data and keyframe for a new subscriber
+    second = Subscriber(publisher.path)
+    wait_subscribers(publisher, 2)
+    for idx in range(1, 4):
+        publisher.publish_sample(sample(idx))
+    # New static data
+    publisher.publish_sample(sample(4, modes=['MAXN']))
+    for idx in range(1, 5):
+        expected = sample(idx, modes=['MAXN'] if idx == 4 else None)
+        assert first.sample(timeout=MAX_TIME) == (idx + 1, expected)
+        assert second.sample(timeout=MAX_TIME) == (idx + 1, expected)
+    first.close()
+    second.close()
+
+
+def test_frames(big_publisher):
+    publisher = big_publisher
+    subscriber = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    for idx in range(6):
+        publisher.publish_sample(sample(idx))
+    frames = [subscriber.read(timeout=MAX_TIME) for _ in range(7)]
+    assert [kind for kind, _, _ in frames] == [FRAME_STATIC, FRAME_KEYFRAME] + [FRAME_DELTA] * 4 + [FRAME_KEYFRAME]
+    sizes = dict((kind, len(pack(data))) for kind, _, data in frames)
+    assert sizes[FRAME_DELTA] < sizes[FRAME_KEYFRAME] < len(pack(sample(0)))
+    subscriber.close()
+
+
+def test_changed_in_place(big_publisher):
+    publisher = big_publisher
+    subscriber = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    # The service can publish the same dictionaries updated in place
+    data = sample(0)
+    for idx in range(3):
+        data['ram']['use'] = idx
+        data['nvp']['modes'].append(str(idx))
+        publisher.publish_sample(data)
+        assert subscriber.sample(timeout=MAX_TIME)[1] == data
+    subscriber.close()
+
+
+def test_slow_samples(publisher):
+    slow = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    # Big samples fill the socket, the subscriber must receive a new keyframe
+    for idx in range(20):
+        data = sample(idx)
+        data['data'] = str(idx) * 200000
+        publisher.publish_sample(data)
+    assert publisher.status()['dropped'] > 0
+    last = 0
+    while last < 20:
+        last, data = slow.sample(timeout=MAX_TIME)
+        expected = sample(last - 1)
+        expected['data'] = str(last - 1) * 200000
+        assert data == expected
+    slow.close()
+
+
+def test_slow_dropped_delta(publisher):
+    slow = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    # The first keyframe fills the socket, the next 4 deltas fill the queue
+    # and the last sample drops the deltas 2 and 3: the field changes only in delta 3
+    samples = []
+    for idx in range(6):
+        data = sample(idx)
+        data['slow'] = 1 if idx >= 2 else 0
+        data['data'] = str(idx) * 2000000
+        samples.append(data)
+        publisher.publish_sample(data)
+        time.sleep(0.1)
+    assert publisher.status()['dropped'] > 0
+    last = 0
+    while last < len(samples):
+        last, data = slow.sample(timeout=MAX_TIME)
+        assert data == samples[last - 1]
+    slow.close()
+
+
+def test_all_samples(publisher):
+    subscribers = [Subscriber(publisher.path) for _ in range(3)]
+    wait_subscribers(publisher, 3)
+    stats = [decode(line) for line in tegrastats_lines()[:3]]
+    for sample in stats:
+        publisher.publish(sample)
+    for subscriber in subscribers:
+        for idx, sample in enumerate(stats):
+            assert subscriber.read(timeout=MAX_TIME) == (FRAME_SAMPLE, idx + 1, sample)
+        assert subscriber.read(timeout=0.01) is None
+        assert subscriber.lost == 0
+        subscriber.close()
+    wait_subscribers(publisher, 0)
+
+
+def test_slow_subscriber(publisher):
+    slow = Subscriber(publisher.path)
+    fast = Subscriber(publisher.path)
+    wait_subscribers(publisher, 2)
+    # Big frames fill the socket of the slow subscriber
+    data = {'data': 'x' * 200000}
+    for idx in range(1, 21):
+        publisher.publish(data)
+        assert fast.read(timeout=MAX_TIME)[1] == idx
+    assert publisher.status()['dropped'] > 0
+    # The slow subscriber reads the newest frames and counts the lost ones
+    last = 0
+    while last < 20:
+        _, last, sample = slow.read(timeout=MAX_TIME)
+        assert sample == data
+    assert slow.lost > 0
+    slow.close()
+    fast.close()
+
+
+def test_request(tmpdir):
+    def handler(request):
+        if 'fail' in request:
+            raise JtopException("Request failed")
+        return {'echo': request['value']}
+    publisher = Publisher(os.path.join(str(tmpdir), 'stream.sock'), size=64, static=STATIC, handler=handler)
+    publisher.open()
+    subscriber = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    publisher.publish_sample(sample(0))
+    assert subscriber.request({'value': [1, 2]}, timeout=MAX_TIME) == {'echo': [1, 2]}
+    with pytest.raises(JtopException):
+        subscriber.request({'fail': True}, timeout=MAX_TIME)
+    # Samples received while waiting a reply are not lost
+    publisher.publish_sample(sample(1))
+    assert subscriber.request({'value': 'next'}, timeout=MAX_TIME) == {'echo': 'next'}
+    assert subscriber.sample(timeout=MAX_TIME) == (1, sample(0))
+    assert subscriber.sample(timeout=MAX_TIME) == (2, sample(1))
+    assert subscriber.lost == 0
+    subscriber.close()
+    publisher.close()
+
+
+def test_request_while_reading(tmpdir):
+    publisher = Publisher(os.path.join(str(tmpdir), 'stream.sock'), size=64, static=STATIC, handler=lambda request: request)
+    publisher.open()
+    subscriber = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    frames = []
+    reader = Thread(target=lambda: frames.append(subscriber.read(timeout=MAX_TIME)))
+    reader.start()
+    # The reply does not wait the reader
+    start = time.time()
+    assert subscriber.request({'value': 1}, timeout=MAX_TIME) == {'value': 1}
+    assert time.time() - start < MAX_TIME / 2
+    # Reply of send passed to the callback
+    replies = []
+    subscriber.send({'value': 2}, replies.append)
+    publisher.publish_sample(sample(0))
+    reader.join()
+    assert frames == [(FRAME_STATIC, 1, {'nvp': {'modes': ['MAXN', '5W']}, 'cpu': {'CPU1': {'model': 'ARMv8'}, 'CPU2': {'model': 'ARMv8'}}})]
+    deadline = time.time() + MAX_TIME
+    while not replies and time.time() < deadline:
+        subscriber.read(timeout=0.1)
+    assert replies == [{'reply': {'value': 2}}]
+    subscriber.close()
+    publisher.close()
+
+
+def test_malformed_request(publisher):
+    good = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    # Unknown tag, short payload and bad UTF-8
+    for payload in [b'?', b'i\x01', b's\x02\xff\xfe']:
+        bad = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        bad.connect(publisher.path)
+        wait_subscribers(publisher, 2)
+        bad.sendall(FRAME_HEADER.pack(FRAME_REQUEST, 1, len(payload)) + payload)
+        # Only the subscriber with the malformed request is disconnected
+        wait_subscribers(publisher, 1)
+        bad.close()
+    publisher.publish_sample(sample(0))
+    assert good.sample(timeout=MAX_TIME) == (1, sample(0))
+    good.close()
+
+
+def test_closed(publisher):
+    subscriber = Subscriber(publisher.path)
+    wait_subscribers(publisher, 1)
+    publisher.close()
+    with pytest.raises(JtopException):
+        subscriber.read(timeout=MAX_TIME)
+    subscriber.close()
+    with pytest.raises(JtopException):
+        Subscriber(publisher.path)
+# EOF
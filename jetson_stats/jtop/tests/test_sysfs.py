@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+import pytest
+import jtop.core.sysfs as sysfs
+from jtop.core.sysfs import SysFile
+from jtop.core.memory import mem_info
+from jtop.core.engine import nvjpg
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_read(tmpdir):
+    path = os.path.join(str(tmpdir), 'load')
+    write(path, "500\n")
+    sysfile = SysFile(path)
+    fd = sysfile._fd
+    assert sysfile.read_int() == 500
+    write(path, "42\n")
+    # Same file, new content
+    assert sysfile.read_int() == 42
+    assert sysfile._fd == fd
+    sysfile.close()
+
+
+def test_big_file(tmpdir):
+    path = os.path.join(str(tmpdir), 'stat')
+    text = "cpu 0 0 0 0\n" * 1000
+    write(path, text)
+    sysfile = SysFile(path)
+    assert sysfile.read() == text
+    sysfile.close()
+
+
+def test_reopen(tmpdir, monkeypatch):
+    path = os.path.join(str(tmpdir), 'rpm')
+    write(path, "1000\n")
+    sysfile = SysFile(path)
+    preadinto = sysfs._preadinto
+    errors = [OSError(errno.ENODEV, "No such device")]
+
+    def unplug(fd, buffer, offset):
+        if errors:
+            raise errors.pop()
+        return preadinto(fd, buffer, offset)
+    monkeypatch.setattr(sysfs, '_preadinto', unplug)
+    assert sysfile.read_int() == 1000
+    assert sysfile.reopens == 1
+    sysfile.close()
+
+
+def test_missing(tmpdir):
+    path = os.path.join(str(tmpdir), 'temp')
+    with pytest.raises(OSError):
+        sysfs.read(path)
+    # Available after hot-plug
+    write(path, "40500\n")
+    assert sysfs.read_int(path) == 40500
+    assert sysfs.sysfile(path) is sysfs.sysfile(path)
+    sysfs.close_all()
+
+
+def test_probes(tmpdir):
+    path = os.path.join(str(tmpdir), 'meminfo')
+    write(path, "MemTotal:        4059152 kB\nMemFree:         2048000 kB\n")
+    assert mem_info(path) == {'MemTotal': {'val': 4059152, 'unit': 'k'}, 'MemFree': {'val': 2048000, 'unit': 'k'}}
+    write(os.path.join(str(tmpdir), 'clk_rate'), "716800000\n")
+    assert nvjpg(str(tmpdir)) == {'rate': 716800000}
+    sysfs.close_all()
+# EOF
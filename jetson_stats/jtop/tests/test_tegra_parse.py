@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+import pickle
+from jtop.core.tegra_parse import decode, parse, TegraParser, TEMPLATE_RELEARN, VALS, MTS, RAM, SWAP, IRAM, CPUS, TEMPS, WATTS
+from .common import tegrastats_lines
+
+
+def decode_regex(text):
+    # Reference decoder with all regular expressions
+    stats = VALS(text)
+    mts = MTS(text)
+    if mts:
+        stats['MTS'] = mts
+    stats['RAM'] = RAM(text)
+    swap = SWAP(text)
+    if swap:
+        stats['SWAP'] = swap
+    iram = IRAM(text)
+    if iram:
+        stats['IRAM'] = iram
+    stats['CPU'] = CPUS(text)
+    stats['TEMP'] = TEMPS(text)
+    stats['WATT'] = WATTS(text)
+    return stats
+
+
+def test_emulator_lines():
+    # TX1, TX2, Xavier, Nano and extra model, with and without sudo
+    assert len(tegrastats_lines()) == 10
+
+
+@pytest.mark.parametrize("line", tegrastats_lines())
+def test_decode_parity(line):
+    assert decode(line) == decode_regex(line)
+
+
+@pytest.mark.parametrize("idx", range(len(tegrastats_lines())))
+def test_parser_template(idx):
+    parser = TegraParser()
+    for seed in range(20):
+        line = tegrastats_lines(seed)[idx]
+        sample = parser(line)
+        assert sample == parse(line)
+        assert sample.to_dict() == decode(line)
+    # All lines after the first are decoded with the template
+    assert parser.hits == 20
+    assert parser.fallbacks == 0
+
+
+def test_parser_fallback():
+    parser = TegraParser()
+    line = "RAM 696/7854MB (lfb 1675x4MB) CPU [10%@345,20%@345] GR3D_FREQ 5%@140 thermal@29.2C VDD_IN 1383/1383"
+    assert parser(line) == parse(line)
+    # A core goes off and the layout changes
+    line_off = "RAM 696/7854MB (lfb 1675x4MB) CPU [10%@345,off] GR3D_FREQ 5%@140 thermal@-2C VDD_IN 1383/1383"
+    for _ in range(TEMPLATE_RELEARN):
+        assert parser(line_off) == parse(line_off)
+    assert parser.fallbacks == TEMPLATE_RELEARN
+    # New layout learned
+    assert parser(line_off).to_dict() == decode(line_off)
+    assert parser.fallbacks == TEMPLATE_RELEARN
+
+
+@pytest.mark.parametrize("line", tegrastats_lines())
+def test_sample_pickle(line):
+    sample = parse(line)
+    assert pickle.loads(pickle.dumps(sample, 2)) == sample
+    assert len(pickle.dumps(sample, 2)) < len(pickle.dumps(decode(line), 2))
+
+
+def test_decode_mts():
+    stats = decode("RAM 696/7854MB (lfb 1675x4MB) CPU [10%@345,off] MTS fg 3% bg 7% thermal@29.2C")
+    assert stats['MTS'] == MTS("MTS fg 3% bg 7%") == {'fg': 3, 'bg': 7}
+    assert stats['CPU'] == {'CPU1': {'val': 10, 'frq': 345000}, 'CPU2': {}}
+
+
+def test_decode_empty():
+    assert decode("") == {'RAM': {}, 'CPU': {}, 'TEMP': {}, 'WATT': {}}
+# EOF
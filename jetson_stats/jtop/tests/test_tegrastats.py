@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+import subprocess as sp
+import pytest
+import jtop.core.tegrastats as tegrastats
+from jtop.core.tegrastats import Tegrastats
+from jtop.core.tegra_parse import learn_layout
+from .common import tegrastats_lines, tegrastats_models, TEGRASTATS_PYTHON
+# Max time to wait
+MAX_TIME = 10.0
+
+
+def fake_tegrastats(tmpdir, body):
+    # tegrastats that writes one line and then runs body
+    path = os.path.join(str(tmpdir), 'tegrastats')
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\necho "{line}"\n{body}\n'.format(line=tegrastats_lines()[0], body=body))
+    os.chmod(path, 0o755)
+    return path
+
+
+def wait_status(tegra, key, value):
+    start = time.time()
+    while tegra.status()[key] < value and time.time() - start < MAX_TIME:
+        time.sleep(0.01)
+    return tegra.status()
+
+
+def test_restart(tmpdir, monkeypatch):
+    monkeypatch.setattr(tegrastats, 'BACKOFF_MIN', 0.05)
+    samples = []
+    tegra = Tegrastats(samples.append, [fake_tegrastats(tmpdir, 'exit 0')])
+    tegra.open(interval=0.01)
+    status = wait_status(tegra, 'restarts', 3)
+    tegra.close()
+    assert status['restarts'] >= 3
+    assert status['stalls'] == 0
+    assert len(samples) >= 3
+    # Every restart leaves a gap in the data
+    assert status['gaps']
+
+
+def test_stall(tmpdir, monkeypatch):
+    monkeypatch.setattr(tegrastats, 'BACKOFF_MIN', 0.05)
+    tegra = Tegrastats(lambda stats: None, [fake_tegrastats(tmpdir, 'exec sleep 100')])
+    tegra.open(interval=0.02)
+    status = wait_status(tegra, 'stalls', 1)
+    start = time.time()
+    tegra.close()
+    assert status['stalls'] >= 1
+    assert status['restarts'] >= 1
+    # close does not wait the next line
+    assert time.time() - start < 1.0
+
+
+def test_slow_callback(tmpdir):
+    line = tegrastats_lines()[0]
+
+    def slow(stats):
+        time.sleep(0.05)
+
+    body = 'while true; do echo "{line}"; sleep 0.002; done'.format(line=line)
+    tegra = Tegrastats(slow, [fake_tegrastats(tmpdir, body)])
+    # Long interval, the close must not wait for it
+    tegra.open(interval=5.0)
+    status = wait_status(tegra, 'dropped', 10)
+    start = time.time()
+    tegra.close()
+    assert time.time() - start < 1.0
+    assert status['dropped'] >= 10
+    assert status['queue'] <= tegrastats.LINES_QUEUE
+    assert status['restarts'] == 0
+
+
+def test_high_rate():
+    samples = []
+    # Python emulator, a line every 2ms
+    tegra = Tegrastats(samples.append, [TEGRASTATS_PYTHON])
+    tegra.open(interval=0.002)
+    start = time.time()
+    while len(samples) < 200 and time.time() - start < MAX_TIME:
+        time.sleep(0.01)
+    status = tegra.status()
+    tegra.close()
+    assert len(samples) >= 200
+    assert status['restarts'] == 0
+    assert status['stalls'] == 0
+    assert all(sample.ram is not None and sample.cpu for sample in samples)
+
+
+@pytest.mark.parametrize("model", list(tegrastats_models()))
+def test_emulators(model):
+    # The python emulator writes the lines of the bash emulator
+    for line, sudo in zip(tegrastats_models()[model], ['--no-sudo', '--sudo']):
+        output = sp.check_output([sys.executable, TEGRASTATS_PYTHON, '--model', model, sudo, '--count', '1', '--seed', '1'])
+        assert learn_layout(line)(output.decode('utf-8').strip()) is not None
+# EOF
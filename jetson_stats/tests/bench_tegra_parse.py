@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro benchmark of the tegrastats parser.
+
+Corpora are built from the lines of the tegrastats emulator (one corpus for each board)
+and from synthetic long lines with many CPUs, rails and thermal zones.
+For each corpus are measured:
+
+ * lines/sec of Tegrastats._decode (best of all repeats)
+ * cost of every function called while decoding (cProfile), also built-ins like the regular
+   expressions and the sample records, in microseconds for each line
+ * memory blocks and bytes allocated and still alive for each decoded line (tracemalloc)
+
+Usage:
+    python tests/bench_tegra_parse.py --output bench.json
+    python tests/bench_tegra_parse.py --compare bench.json
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import random
+import subprocess as sp
+import sys
+import time
+from collections import OrderedDict
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from jtop.core.tegrastats import Tegrastats  # noqa: E402
+from jtop.tests.common import tegrastats_models, TEGRASTATS_EMULATOR  # noqa: E402
+
+
+def synthetic_line(rand, cpus=12, rails=40, thermals=30):
+    """ Long tegrastats line with many CPUs, rails and thermal zones """
+    line = ["RAM {use}/31920MB (lfb 4x4MB) SWAP {swap}/15960MB (cached 0MB)".format(use=rand.randint(1000, 30000), swap=rand.randint(0, 1000))]
+    line += ["CPU [" + ",".join("{val}%@{frq}".format(val=rand.randint(0, 100), frq=rand.randint(100, 2300)) for _ in range(cpus)) + "]"]
+    line += ["EMC_FREQ {val}%@2133 GR3D_FREQ {gpu}%@1377 APE 150 MTS fg 0% bg 0%".format(val=rand.randint(0, 100), gpu=rand.randint(0, 100))]
+    line += ["zone{idx}@{temp:.1f}C".format(idx=idx, temp=rand.uniform(20, 90)) for idx in range(thermals)]
+    line += ["VDD_RAIL{idx} {cur}/{avg}".format(idx=idx, cur=rand.randint(0, 10000), avg=rand.randint(0, 10000)) for idx in range(rails)]
+    line += ["NVENC 716 NVDEC 716"]
+    return " ".join(line)
+
+
+def build_corpora(lines, seed=0):
+    """ A corpus for each board of the emulator and a synthetic corpus with long lines """
+    corpora = OrderedDict()
+    # Different random values for every line
+    variants = [tegrastats_models(seed + idx) for idx in range(min(lines, 50))]
+    for model in variants[0]:
+        # Lines without and with sudo have a different layout
+        for sudo, name in enumerate([model, model + " sudo"]):
+            pool = [variant[model][sudo] for variant in variants]
+            corpora[name] = [pool[idx % len(pool)] for idx in range(lines)]
+    rand = random.Random(seed)
+    corpora['Synthetic'] = [synthetic_line(rand) for _ in range(lines)]
+    return corpora
+
+
+def bench_speed(decode, corpus, repeat):
+    """ Best lines/sec over all repeats """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        for line in corpus:
+            decode(line)
+        stop = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        best = stop - start if best is None else min(best, stop - start)
+    return len(corpus) / best if best > 0 else float('inf')
+
+
+def bench_profile(decode, corpus):
+    """ Cost of each function called by the parser, in microseconds for each line """
+    profile = cProfile.Profile()
+    profile.enable()
+    for line in corpus:
+        decode(line)
+    profile.disable()
+    functions = {}
+    for (filename, lineno, name), (_, ncalls, tottime, cumtime, _) in pstats.Stats(profile).stats.items():
+        if name == "<method 'disable' of '_lsprof.Profiler' objects>":
+            continue
+        # Built-in functions have not a file, like pstats
+        key = name if filename == '~' else "{file}:{line}({name})".format(file=os.path.basename(filename), line=lineno, name=name)
+        functions[key] = {'calls': float(ncalls) / len(corpus),
+                          'tottime_us': tottime * 1e6 / len(corpus),
+                          'cumtime_us': cumtime * 1e6 / len(corpus)}
+    return functions
+
+
+def bench_memory(decode, corpus):
+    """ Memory blocks and bytes of the decoded lines, and peak memory while decoding """
+    if tracemalloc is None:
+        return {}
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    # Keep all results alive to count what each line allocates
+    results = [decode(line) for line in corpus]
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del results
+    return {'blocks_per_line': float(blocks) / len(corpus),
+            'bytes_per_line': float(size) / len(corpus),
+            'peak_bytes': peak}
+
+
+def git_commit():
+    try:
+        return sp.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=sp.STDOUT).decode('utf-8').strip()
+    except (OSError, sp.CalledProcessError):
+        return None
+
+
+def run(lines, repeat, seed):
+    results = OrderedDict()
+    for name, corpus in build_corpora(lines, seed).items():
+        # New parser for each board, tegrastats is not started
+        decode = Tegrastats(None, [TEGRASTATS_EMULATOR])._decode
+        results[name] = {'lines': len(corpus),
+                         'line_length': float(sum(len(line) for line in corpus)) / len(corpus),
+                         'lines_per_sec': bench_speed(decode, corpus, repeat),
+                         'functions': bench_profile(decode, corpus),
+                         'memory': bench_memory(decode, corpus)}
+    return {'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'corpora': results}
+
+
+def print_report(report, baseline=None):
+    print("Commit {commit} - Python {python} {machine}".format(**report))
+    if baseline is not None:
+        print("Baseline {commit} - Python {python} {machine}".format(**baseline))
+    for name, result in report['corpora'].items():
+        memory = result['memory']
+        line = "{name:<12} {speed:>10.0f} lines/s".format(name=name, speed=result['lines_per_sec'])
+        if memory:
+            line += " {blocks:>7.1f} blocks/line {size:>8.0f} B/line".format(blocks=memory['blocks_per_line'], size=memory['bytes_per_line'])
+        base = baseline['corpora'].get(name) if baseline is not None else None
+        if base is not None:
+            line += "  speedup x{ratio:.2f}".format(ratio=result['lines_per_sec'] / base['lines_per_sec'])
+        print(line)
+        functions = sorted(result['functions'].items(), key=lambda item: -item[1]['tottime_us'])
+        for function, cost in functions:
+            print("    {name:<48} {calls:>6.1f} calls {tottime:>8.2f} us/line".format(name=function, calls=cost['calls'], tottime=cost['tottime_us']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the tegrastats parser")
+    parser.add_argument('--lines', type=int, default=2000, help='Lines for each corpus (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats of the speed test, the best is reported (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random values')
+    parser.add_argument('--output', help='Write the results in a JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run, to print the speedup')
+    args = parser.parse_args()
+
+    report = run(args.lines, args.repeat, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
+# EOF
@@ -46,11 +46,18 @@ js_test_uninstall()
 js_test_install()
 {
     local FORCE=$1
+    local PYTHON=$2
     
     # tegrastats emulator
     if [ ! -f /usr/bin/tegrastats ] || $FORCE ; then
-        echo " - Copy emulation tegrastats in /usr/bin/"
-        sudo cp tests/tegrastats /usr/bin/
+        if $PYTHON ; then
+            # Linked, the python emulator reads the lines of the boards from tests/tegrastats
+            echo " - Link python emulation tegrastats in /usr/bin/"
+            sudo ln -sf "$(pwd)/tests/tegrastats.py" /usr/bin/tegrastats
+        else
+            echo " - Copy emulation tegrastats in /usr/bin/"
+            sudo cp tests/tegrastats /usr/bin/
+        fi
     else
         echo " - Already exist tegrastats in /usr/bin/"
     fi
@@ -85,6 +92,7 @@ usage()
     echo "   -h|--help    | This help"
     echo "   -s|--silent  | Run jetson_stats in silent mode"
     echo "   -f|--force   | Force install all tools"
+    echo "   -p|--python  | Install the python emulator of tegrastats"
     echo "   --uninstall  | Run the uninstaller"
 }
 
@@ -93,6 +101,7 @@ main()
     local SKIP_ASK=true
     local UNINSTALL=false
     local FORCE=false
+    local PYTHON=false
 
     # Decode all information from startup
     while [ -n "$1" ]; do
@@ -108,6 +117,9 @@ main()
             -f|--force)
                 FORCE=true
                 ;;
+            -p|--python)
+                PYTHON=true
+                ;;
             --uninstall)
                 UNINSTALL=true
                 ;;
@@ -158,7 +170,7 @@ main()
     if $UNINSTALL ; then
         js_test_uninstall $FORCE
     else
-        js_test_install $FORCE
+        js_test_install $FORCE $PYTHON
     fi
 
     tput setaf 2
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# This file is part of the jetson_stats package (https://github.com/rbonghi/jetson_stats or http://rnext.it).
+# Copyright (c) 2020 Raffaello Bonghi.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Emulator of NVIDIA Jetson tegrastats, same options of tests/tegrastats.
+
+Lines are written at the requested interval, also of few milliseconds (0 is as fast as possible).
+The values are from:
+
+ * the boards of tests/tegrastats (TX1, TX2, Xavier, Nano and Extra) with random loads,
+   the lines are read from the bash emulator
+ * a synthetic board with any number of CPUs, rails and thermal zones
+ * a trace, the lines of a tegrastats log are replayed in a loop
+
+Every run with the same --seed writes the same lines.
+
+Usage:
+    tests/tegrastats.py --interval 5
+    tests/tegrastats.py --test-model Xavier
+    tests/tegrastats.py --interval 1 --cpus 12 --rails 20 --thermals 16 --seed 1
+    tests/tegrastats.py --trace robot.log --interval 10
+
+Install as tegrastats with: tests/develop.sh --python
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+
+TEST_MODEL_FOLDER = "/tmp/jetson_model"
+# Emulator in bash with the lines of all boards, next to this file also when installed as a link
+TEGRASTATS_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'tegrastats')
+# Lines of the boards in the bash emulator
+SCRIPT_FUNCTION_RE = re.compile(r'^(tegrastats_out\w*)\(\)')
+SCRIPT_MODEL_RE = re.compile(r'\$JETSON_MODEL" = "(\w+)"')
+SCRIPT_RANDOM_RE = re.compile(r'\$\(\(\$RANDOM%100\+0\)\)|\$RAND_GPU')
+# Random values in the templates: {c} CPU load, {g} GPU load
+RANDOM_RE = re.compile(r'\{([cg])\}')
+# Timestamp of tegrastats --logfile
+TIMESTAMP_RE = re.compile(r'^\d\d-\d\d-\d{4} \d\d:\d\d:\d\d ')
+
+
+class Board(object):
+    """ Lines of a board of tests/tegrastats, with random CPU and GPU loads """
+
+    def __init__(self, rand, template):
+        self._rand = rand
+        # Split the template on the random values
+        self._parts = RANDOM_RE.split(template)
+
+    def __call__(self):
+        randint = self._rand.randint
+        gpu = randint(0, 99)
+        line = []
+        for idx, part in enumerate(self._parts):
+            if idx % 2 == 0:
+                line.append(part)
+            else:
+                line.append(str(randint(0, 99) if part == 'c' else gpu))
+        return "".join(line)
+
+
+class Synthetic(object):
+    """ Lines of a board with any number of CPUs, rails and thermal zones """
+
+    def __init__(self, rand, cpus, rails, thermals, sudo):
+        self._rand = rand
+        self._cpus = cpus
+        self._thermals = [rand.uniform(25, 60) for _ in range(thermals)]
+        self._rails = [rand.randint(0, 5000) for _ in range(rails)]
+        self._sum = [0] * rails
+        self._samples = 0
+        self._sudo = sudo
+
+    def __call__(self):
+        rand = self._rand
+        self._samples += 1
+        line = ["RAM {use}/31920MB (lfb 4x4MB) SWAP {swap}/15960MB (cached 0MB)".format(use=rand.randint(1000, 30000), swap=rand.randint(0, 1000))]
+        line.append("CPU [" + ",".join("{val}%@{frq}".format(val=rand.randint(0, 100), frq=rand.randint(100, 2300)) for _ in range(self._cpus)) + "]")
+        if self._sudo:
+            line.append("EMC_FREQ {val}%@2133 GR3D_FREQ {gpu}%@1377 APE 150 MTS fg 0% bg 0%".format(val=rand.randint(0, 100), gpu=rand.randint(0, 100)))
+        else:
+            line.append("EMC_FREQ {val}% GR3D_FREQ {gpu}%".format(val=rand.randint(0, 100), gpu=rand.randint(0, 100)))
+        # Slow random walk of temperatures and rails
+        for idx, temp in enumerate(self._thermals):
+            self._thermals[idx] = min(max(temp + rand.uniform(-0.5, 0.5), 20.0), 95.0)
+            line.append("zone{idx}@{temp:.1f}C".format(idx=idx, temp=self._thermals[idx]))
+        for idx, cur in enumerate(self._rails):
+            cur = max(cur + rand.randint(-50, 50), 0)
+            self._rails[idx] = cur
+            self._sum[idx] += cur
+            line.append("VDD_RAIL{idx} {cur}/{avg}".format(idx=idx, cur=cur, avg=self._sum[idx] // self._samples))
+        if self._sudo:
+            line.append("NVENC 716 NVDEC 716")
+        return " ".join(line)
+
+
+class Trace(object):
+    """ Lines of a tegrastats log, replayed in a loop """
+
+    def __init__(self, path):
+        with open(path, 'r') as f:
+            self._lines = [TIMESTAMP_RE.sub('', line.strip()) for line in f if line.strip()]
+        if not self._lines:
+            raise ValueError("Empty trace {path}".format(path=path))
+        self._idx = 0
+
+    def __call__(self):
+        line = self._lines[self._idx]
+        self._idx = (self._idx + 1) % len(self._lines)
+        return line
+
+
+def read_templates(path):
+    """ Templates of the boards in the bash emulator, {model: (without sudo, with sudo)}.
+        The lines of the last else are the board of all other models.
+    """
+    templates = {}
+    sudo, model = False, None
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            match = SCRIPT_FUNCTION_RE.match(line)
+            if match:
+                sudo = match.group(1).endswith('_sudo')
+                continue
+            match = SCRIPT_MODEL_RE.search(line)
+            if match:
+                model = match.group(1)
+            elif line == 'else':
+                model = None
+            elif line.startswith('echo "RAM '):
+                line = line[len('echo "'):-1]
+                template = SCRIPT_RANDOM_RE.sub(lambda match: '{g}' if match.group() == '$RAND_GPU' else '{c}', line)
+                templates.setdefault(model, [None, None])[1 if sudo else 0] = template
+    return templates
+
+
+def read_model():
+    if os.path.isfile(TEST_MODEL_FOLDER):
+        with open(TEST_MODEL_FOLDER, 'r') as f:
+            return f.readline().strip()
+    return ''
+
+
+def generator(args):
+    if args.trace:
+        return Trace(args.trace)
+    rand = random.Random(args.seed)
+    sudo = os.getuid() == 0 if args.sudo is None else args.sudo
+    if args.cpus or args.rails or args.thermals:
+        return Synthetic(rand, args.cpus or 4, args.rails, args.thermals, sudo)
+    model = args.model if args.model is not None else read_model()
+    templates = read_templates(args.script)
+    template = templates.get(model, templates[None])[1 if sudo else 0]
+    return Board(rand, template)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tegrastats, Emulator of NVIDIA Jetsons")
+    parser.add_argument('--interval', type=float, default=500, help='Interval between lines in milliseconds (default: 500)')
+    parser.add_argument('--test-model', dest='test_model', help='Test the jetson version (Does not exist in real!!)')
+    parser.add_argument('--model', help='Board of the lines, default from {path}'.format(path=TEST_MODEL_FOLDER))
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the random values')
+    parser.add_argument('--cpus', type=int, default=0, help='Synthetic board with this number of CPUs')
+    parser.add_argument('--rails', type=int, default=0, help='Synthetic board with this number of power rails')
+    parser.add_argument('--thermals', type=int, default=0, help='Synthetic board with this number of thermal zones')
+    parser.add_argument('--trace', help='Replay the lines of a tegrastats log')
+    parser.add_argument('--script', default=TEGRASTATS_SCRIPT, help='Bash emulator with the lines of the boards (default: tests/tegrastats)')
+    parser.add_argument('--count', type=int, default=0, help='Exit after this number of lines (default: never)')
+    sudo = parser.add_mutually_exclusive_group()
+    sudo.add_argument('--sudo', dest='sudo', action='store_true', default=None, help='Lines of tegrastats with sudo')
+    sudo.add_argument('--no-sudo', dest='sudo', action='store_false', help='Lines of tegrastats without sudo')
+    args = parser.parse_args()
+
+    if args.test_model is not None:
+        with open(TEST_MODEL_FOLDER, 'w') as f:
+            f.write(args.test_model + "\n")
+        print("Write {model} in {path}".format(model=args.test_model, path=TEST_MODEL_FOLDER))
+        return
+    line = generator(args)
+    interval = args.interval / 1000.0
+    count = 0
+    deadline = clock()
+    try:
+        while args.count <= 0 or count < args.count:
+            sys.stdout.write(line() + "\n")
+            sys.stdout.flush()
+            count += 1
+            # Sleep until the next line, without drift
+            deadline += interval
+            delay = deadline - clock()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = clock()
+    except (KeyboardInterrupt, IOError):
+        # Closed by the reader
+        pass
+
+
+if __name__ == "__main__":
+    main()
+# EOF
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+log_phases.py
+-------------
+Phase markers for the resource loggers and per-phase statistics for the analysis tools.
+
+A phase marker is a labelled row written in the log when something interesting happens
+in the monitored run (initialisation done, a new dataset segment starts, ...).
+Markers can be sent to a running logger in three ways:
+
+    # 1. Append a line to the marker file given with --phase-file
+    echo "tracking" >> /tmp/phases
+    # 2. Send a datagram to the UNIX socket given with --phase-socket
+    python log_phases.py --socket /tmp/logger.sock tracking
+    # 3. Send SIGUSR1 to the logger started with --phase-signal
+    kill -USR1 <logger pid>
+
+The statistics are evaluated on contiguous phases: a phase starts at its marker and
+ends at the next marker (or at the end of the log). Samples before the first marker
+belong to the phase named `PHASE_START`.
+"""
+import argparse
+import csv
+import os
+import signal
+import socket
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+PHASE_COLUMN = 'Phase'
+PHASE_START = 'start'
+# Maximum size of a label received from the UNIX socket
+MAX_LABEL_SIZE = 1024
+
+
+class PhaseMarkers:
+    """Collect phase markers from a marker file, a UNIX datagram socket and SIGUSR1."""
+
+    def __init__(self, marker_file: Optional[str] = None, socket_path: Optional[str] = None, use_signal: bool = False):
+        self._markers: List[Tuple[datetime, str]] = []
+        self._counter = 0
+        # Marker file: only lines appended after the logger start are read
+        self._file = None
+        if marker_file is not None:
+            self._file = open(marker_file, 'a+')
+            self._file.seek(0, os.SEEK_END)
+        # UNIX datagram socket, one label for each message
+        self._socket = None
+        self._socket_path = socket_path
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(socket_path)
+            self._socket.setblocking(False)
+        # The signal handler only stores the marker, the row is written from poll()
+        if use_signal:
+            signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self._counter += 1
+        self._markers.append((datetime.now(), "signal {counter}".format(counter=self._counter)))
+
+    def poll(self) -> List[Tuple[datetime, str]]:
+        """Return all markers received since the last call, in arrival order."""
+        if self._file is not None:
+            for line in self._file.readlines():
+                label = line.strip()
+                if label:
+                    self._markers.append((datetime.now(), label))
+        if self._socket is not None:
+            while True:
+                try:
+                    message = self._socket.recv(MAX_LABEL_SIZE)
+                except BlockingIOError:
+                    break
+                label = message.decode('utf-8', errors='replace').strip()
+                if label:
+                    self._markers.append((datetime.now(), label))
+        markers, self._markers = self._markers, []
+        return markers
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._socket is not None:
+            self._socket.close()
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+
+def send_marker(socket_path: str, label: str):
+    """Send a phase marker to a logger listening on `socket_path`."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.sendto(label.encode('utf-8'), socket_path)
+
+
+def phase_aggregates(times: np.ndarray, values: np.ndarray, marker_times: Sequence[float],
+                     labels: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Evaluate count, mean, min, max and duration of `values` for each phase.
+
+    `times` must be sorted. Phases are contiguous slices of the samples, the boundaries
+    are found with a single `searchsorted` and all statistics are evaluated with `reduceat`.
+    Phases without samples are reported with count 0 and NaN statistics.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    marker_times = np.asarray(marker_times, dtype=float)
+    labels = [PHASE_START] + list(labels)
+    starts = np.concatenate(([0], np.searchsorted(times, marker_times, side='left')))
+    ends = np.append(starts[1:], len(times))
+    counts = ends - starts
+    # Phase before the first marker is reported only if it contains samples
+    first = 0 if len(marker_times) == 0 or counts[0] > 0 else 1
+    labels, starts, ends, counts = labels[first:], starts[first:], ends[first:], counts[first:]
+    mean = np.full(len(counts), np.nan)
+    vmin = np.full(len(counts), np.nan)
+    vmax = np.full(len(counts), np.nan)
+    filled = counts > 0
+    if np.any(filled):
+        index = starts[filled]
+        mean[filled] = np.add.reduceat(values, index) / counts[filled]
+        vmin[filled] = np.minimum.reduceat(values, index)
+        vmax[filled] = np.maximum.reduceat(values, index)
+    # Phase time limits: from the marker to the next marker or the last sample
+    begin = np.concatenate(([times[0] if len(times) else np.nan], marker_times))[first:]
+    finish = np.append(begin[1:], times[-1] if len(times) else np.nan)
+    return {'phase': np.array(labels, dtype=object),
+            'start': begin,
+            'duration': finish - begin,
+            'count': counts,
+            'mean': mean,
+            'min': vmin,
+            'max': vmax}
+
+
+def read_log(csv_path: str) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray, List[str]]:
+    """
+    Read a log written by `cpu_mem_logger.py` without pandas.
+
+    :return: Seconds from the first row, a dictionary of numeric columns,
+        seconds of each phase marker and the marker labels
+    """
+    times, markers_time, markers_label = [], [], []
+    columns: Dict[str, List[float]] = {}
+    with open(csv_path, 'r') as fp:
+        reader = csv.DictReader(fp)
+        names = [name for name in reader.fieldnames if name not in ('Timestamp', PHASE_COLUMN)]
+        for name in names:
+            columns[name] = []
+        for row in reader:
+            if row['Timestamp'] == 'FINAL':
+                continue
+            stamp = datetime.strptime(row['Timestamp'], TIMESTAMP_FORMAT).timestamp()
+            label = row.get(PHASE_COLUMN)
+            if label:
+                markers_time.append(stamp)
+                markers_label.append(label)
+                continue
+            times.append(stamp)
+            for name in names:
+                columns[name].append(float(row[name]) if row[name] else np.nan)
+    start = times[0] if times else 0.0
+    times = np.asarray(times) - start
+    return times, {k: np.asarray(v) for k, v in columns.items()}, np.asarray(markers_time) - start, markers_label
+
+
+def print_phase_table(name: str, aggregates: Dict[str, np.ndarray]):
+    """Print one line for each phase."""
+    print(f"Per-phase statistics for {name}")
+    print(f"{'phase':<20} {'start[s]':>9} {'dur[s]':>9} {'count':>7} {'mean':>9} {'min':>9} {'max':>9}")
+    for idx, label in enumerate(aggregates['phase']):
+        print(f"{label:<20} {aggregates['start'][idx]:9.2f} {aggregates['duration'][idx]:9.2f} {aggregates['count'][idx]:7d} "
+              f"{aggregates['mean'][idx]:9.2f} {aggregates['min'][idx]:9.2f} {aggregates['max'][idx]:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a phase marker to a running logger")
+    parser.add_argument('--socket', required=True, help='UNIX socket of the logger (--phase-socket)')
+    parser.add_argument('label', help='Phase name')
+    args = parser.parse_args()
+    send_marker(args.socket, args.label)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+log_report.py
+-------------
+Self-contained interactive HTML report for the resource logs.
+
+Every series is reduced to min/max tiles at several zoom levels: level `k` splits the whole
+log in 2^k tiles, and every tile holds `TILE_BUCKETS` min/max buckets. The browser draws only
+the tiles of the level that matches the visible time window, so the number of points drawn is
+bounded (at most a few tiles for each series) whatever the length of the log.
+All tiles are embedded in the HTML page: no server is needed.
+
+    python plot_log.py --file log.csv --html report.html
+
+Mouse wheel zooms, drag pans, double click resets the view.
+"""
+import base64
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Min/max buckets in every tile
+TILE_BUCKETS = 512
+MAX_LEVELS = 16
+COLORS = ['#d62728', '#1f77b4', '#2ca02c', '#ff7f0e', '#9467bd', '#8c564b']
+
+
+def _encode(vmin: np.ndarray, vmax: np.ndarray) -> str:
+    """Interleaved min/max as base64 little endian float32, NaN for empty buckets."""
+    data = np.empty(2 * len(vmin), dtype='<f4')
+    data[0::2] = vmin
+    data[1::2] = vmax
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def build_tiles(seconds: np.ndarray, values: np.ndarray, duration: float, levels: int) -> List[List[dict]]:
+    """
+    Min/max tiles for all levels.
+
+    Buckets are found with `searchsorted` on the sorted times and reduced with `reduceat`.
+    Empty tiles are not stored.
+    """
+    seconds = np.asarray(seconds, dtype=float)
+    values = np.asarray(values, dtype=float)
+    pyramid = []
+    for level in range(levels):
+        n_buckets = TILE_BUCKETS * 2 ** level
+        edges = np.linspace(0.0, duration, n_buckets + 1)
+        starts = np.searchsorted(seconds, edges[:-1], side='left')
+        ends = np.searchsorted(seconds, edges[1:], side='left')
+        ends[-1] = len(seconds)
+        filled = ends > starts
+        vmin = np.full(n_buckets, np.nan)
+        vmax = np.full(n_buckets, np.nan)
+        if np.any(filled):
+            vmin[filled] = np.fmin.reduceat(values, starts[filled])
+            vmax[filled] = np.fmax.reduceat(values, starts[filled])
+        tiles = []
+        for idx in range(2 ** level):
+            chunk = slice(idx * TILE_BUCKETS, (idx + 1) * TILE_BUCKETS)
+            if not np.any(filled[chunk]):
+                continue
+            tiles.append({'i': idx, 'v': _encode(vmin[chunk], vmax[chunk])})
+        pyramid.append(tiles)
+    return pyramid
+
+
+def count_levels(seconds: np.ndarray, duration: float) -> int:
+    """Levels needed until a bucket holds about two samples."""
+    if len(seconds) < 2 or duration <= 0:
+        return 1
+    step = float(np.median(np.diff(seconds)))
+    levels = 1
+    while levels < MAX_LEVELS and duration / (TILE_BUCKETS * 2 ** (levels - 1)) > 2 * step:
+        levels += 1
+    return levels
+
+
+def report_data(seconds: np.ndarray, series: Dict[str, np.ndarray], phases: Optional[list] = None,
+                title: str = 'Resource usage') -> dict:
+    """All data embedded in the HTML page."""
+    seconds = np.asarray(seconds, dtype=float)
+    duration = float(seconds[-1]) if len(seconds) else 0.0
+    duration = duration if duration > 0 else 1.0
+    levels = count_levels(seconds, duration)
+    return {'title': title,
+            'duration': duration,
+            'buckets': TILE_BUCKETS,
+            'phases': [[float(t), str(label)] for t, label in (phases or [])],
+            'series': [{'name': name,
+                        'color': COLORS[idx % len(COLORS)],
+                        'levels': build_tiles(seconds, values, duration, levels)}
+                       for idx, (name, values) in enumerate(series.items())]}
+
+
+def write_html(path: Path, seconds: np.ndarray, series: Dict[str, np.ndarray], phases: Optional[list] = None,
+               title: str = 'Resource usage'):
+    """Write the report. `phases` is a list of (seconds, label)."""
+    data = report_data(seconds, series, phases, title)
+    html = HTML_TEMPLATE.replace('__TITLE__', title).replace('__DATA__', json.dumps(data, separators=(',', ':')))
+    Path(path).write_text(html, encoding='utf-8')
+
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+body { font-family: sans-serif; margin: 16px; }
+.chart { position: relative; margin-bottom: 12px; }
+canvas { border: 1px solid #ccc; width: 100%; height: 220px; cursor: crosshair; }
+.info { color: #666; font-size: 12px; }
+</style>
+</head>
+<body>
+<h2>__TITLE__</h2>
+<div class="info">Mouse wheel: zoom, drag: pan, double click: reset. <span id="level"></span></div>
+<div id="charts"></div>
+<script>
+const DATA = __DATA__;
+let view = [0, DATA.duration];
+const charts = [];
+
+function values(tile) {
+  // Decode the tile only the first time it is drawn
+  if (!tile.d) {
+    const raw = atob(tile.v), bytes = new Uint8Array(raw.length);
+    for (let k = 0; k < raw.length; k++) { bytes[k] = raw.charCodeAt(k); }
+    tile.d = new Float32Array(bytes.buffer);
+  }
+  return tile.d;
+}
+
+function levelFor(span) {
+  // Level where a tile is at least as large as the visible window
+  const levels = DATA.series.length ? DATA.series[0].levels.length : 1;
+  const level = Math.floor(Math.log2(DATA.duration / span));
+  return Math.max(0, Math.min(levels - 1, level));
+}
+
+function draw(chart) {
+  const canvas = chart.canvas, ctx = canvas.getContext('2d');
+  const W = canvas.width = canvas.clientWidth * devicePixelRatio;
+  const H = canvas.height = canvas.clientHeight * devicePixelRatio;
+  ctx.clearRect(0, 0, W, H);
+  const span = view[1] - view[0];
+  const level = levelFor(span);
+  const tileSpan = DATA.duration / Math.pow(2, level);
+  const bucket = tileSpan / DATA.buckets;
+  const x = t => (t - view[0]) / span * W;
+  // Phases
+  DATA.phases.forEach((p, idx) => {
+    const end = idx + 1 < DATA.phases.length ? DATA.phases[idx + 1][0] : DATA.duration;
+    ctx.fillStyle = idx % 2 ? 'rgba(128,128,128,0.06)' : 'rgba(128,128,128,0.16)';
+    ctx.fillRect(x(p[0]), 0, x(end) - x(p[0]), H);
+    ctx.fillStyle = '#333';
+    ctx.font = (11 * devicePixelRatio) + 'px sans-serif';
+    ctx.fillText(p[1], x(p[0]) + 3, 12 * devicePixelRatio);
+  });
+  // Visible tiles of the selected level
+  const first = Math.floor(view[0] / tileSpan), last = Math.floor(view[1] / tileSpan);
+  const tiles = chart.series.levels[level].filter(t => t.i >= first && t.i <= last);
+  let lo = Infinity, hi = -Infinity;
+  tiles.forEach(t => {
+    const d = values(t);
+    for (let k = 0; k < d.length; k += 2) {
+      if (!isNaN(d[k])) { lo = Math.min(lo, d[k]); hi = Math.max(hi, d[k + 1]); }
+    }
+  });
+  if (lo === Infinity) { lo = 0; hi = 1; }
+  if (hi === lo) { hi = lo + 1; }
+  const pad = (hi - lo) * 0.05;
+  const y = v => H - (v - lo + pad) / (hi - lo + 2 * pad) * H;
+  ctx.strokeStyle = chart.series.color;
+  ctx.fillStyle = chart.series.color;
+  ctx.lineWidth = devicePixelRatio;
+  let points = 0;
+  tiles.forEach(t => {
+    const d = values(t);
+    ctx.beginPath();
+    for (let k = 0; k < d.length; k += 2) {
+      if (isNaN(d[k])) { continue; }
+      const px = x((t.i * DATA.buckets + k / 2 + 0.5) * bucket);
+      // Vertical min/max segment for each bucket
+      ctx.moveTo(px, y(d[k]));
+      ctx.lineTo(px, y(d[k + 1]) - 0.5);
+      points += 2;
+    }
+    ctx.stroke();
+  });
+  ctx.fillStyle = '#000';
+  ctx.font = (12 * devicePixelRatio) + 'px sans-serif';
+  ctx.fillText(chart.series.name + '  [' + lo.toFixed(2) + ', ' + hi.toFixed(2) + ']', 6, H - 6);
+  ctx.fillText(view[0].toFixed(1) + 's', 6, 26 * devicePixelRatio);
+  const right = view[1].toFixed(1) + 's';
+  ctx.fillText(right, W - ctx.measureText(right).width - 6, 26 * devicePixelRatio);
+  return [level, points];
+}
+
+function redraw() {
+  let status = [0, 0];
+  charts.forEach(c => { const s = draw(c); status = [s[0], status[1] + s[1]]; });
+  document.getElementById('level').textContent = 'level ' + status[0] + ', ' + status[1] + ' points';
+}
+
+function setView(start, end) {
+  const span = Math.max(end - start, DATA.duration / (DATA.buckets * Math.pow(2, 20)));
+  start = Math.max(0, Math.min(start, DATA.duration - span));
+  view = [start, Math.min(DATA.duration, start + span)];
+  redraw();
+}
+
+DATA.series.forEach(series => {
+  const div = document.createElement('div');
+  div.className = 'chart';
+  const canvas = document.createElement('canvas');
+  div.appendChild(canvas);
+  document.getElementById('charts').appendChild(div);
+  const chart = {canvas: canvas, series: series};
+  charts.push(chart);
+  canvas.addEventListener('wheel', e => {
+    e.preventDefault();
+    const r = canvas.getBoundingClientRect();
+    const at = view[0] + (e.clientX - r.left) / r.width * (view[1] - view[0]);
+    const scale = e.deltaY < 0 ? 0.8 : 1.25;
+    setView(at - (at - view[0]) * scale, at + (view[1] - at) * scale);
+  });
+  let drag = null;
+  canvas.addEventListener('mousedown', e => { drag = [e.clientX, view[0], view[1]]; });
+  window.addEventListener('mouseup', () => { drag = null; });
+  window.addEventListener('mousemove', e => {
+    if (!drag) { return; }
+    const shift = (e.clientX - drag[0]) / canvas.getBoundingClientRect().width * (drag[2] - drag[1]);
+    setView(drag[1] - shift, drag[2] - shift);
+  });
+  canvas.addEventListener('dblclick', () => setView(0, DATA.duration));
+});
+window.addEventListener('resize', redraw);
+redraw();
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+log_store.py
+------------
+Columnar on-disk store for the resource logs, with a sparse index for every block.
+
+The samples are written in blocks of `BLOCK_ROWS` rows. Each block holds one float64 array
+for every column (the first column is always the time in seconds since epoch), and the
+index keeps min/max time and min/max of every column for each block, so that time-range
+and threshold queries read only the blocks that can contain a result.
+
+File layout:
+
+    MAGIC | block | block | ... | footer (JSON) | footer size (uint64) | MAGIC
+
+    block = rows (uint32) | columns (uint32) | columns x rows float64
+
+The footer holds the column names, the block index and the phase markers.
+If the logger is killed before writing the footer, the index is rebuilt reading the blocks.
+
+Usage:
+    python log_store.py --file log.rls [--start 10] [--end 40] [--where "CPU %" ">" 80] [--csv out.csv]
+"""
+import argparse
+import csv
+import json
+import struct
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from log_phases import TIMESTAMP_FORMAT
+
+MAGIC = b'RLSTORE1'
+BLOCK_HEADER = struct.Struct('<II')
+FOOTER_SIZE = struct.Struct('<Q')
+BLOCK_ROWS = 4096
+TIME_COLUMN = 'Time'
+OPERATORS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+
+
+def is_store(path) -> bool:
+    """True if the file is a log store."""
+    with open(path, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def ingest_columns(columns) -> Dict[str, np.ndarray]:
+    """Columns of the logger from a tegrastats log decoded by `jtop.core.ingest` (its `load_columns`).
+
+    The memory-mapped columns are wrapped without copy. The time is the number of the line
+    if the log has no timestamps, CPU % is the sum of the load of the online cores (100 for each
+    core at full load) and Mem % is the RAM used in % of the total RAM.
+    """
+    data = {name: np.frombuffer(column, dtype=np.float64) for name, column in columns.items()}
+    times = data['time']
+    if np.isnan(times).all():
+        times = np.arange(len(times), dtype=np.float64)
+    cpu = np.zeros(len(times))
+    online = np.zeros(len(times), dtype=bool)
+    for name, values in data.items():
+        if name.startswith('CPU') and name.endswith('/val'):
+            valid = ~np.isnan(values)
+            cpu[valid] += values[valid]
+            online |= valid
+    cpu[~online] = np.nan
+    mem = np.full(len(times), np.nan)
+    if 'RAM/use' in data and 'RAM/tot' in data:
+        total = data['RAM/tot']
+        valid = total > 0
+        mem[valid] = data['RAM/use'][valid] * 100.0 / total[valid]
+    return {TIME_COLUMN: times, 'CPU %': cpu, 'Mem %': mem}
+
+
+class LogStoreWriter:
+    """Append samples to a new log store."""
+
+    def __init__(self, path, columns: Sequence[str], block_rows: int = BLOCK_ROWS):
+        self.columns = [TIME_COLUMN] + list(columns)
+        self._block_rows = block_rows
+        self._buffer = np.empty((len(self.columns), block_rows))
+        self._rows = 0
+        self._index: List[dict] = []
+        self._markers: List[Tuple[float, str]] = []
+        self._fp = open(path, 'wb')
+        self._fp.write(MAGIC)
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        self._buffer[0, self._rows] = timestamp
+        self._buffer[1:, self._rows] = values
+        self._rows += 1
+        if self._rows == self._block_rows:
+            self.flush()
+
+    def mark(self, timestamp: float, label: str):
+        """Store a phase marker."""
+        self._markers.append((timestamp, label))
+
+    def flush(self):
+        """Write the rows in buffer as a new block."""
+        if self._rows == 0:
+            return
+        data = self._buffer[:, :self._rows]
+        self._index.append(_block_index(self._fp.tell(), data))
+        self._fp.write(BLOCK_HEADER.pack(self._rows, len(self.columns)))
+        self._fp.write(np.ascontiguousarray(data, dtype='<f8').tobytes())
+        self._fp.flush()
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+        footer = json.dumps({'columns': self.columns, 'blocks': self._index, 'markers': self._markers}).encode('utf-8')
+        self._fp.write(footer)
+        self._fp.write(FOOTER_SIZE.pack(len(footer)))
+        self._fp.write(MAGIC)
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _block_index(offset: int, data: np.ndarray) -> dict:
+    with np.errstate(invalid='ignore'):
+        return {'offset': offset,
+                'rows': int(data.shape[1]),
+                'min': np.nanmin(data, axis=1).tolist(),
+                'max': np.nanmax(data, axis=1).tolist()}
+
+
+class LogStore:
+    """Read only access to a log store. All blocks are memory mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        footer = self._read_footer()
+        if footer is None:
+            footer = self._rebuild_index()
+        self.columns: List[str] = footer['columns']
+        self.blocks: List[dict] = footer['blocks']
+        self.markers: List[Tuple[float, str]] = [tuple(marker) for marker in footer['markers']]
+
+    def _read_footer(self) -> Optional[dict]:
+        size = len(self._map)
+        tail = FOOTER_SIZE.size + len(MAGIC)
+        if size < len(MAGIC) + tail or bytes(self._map[size - len(MAGIC):]) != MAGIC:
+            return None
+        footer_size, = FOOTER_SIZE.unpack(bytes(self._map[size - tail:size - len(MAGIC)]))
+        return json.loads(bytes(self._map[size - tail - footer_size:size - tail]).decode('utf-8'))
+
+    def _rebuild_index(self) -> dict:
+        """Scan all complete blocks of a store without footer."""
+        blocks, columns = [], 0
+        offset = len(MAGIC)
+        while offset + BLOCK_HEADER.size <= len(self._map):
+            rows, block_columns = BLOCK_HEADER.unpack(bytes(self._map[offset:offset + BLOCK_HEADER.size]))
+            if rows == 0 or (columns and block_columns != columns) or offset + BLOCK_HEADER.size + rows * block_columns * 8 > len(self._map):
+                break
+            columns = block_columns
+            blocks.append(_block_index(offset, self._block_data({'offset': offset, 'rows': rows}, columns)))
+            offset += BLOCK_HEADER.size + rows * columns * 8
+        # Column names are stored only in the footer
+        names = [TIME_COLUMN] + ["column {idx}".format(idx=idx) for idx in range(1, columns)]
+        return {'columns': names, 'blocks': blocks, 'markers': []}
+
+    def _block_data(self, block: dict, columns: int) -> np.ndarray:
+        start = block['offset'] + BLOCK_HEADER.size
+        data = self._map[start:start + block['rows'] * columns * 8]
+        return data.view('<f8').reshape(columns, block['rows'])
+
+    def __len__(self):
+        return sum(block['rows'] for block in self.blocks)
+
+    @property
+    def start_time(self) -> float:
+        return self.blocks[0]['min'][0] if self.blocks else 0.0
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              columns: Optional[Sequence[str]] = None, where: Optional[Tuple[str, str, float]] = None) -> Dict[str, np.ndarray]:
+        """
+        Read the samples with start <= time < end (seconds since epoch).
+
+        `where` is a threshold filter like ("CPU %", ">", 80.0). Blocks outside the time range,
+        or without any value over the threshold, are skipped using only the index.
+        """
+        names = [TIME_COLUMN] + [c for c in (columns or self.columns) if c != TIME_COLUMN]
+        selected = [self.columns.index(name) for name in names]
+        if where is not None:
+            w_col, w_op, w_val = self.columns.index(where[0]), OPERATORS[where[1]], where[2]
+        parts = []
+        for block in self.blocks:
+            if start is not None and block['max'][0] < start:
+                continue
+            if end is not None and block['min'][0] >= end:
+                continue
+            if where is not None:
+                # The block can match only if its min or max satisfy the threshold
+                if not (w_op(block['max'][w_col], w_val) or w_op(block['min'][w_col], w_val)):
+                    continue
+            data = self._block_data(block, len(self.columns))
+            mask = np.ones(block['rows'], dtype=bool)
+            if start is not None:
+                mask &= data[0] >= start
+            if end is not None:
+                mask &= data[0] < end
+            if where is not None:
+                mask &= w_op(data[w_col], w_val)
+            parts.append(data[selected][:, mask])
+        merged = np.concatenate(parts, axis=1) if parts else np.empty((len(names), 0))
+        return {name: merged[idx] for idx, name in enumerate(names)}
+
+    def phases(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[float, str]]:
+        """Phase markers inside the time range."""
+        return [(t, label) for t, label in self.markers
+                if (start is None or t >= start) and (end is None or t < end)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a log store")
+    parser.add_argument('--file', required=True, help='Path to the log store')
+    parser.add_argument('--start', type=float, help='Seconds from the beginning of the log')
+    parser.add_argument('--end', type=float, help='Seconds from the beginning of the log')
+    parser.add_argument('--where', nargs=3, metavar=('COLUMN', 'OP', 'VALUE'), help='Threshold filter, e.g. "CPU %%" ">" 80')
+    parser.add_argument('--csv', help='Write the result in a CSV file')
+    args = parser.parse_args()
+
+    store = LogStore(args.file)
+    t0 = store.start_time
+    start = t0 + args.start if args.start is not None else None
+    end = t0 + args.end if args.end is not None else None
+    where = (args.where[0], args.where[1], float(args.where[2])) if args.where else None
+    result = store.query(start, end, where=where)
+    names = list(result)
+    print(f"{len(result[TIME_COLUMN])}/{len(store)} rows, {len(store.blocks)} blocks")
+    for name in names[1:]:
+        if len(result[name]):
+            print(f"{name}: mean {np.nanmean(result[name]):.3f} min {np.nanmin(result[name]):.3f} max {np.nanmax(result[name]):.3f}")
+    if args.csv:
+        with open(args.csv, 'w') as fp:
+            wr = csv.writer(fp)
+            wr.writerow(['Timestamp'] + names[1:])
+            for row in zip(*result.values()):
+                wr.writerow([datetime.fromtimestamp(row[0]).strftime(TIMESTAMP_FORMAT)[:-3]] + list(row[1:]))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,32 +6,125 @@ plot_log.py
 Read a CSV file produced by `cpu_mem_logger.py` and generate plots of CPU and memory usage.
 
 Usage:
-    python plot_log.py --file log.csv [--save output.png]
+    python plot_log.py --file log.csv [--save output.png] [--start 10 --end 40]
+
+The file can be a CSV file or a columnar log store (`log_store.py`). With a log store
+only the blocks inside the time window are read. A folder of a tegrastats log decoded with
+`python -m jtop.core.ingest` is read too, the CPU % is the sum of the load of all cores.
 
 If --save is omitted, the plot will be shown in an interactive window.
+With --html the plot is written in a self-contained interactive HTML report (`log_report.py`).
+If the log contains phase markers, the phases are shaded on the plot and
+the per-phase statistics are printed.
 """
 import argparse
+import os
+import sys
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from log_phases import PHASE_COLUMN, TIMESTAMP_FORMAT, phase_aggregates, print_phase_table
+from log_store import LogStore, TIME_COLUMN, ingest_columns, is_store
+from log_report import write_html
+# jtop is in the jetson_stats folder of this repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jetson_stats'))
+from jtop.core.ingest import is_columns, load_columns  # noqa: E402
+
 
 def load_data(csv_path: Path) -> pd.DataFrame:
-    """Load the CSV and clean FINAL row if present."""
+    """Load the CSV and clean FINAL row if present. Phase markers are stored in `df.attrs['phases']`."""
     df = pd.read_csv(csv_path)
     df_clean = df[df['Timestamp'] != 'FINAL'].copy()
     # Convert Timestamp to datetime with microsecond precision
-    df_clean['Timestamp'] = pd.to_datetime(df_clean['Timestamp'], format='%Y-%m-%d %H:%M:%S.%f')
+    df_clean['Timestamp'] = pd.to_datetime(df_clean['Timestamp'], format=TIMESTAMP_FORMAT)
+    # Split phase marker rows from samples
+    phases = pd.DataFrame(columns=['Timestamp', PHASE_COLUMN])
+    if PHASE_COLUMN in df_clean.columns:
+        is_marker = df_clean[PHASE_COLUMN].notna()
+        phases = df_clean.loc[is_marker, ['Timestamp', PHASE_COLUMN]]
+        df_clean = df_clean[~is_marker].drop(columns=PHASE_COLUMN)
     # Convert to seconds since start for better x-axis plotting
     if not df_clean.empty:
         start_time = df_clean['Timestamp'].iloc[0]
         df_clean['Seconds'] = (df_clean['Timestamp'] - start_time).dt.total_seconds()
-        
+        phases = phases.assign(Seconds=(phases['Timestamp'] - start_time).dt.total_seconds())
+    df_clean.attrs['phases'] = phases
     return df_clean
 
 
+def load_store(store_path: Path, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """Query a log store in a window of seconds from the beginning of the log, same output of `load_data`."""
+    store = LogStore(store_path)
+    t0 = store.start_time
+    start = t0 + start if start is not None else None
+    end = t0 + end if end is not None else None
+    data = store.query(start, end)
+    df = pd.DataFrame({name: values for name, values in data.items() if name != TIME_COLUMN})
+    df.insert(0, 'Timestamp', _local_datetime(data[TIME_COLUMN]))
+    df['Seconds'] = data[TIME_COLUMN] - t0
+    phases = pd.DataFrame(store.phases(start, end), columns=['Time', PHASE_COLUMN])
+    phases.insert(0, 'Timestamp', _local_datetime(phases['Time']))
+    phases['Seconds'] = phases['Time'] - t0
+    df.attrs['phases'] = phases.drop(columns='Time')
+    return df
+
+
+def load_ingest(ingest_path: Path, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """Read a folder decoded with `jtop.core.ingest`, same output of `load_data` without phases."""
+    data = ingest_columns(load_columns(str(ingest_path)))
+    times = data[TIME_COLUMN]
+    df = pd.DataFrame({name: values for name, values in data.items() if name != TIME_COLUMN})
+    df.insert(0, 'Timestamp', _local_datetime(times))
+    df['Seconds'] = times - times[0] if len(times) else times
+    df.attrs['phases'] = pd.DataFrame(columns=['Timestamp', PHASE_COLUMN, 'Seconds'])
+    return select_window(df, start, end)
+
+
+def _local_datetime(seconds) -> pd.Series:
+    """Seconds since epoch to naive local datetimes, like the CSV timestamps."""
+    local = datetime.now().astimezone().tzinfo
+    return pd.Series(pd.to_datetime(seconds, unit='s', utc=True)).dt.tz_convert(local).dt.tz_localize(None)
+
+
+def select_window(df: pd.DataFrame, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+    """Keep the samples and phases between start and end seconds."""
+    phases = df.attrs.get('phases')
+    if start is not None:
+        df = df[df['Seconds'] >= start]
+        phases = phases[phases['Seconds'] >= start]
+    if end is not None:
+        df = df[df['Seconds'] < end]
+        phases = phases[phases['Seconds'] < end]
+    df = df.copy()
+    df.attrs['phases'] = phases
+    return df
+
+
+def phase_statistics(df: pd.DataFrame, columns=('CPU %', 'Mem %')) -> dict:
+    """Per-phase aggregates for each column, look `log_phases.phase_aggregates`."""
+    phases = df.attrs.get('phases')
+    if phases is None or phases.empty:
+        return {}
+    return {name: phase_aggregates(df['Seconds'].to_numpy(), df[name].to_numpy(),
+                                   phases['Seconds'].to_numpy(), phases[PHASE_COLUMN].tolist())
+            for name in columns if name in df.columns}
+
+
+def shade_phases(ax, df: pd.DataFrame):
+    """Shade each phase with alternate colors and write its label on top."""
+    phases = df.attrs.get('phases')
+    if phases is None or phases.empty:
+        return
+    limits = list(phases['Timestamp']) + [df['Timestamp'].iloc[-1]]
+    for idx, label in enumerate(phases[PHASE_COLUMN]):
+        ax.axvspan(limits[idx], limits[idx + 1], color='tab:gray', alpha=0.15 if idx % 2 == 0 else 0.05, lw=0)
+        ax.text(limits[idx], 1.0, f" {label}", transform=ax.get_xaxis_transform(), va='top', fontsize=8)
+
+
 def plot_metrics(df: pd.DataFrame, save_path: Optional[Path] = None):
     """Plot CPU and Memory usage over time."""
     fig, ax1 = plt.subplots(figsize=(12, 6))
@@ -58,6 +151,9 @@ def plot_metrics(df: pd.DataFrame, save_path: Optional[Path] = None):
         ax1.axhline(avg_cpu, color='tab:red', linestyle='--', alpha=0.5, label=f'Avg CPU {avg_cpu:.2f}%')
         ax2.axhline(avg_mem, color='tab:blue', linestyle='--', alpha=0.5, label=f'Avg Mem {avg_mem:.2f}%')
 
+    # Phases (optional if markers are present)
+    shade_phases(ax1, df)
+
     fig.tight_layout()
 
     # Combine legends
@@ -72,17 +168,41 @@ def plot_metrics(df: pd.DataFrame, save_path: Optional[Path] = None):
         plt.show()
 
 
+def html_report(df: pd.DataFrame, html_path: Path, columns=('CPU %', 'Mem %')):
+    """Write the interactive HTML report with the same series of the plot."""
+    phases = df.attrs.get('phases')
+    markers = list(zip(phases['Seconds'], phases[PHASE_COLUMN])) if phases is not None and not phases.empty else []
+    seconds = df['Seconds'].to_numpy()
+    series = {name: df[name].to_numpy(dtype=float) for name in columns if name in df.columns}
+    write_html(html_path, seconds - seconds[0] if len(seconds) else seconds, series,
+               [(t - seconds[0], label) for t, label in markers] if len(seconds) else [], title='CPU and Memory Usage')
+    print(f"Report saved to {html_path}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Plot CPU & Memory usage from log.csv")
     parser.add_argument('--file', default='log.csv', help='Path to CSV file (default: log.csv)')
     parser.add_argument('--save', help='Path to output image file (e.g., plot.png). If omitted, shows the plot interactively.')
+    parser.add_argument('--html', help='Path to an interactive HTML report (e.g., report.html). The plot is not shown.')
+    parser.add_argument('--start', type=float, help='Plot from this second of the log')
+    parser.add_argument('--end', type=float, help='Plot until this second of the log')
     args = parser.parse_args()
 
     csv_path = Path(args.file)
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
 
-    df = load_data(csv_path)
+    if is_columns(str(csv_path)):
+        df = load_ingest(csv_path, args.start, args.end)
+    elif is_store(csv_path):
+        df = load_store(csv_path, args.start, args.end)
+    else:
+        df = select_window(load_data(csv_path), args.start, args.end)
+    for name, aggregates in phase_statistics(df).items():
+        print_phase_table(name, aggregates)
+    if args.html:
+        html_report(df, Path(args.html))
+        return
     plot_metrics(df, Path(args.save) if args.save else None)
 
 